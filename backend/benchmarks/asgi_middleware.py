@@ -0,0 +1,158 @@
+"""
+Throughput of the request middleware stack.
+
+Drives a FastAPI app in-process with a minimal ASGI load generator (no
+sockets or HTTP parsing, so the numbers isolate the app and middleware)
+and compares the original two @app.middleware("http") layers, which
+rate-limit with a Redis round trip per request, against the raw ASGI
+RequestMiddleware with the local token bucket. Requires a local Redis
+(REDIS_URL).
+
+Usage:
+    python -m benchmarks.asgi_middleware
+"""
+import asyncio
+import math
+import statistics
+import time
+import uuid
+from fastapi import FastAPI, Request
+from services.redis_client import redis_client
+from services.rate_limiter import RateLimiter, local_rate_limiter
+from utils.logger import request_id_var, user_id_var
+from utils.request_middleware import RequestMiddleware
+from utils.serialization import FastJSONResponse
+
+REQUESTS = 20000
+CONCURRENCY = 50
+CLIENTS = 100
+LIMIT = 10 ** 9  # never reject: measure overhead only
+
+
+def _legacy_app(limiter: RateLimiter) -> FastAPI:
+    """The original middleware pair"""
+    app = FastAPI()
+    
+    @app.middleware("http")
+    async def add_request_id(request: Request, call_next):
+        request_id = str(uuid.uuid4())
+        request_id_var.set(request_id)
+        user_id = request.headers.get("X-User-ID")
+        if user_id:
+            user_id_var.set(user_id)
+        response = await call_next(request)
+        response.headers["X-Request-ID"] = request_id
+        return response
+    
+    @app.middleware("http")
+    async def rate_limiting_middleware(request: Request, call_next):
+        result = await limiter.check(request.client.host, LIMIT, window=60)
+        rate_limit_headers = {
+            "X-RateLimit-Limit": str(result.limit),
+            "X-RateLimit-Remaining": str(result.remaining),
+            "X-RateLimit-Reset": str(math.ceil(result.reset_after))
+        }
+        response = await call_next(request)
+        response.headers.update(rate_limit_headers)
+        return response
+    
+    _add_routes(app)
+    return app
+
+
+def _current_app() -> FastAPI:
+    app = FastAPI(default_response_class=FastJSONResponse)
+    app.add_middleware(RequestMiddleware, limiter=local_rate_limiter, limit=LIMIT, window=60)
+    _add_routes(app)
+    return app
+
+
+def _add_routes(app: FastAPI):
+    @app.get("/api/ping")
+    async def ping():
+        return {"status": "ok"}
+
+
+async def _request(app, client_ip: str):
+    """One GET through the app; returns the status code"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/api/ping",
+        "raw_path": b"/api/ping",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench"), (b"x-user-id", b"bench_user")],
+        "client": (client_ip, 40000),
+        "server": ("bench", 80),
+    }
+    status = None
+    received = False
+    done = asyncio.Event()
+    
+    async def receive():
+        # Like a server: the body once, then a disconnect after the response
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+    
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body" and not message.get("more_body", False):
+            done.set()
+    
+    await app(scope, receive, send)
+    return status
+
+
+async def _run(label: str, app):
+    counter = iter(range(REQUESTS))
+    latencies = []
+    
+    async def worker():
+        for i in counter:
+            start = time.perf_counter()
+            status = await _request(app, f"10.0.0.{i % CLIENTS}")
+            latencies.append((time.perf_counter() - start) * 1000)
+            assert status == 200, status
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(
+        f"{label:<10} {REQUESTS / elapsed:10,.0f} req/s   "
+        f"p50 {statistics.median(latencies):6.2f} ms   p99 {latencies[int(len(latencies) * 0.99) - 1]:6.2f} ms"
+    )
+
+
+async def main():
+    await redis_client.connect()
+    try:
+        limiter = RateLimiter()
+        await limiter.initialize()
+        await local_rate_limiter.initialize()
+        
+        print("=" * 64)
+        print(f"Middleware throughput ({CONCURRENCY} concurrent, {CLIENTS} clients)")
+        print("=" * 64)
+        await _run("legacy", _legacy_app(limiter))
+        await _run("asgi", _current_app())
+        
+        await local_rate_limiter.close()
+        async for key in redis_client.redis.scan_iter(match="rate_limit:*10.0.0.*"):
+            await redis_client.redis.delete(key)
+    finally:
+        await redis_client.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""
+Benchmark per-append latency of conversation storage.
+
+Compares the legacy JSON read-modify-write blob against the list-backed
+store at different transcript lengths. Requires a local Redis (REDIS_URL).
+
+Usage:
+    python -m benchmarks.conversation_append
+"""
+import asyncio
+import json
+import statistics
+import time
+from config import settings
+from services.redis_client import redis_client
+
+SIZES = [10, 100, 1000]
+ITERATIONS = 200
+
+
+def _message(i: int) -> dict:
+    return {
+        "message": f"Benchmark message number {i} with some typical chat length text.",
+        "sender": "user" if i % 2 else "ai",
+        "timestamp": time.time()
+    }
+
+
+async def _legacy_append(key: str, message: dict):
+    """Original implementation: GET whole blob, decode, append, SETEX"""
+    value = await redis_client.redis.get(key)
+    messages = json.loads(value) if value else []
+    messages.append(message)
+    await redis_client.redis.setex(key, settings.CONVERSATION_TTL, json.dumps(messages))
+
+
+async def _measure(append, size: int) -> list:
+    samples = []
+    for i in range(ITERATIONS):
+        start = time.perf_counter()
+        await append(_message(size + i))
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _report(label: str, size: int, samples: list):
+    samples.sort()
+    p50 = statistics.median(samples)
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    print(f"{label:<8} {size:>6} msgs   p50 {p50:7.3f} ms   p99 {p99:7.3f} ms")
+
+
+async def main():
+    await redis_client.connect()
+    try:
+        print("=" * 60)
+        print("Conversation append latency")
+        print("=" * 60)
+        for size in SIZES:
+            legacy_key = f"bench:legacy_conversation:{size}"
+            room_id = f"bench_{size}"
+            
+            await redis_client.redis.setex(
+                legacy_key,
+                settings.CONVERSATION_TTL,
+                json.dumps([_message(i) for i in range(size)])
+            )
+            await redis_client.set_conversation(room_id, [_message(i) for i in range(size)])
+            
+            legacy = await _measure(lambda m: _legacy_append(legacy_key, m), size)
+            native = await _measure(lambda m: redis_client.append_message(room_id, m), size)
+            
+            _report("legacy", size, legacy)
+            _report("list", size, native)
+            
+            await redis_client.redis.delete(legacy_key, f"conversation:{room_id}", f"conversation_seq:{room_id}")
+    finally:
+        await redis_client.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,113 @@
+"""
+Benchmark response rendering of the companions, room and history endpoints.
+
+"before" reproduces the original path: Pydantic models built in the
+handler, re-validated against the response model by FastAPI, then rendered
+by the stdlib JSONResponse (the companions list was re-serialized on every
+request). "after" is the current path: trusted dicts rendered by the
+orjson-backed FastJSONResponse, and the catalog's pre-built bytes. Needs no
+Redis; payloads mirror what the endpoints return.
+
+Usage:
+    python -m benchmarks.json_responses
+"""
+import statistics
+import time
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from models.schemas import RoomDetailsResponse, SessionHistoryResponse, SessionSummary
+from services.companion_registry import BUILTIN_COMPANIONS, companion_registry
+from utils.serialization import BACKEND, FastJSONResponse, trusted
+
+ITERATIONS = 2000
+HISTORY_LIMITS = [20, 100]
+
+
+def _room() -> dict:
+    return {
+        "room_id": "room_bench",
+        "user_id": "user_bench",
+        "companion_id": "tutor_math_ada",
+        "status": "active",
+        "created_at": time.time(),
+        "participants": ["sid_a", "sid_b"]
+    }
+
+
+def _sessions(count: int) -> list:
+    now = time.time()
+    companion = BUILTIN_COMPANIONS[0]
+    return [
+        {
+            "session_id": f"session_{i}",
+            "room_id": f"room_{i}",
+            "companion_id": companion["id"],
+            "companion": {"id": companion["id"], "name": companion["name"], "avatar_url": companion["avatar_url"]},
+            "started_at": now - 3600 - i,
+            "ended_at": now - i,
+            "duration_seconds": 3600,
+            "message_count": 40,
+            "transcript_preview": "Can you explain how derivatives work?"
+        }
+        for i in range(count)
+    ]
+
+
+def _revalidated(model, instance) -> JSONResponse:
+    """What FastAPI does with a model returned under response_model"""
+    validated = model.model_validate(instance.model_dump())
+    return JSONResponse(validated.model_dump(mode="json"))
+
+
+def _measure(render) -> list:
+    samples = []
+    for _ in range(ITERATIONS):
+        start = time.perf_counter()
+        render()
+        samples.append((time.perf_counter() - start) * 1_000_000)
+    return samples
+
+
+def _report(label: str, samples: list):
+    samples.sort()
+    p50 = statistics.median(samples)
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    print(f"{label:<24} p50 {p50:9.1f} us   p99 {p99:9.1f} us")
+
+
+def main():
+    print("=" * 64)
+    print(f"Response rendering (after = {BACKEND})")
+    print("=" * 64)
+    
+    _report("companions before", _measure(lambda: JSONResponse(BUILTIN_COMPANIONS)))
+    _report("companions after", _measure(
+        lambda: Response(content=companion_registry.catalog_body(), media_type="application/json")
+    ))
+    
+    room = _room()
+    _report("room before", _measure(
+        lambda: _revalidated(RoomDetailsResponse, RoomDetailsResponse(**room))
+    ))
+    _report("room after", _measure(
+        lambda: FastJSONResponse(trusted(RoomDetailsResponse, room))
+    ))
+    
+    for limit in HISTORY_LIMITS:
+        sessions = _sessions(limit)
+        _report(f"history {limit} before", _measure(
+            lambda: _revalidated(SessionHistoryResponse, SessionHistoryResponse(
+                sessions=[SessionSummary(**session) for session in sessions],
+                total=limit
+            ))
+        ))
+        _report(f"history {limit} after", _measure(
+            lambda: FastJSONResponse({
+                "sessions": [trusted(SessionSummary, session) for session in sessions],
+                "total": limit
+            })
+        ))
+
+
+if __name__ == "__main__":
+    main()
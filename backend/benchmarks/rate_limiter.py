@@ -0,0 +1,65 @@
+"""
+Microbenchmark of rate limit checks per second.
+
+Runs concurrent checks for the legacy GET/SETEX/INCR limiter and each Lua
+algorithm. Requires a local Redis (REDIS_URL).
+
+Usage:
+    python -m benchmarks.rate_limiter
+"""
+import asyncio
+import time
+from services.redis_client import redis_client
+from services.rate_limiter import RateLimiter, ALGORITHMS
+
+CHECKS = 20000
+CONCURRENCY = 50
+CLIENTS = 100
+
+
+async def _legacy_check(identifier: str, limit: int, window: int = 60) -> bool:
+    """Original implementation: up to three round trips per check"""
+    key = f"bench:rate_limit:{identifier}"
+    current = await redis_client.redis.get(key)
+    if current is None:
+        await redis_client.redis.setex(key, window, 1)
+        return True
+    if int(current) >= limit:
+        return False
+    await redis_client.redis.incr(key)
+    return True
+
+
+async def _run(label: str, check):
+    counter = iter(range(CHECKS))
+    
+    async def worker():
+        for i in counter:
+            await check(f"bench_client_{i % CLIENTS}", 1000)
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<16} {CHECKS / elapsed:10,.0f} checks/s   ({elapsed:.2f}s for {CHECKS})")
+
+
+async def main():
+    await redis_client.connect()
+    try:
+        print("=" * 60)
+        print(f"Rate limit checks ({CONCURRENCY} concurrent, {CLIENTS} clients)")
+        print("=" * 60)
+        await _run("legacy", _legacy_check)
+        for algorithm in ALGORITHMS:
+            limiter = RateLimiter(algorithm)
+            await limiter.initialize()
+            await _run(algorithm, limiter.check)
+        
+        async for key in redis_client.redis.scan_iter(match="*rate_limit:*bench_client_*"):
+            await redis_client.redis.delete(key)
+    finally:
+        await redis_client.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+"""
+Benchmark p99 latency of the session history endpoint.
+
+Compares the original per-row enrichment (a Redis GET and JSON decode of
+the whole companion catalog for every session) against the batched
+registry lookup, at page sizes of 20 and 100. Requires a local Redis
+(REDIS_URL).
+
+Usage:
+    python -m benchmarks.session_history
+"""
+import asyncio
+import json
+import statistics
+import time
+from config import settings
+from models.schemas import SessionSummary
+from routes.sessions import get_user_sessions
+from services.companion_registry import BUILTIN_COMPANIONS
+from services.redis_client import redis_client
+
+LIMITS = [20, 100]
+ITERATIONS = 300
+USER_ID = "bench_history_user"
+CATALOG_KEY = "bench:companions:all"
+
+
+async def _legacy_history(limit: int):
+    """Original implementation: one catalog GET + decode + scan per row"""
+    sessions = await redis_client.get_session_history(USER_ID, 0, limit)
+    summaries = []
+    for session in sessions:
+        companions = json.loads(await redis_client.redis.get(CATALOG_KEY))
+        companion = next(c for c in companions if c["id"] == session["companion_id"])
+        summaries.append(SessionSummary(
+            session_id=session["session_id"],
+            room_id=session["room_id"],
+            companion={
+                "id": companion["id"],
+                "name": companion["name"],
+                "avatar_url": companion["avatar_url"]
+            },
+            started_at=session["started_at"],
+            ended_at=session.get("ended_at"),
+            duration_seconds=session["duration_seconds"],
+            message_count=session["message_count"],
+            transcript_preview=session.get("transcript_preview", "")
+        ))
+    return summaries
+
+
+async def _measure(fetch) -> list:
+    samples = []
+    for _ in range(ITERATIONS):
+        start = time.perf_counter()
+        await fetch()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _report(label: str, limit: int, samples: list):
+    samples.sort()
+    p50 = statistics.median(samples)
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    print(f"{label:<8} limit {limit:>4}   p50 {p50:7.3f} ms   p99 {p99:7.3f} ms")
+
+
+async def main():
+    await redis_client.connect()
+    try:
+        now = time.time()
+        await redis_client.set_session_history(USER_ID, [
+            {
+                "session_id": f"bench_session_{i}",
+                "room_id": f"bench_room_{i}",
+                "companion_id": BUILTIN_COMPANIONS[i % len(BUILTIN_COMPANIONS)]["id"],
+                "started_at": now - 3600 - i,
+                "ended_at": now - i,
+                "duration_seconds": 3600,
+                "message_count": 40,
+                "transcript_preview": "Can you explain how derivatives work?"
+            }
+            for i in range(max(LIMITS))
+        ])
+        await redis_client.redis.setex(CATALOG_KEY, settings.COMPANIONS_CACHE_TTL, json.dumps(BUILTIN_COMPANIONS))
+        
+        print("=" * 60)
+        print("Session history latency")
+        print("=" * 60)
+        for limit in LIMITS:
+            legacy = await _measure(lambda: _legacy_history(limit))
+            batched = await _measure(lambda: get_user_sessions(USER_ID, limit=limit, offset=0))
+            _report("legacy", limit, legacy)
+            _report("batched", limit, batched)
+        
+        await redis_client.redis.delete(CATALOG_KEY, f"sessions:{USER_ID}", f"session_data:{USER_ID}")
+    finally:
+        await redis_client.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,126 @@
+"""
+Load test of Socket.IO signaling fan-out across worker processes.
+
+Starts PROCESSES uvicorn workers in multi-node mode (SOCKETIO_MULTI_NODE),
+spreads CLIENTS websocket clients across them in one room, and checks that
+every offer sent through one worker reaches the peers on all the others.
+Requires a local Redis (REDIS_URL) and a configured .env.
+
+Usage:
+    python -m benchmarks.socketio_fanout
+"""
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+import httpx
+import socketio
+
+PROCESSES = 4
+BASE_PORT = 8100
+CLIENTS = 40
+ROUNDS = 50
+
+
+def _start_workers() -> list:
+    env = {**os.environ, "SOCKETIO_MULTI_NODE": "true"}
+    return [
+        subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:asgi_app",
+             "--port", str(BASE_PORT + i), "--log-level", "warning"],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        for i in range(PROCESSES)
+    ]
+
+
+async def _wait_until_ready(http: httpx.AsyncClient):
+    for port in range(BASE_PORT, BASE_PORT + PROCESSES):
+        for _ in range(100):
+            try:
+                if (await http.get(f"http://localhost:{port}/health")).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+        else:
+            raise RuntimeError(f"Worker on port {port} did not start")
+
+
+async def main():
+    workers = _start_workers()
+    clients = []
+    try:
+        async with httpx.AsyncClient() as http:
+            await _wait_until_ready(http)
+            response = await http.post(
+                f"http://localhost:{BASE_PORT}/api/video/rooms",
+                json={"user_id": "bench_host", "companion_id": "tutor_math_ada"}
+            )
+            room_id = response.json()["room_id"]
+        
+        received = {}
+        
+        for i in range(CLIENTS):
+            client = socketio.AsyncClient()
+            port = BASE_PORT + i % PROCESSES
+            
+            def on_offer(data, i=i):
+                round_id = data["sdp"]["round"]
+                received.setdefault(round_id, {})[i] = time.perf_counter()
+            
+            joined = asyncio.Event()
+            client.on("offer", on_offer)
+            client.on("joined", lambda data, joined=joined: joined.set())
+            await client.connect(f"http://localhost:{port}", transports=["websocket"])
+            await client.emit("join", {"room_id": room_id, "user_id": f"bench_user_{i}"})
+            await asyncio.wait_for(joined.wait(), timeout=5)
+            clients.append(client)
+        
+        latencies = []
+        delivered = 0
+        sent_at = {}
+        for round_id in range(ROUNDS):
+            sent_at[round_id] = time.perf_counter()
+            await clients[0].emit("offer", {
+                "room_id": room_id,
+                "sdp": {"type": "offer", "sdp": "bench", "round": round_id}
+            })
+            await asyncio.sleep(0.05)
+        await asyncio.sleep(1)
+        
+        for round_id, receipts in received.items():
+            delivered += len(receipts)
+            latencies.extend((t - sent_at[round_id]) * 1000 for t in receipts.values())
+        
+        expected = ROUNDS * (CLIENTS - 1)
+        print("=" * 60)
+        print(f"Socket.IO fan-out: {PROCESSES} processes, {CLIENTS} clients, {ROUNDS} offers")
+        print("=" * 60)
+        print(f"   Delivered: {delivered}/{expected}")
+        per_process = {p: 0 for p in range(PROCESSES)}
+        for receipts in received.values():
+            for i in receipts:
+                per_process[i % PROCESSES] += 1
+        for p, count in per_process.items():
+            print(f"   Port {BASE_PORT + p}: {count} deliveries")
+        if latencies:
+            latencies.sort()
+            print(f"   Latency p50 {statistics.median(latencies):.2f} ms   "
+                  f"p99 {latencies[int(len(latencies) * 0.99) - 1]:.2f} ms")
+        print("   ✅ Fan-out OK" if delivered == expected else "   ❌ Missing deliveries")
+    finally:
+        for client in clients:
+            await client.disconnect()
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
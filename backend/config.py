@@ -22,6 +22,8 @@ class Settings(BaseSettings):
     
     # Redis Configuration
     REDIS_URL: str
+    REDIS_MAX_CONNECTIONS: int = 20
+    REDIS_POOL_TIMEOUT: float = 5.0  # seconds a command waits for a free connection
     
     # CORS Configuration
     ALLOWED_ORIGINS: str = "http://localhost:3000,http://localhost:8080"
@@ -40,9 +42,46 @@ class Settings(BaseSettings):
     CONVERSATION_TTL: int = 7200  # 2 hours
     SESSION_HISTORY_TTL: int = 2592000  # 30 days
     COMPANIONS_CACHE_TTL: int = 3600  # 1 hour
+    SOCKET_SESSION_TTL: int = 7200  # 2 hours
+    
+    # In-process L1 cache in front of Redis cache keys
+    LOCAL_CACHE_MAX_ENTRIES: int = 1024
+    LOCAL_CACHE_TTL: int = 30  # Upper bound on staleness if an invalidation is missed
+    
+    # cache_get_or_fetch: cross-process fetch lock and early refresh
+    CACHE_FETCH_LOCK_TIMEOUT: float = 10.0  # seconds other processes wait for the fetching one
+    CACHE_EARLY_REFRESH_BETA: float = 1.0  # >1 refreshes earlier, 0 disables early refresh
+    
+    # Conversation Storage
+    CONVERSATION_MAX_MESSAGES: int = 1000  # Older messages are trimmed on append
+    
+    # Ended sessions' transcripts are archived to S3 (gzipped JSON lines)
+    TRANSCRIPT_ARCHIVE_ENABLED: bool = True
+    TRANSCRIPT_REDIS_GRACE: int = 300  # seconds a transcript stays in Redis after archiving
+    TRANSCRIPT_CACHE_TTL: int = 600  # read-through cache of archived transcripts
+    
+    # Socket.IO multi-node mode: broadcast through Redis pub/sub so rooms
+    # span every worker process and host
+    SOCKETIO_MULTI_NODE: bool = False
+    SOCKETIO_CHANNEL: str = "socketio"
+    
+    # AI reply job queue: when enabled, replies are generated by standalone
+    # worker processes (python worker.py) consuming a Redis Stream
+    AI_JOB_QUEUE: bool = False
+    AI_JOB_STREAM: str = "ai_jobs"
+    AI_JOB_GROUP: str = "ai_workers"
+    AI_JOB_MAX_LEN: int = 10000  # Approximate stream length cap
+    AI_JOB_CLAIM_IDLE_MS: int = 120000  # Reclaim jobs pending this long (crashed worker)
+    AI_JOB_MAX_DELIVERIES: int = 3  # Then move to the dead-letter stream
+    AI_JOB_RESULT_TTL: int = 86400  # Dedup window for applied results
+    AI_WORKER_CONCURRENCY: int = 8  # Jobs processed concurrently per worker
     
     # Rate Limiting
     RATE_LIMIT_PER_MINUTE: int = 100
+    RATE_LIMIT_ALGORITHM: str = "sliding_window"  # "sliding_window" or "token_bucket"
+    RATE_LIMIT_LOCAL: bool = True  # local token bucket synced to Redis in batches (no round trip per request)
+    RATE_LIMIT_SYNC_INTERVAL: float = 0.5
+    RATE_LIMIT_LOCAL_MAX_CLIENTS: int = 10000
     
     # External API
     PERSONAS_API_URL: str = "https://persona-fetcher-api.up.railway.app/personas"
@@ -52,15 +91,48 @@ class Settings(BaseSettings):
     GEMINI_MODEL: str = "google/gemini-2.0-flash-exp:free"
     GEMINI_TEMPERATURE: float = 0.7
     GEMINI_MAX_TOKENS: int = 200
+    GEMINI_STREAMING: bool = True  # Emit message-chunk events as tokens arrive
+    
+    # Reply latency budget
+    REPLY_DEADLINE_SECONDS: float = 30.0  # End-to-end budget per reply; 0 disables
+    TTS_STAGE_BUDGET: float = 10.0  # Max seconds for TTS after the text is done
+    VIDEO_STAGE_BUDGET: float = 45.0  # Max seconds for D-ID rendering
+    STAGE_LATENCY_SAMPLES: int = 200  # Recent samples per stage behind the p90 estimates
+    
+    # Reply coordination
+    REPLY_DEBOUNCE_MS: int = 0  # Merge user messages sent within this window into one reply; 0 disables
+    MESSAGE_DEDUPE_TTL: int = 600  # Seconds a client message id is remembered for retries
+    
+    # Reply admission control (per process)
+    REPLY_MAX_CONCURRENCY: int = 16  # Replies generated at once
+    REPLY_QUEUE_MAX: int = 200  # Waiting replies before new ones are shed
+    REPLY_BROWNOUT_AUDIO_DEPTH: int = 20  # Queue depth at which replies drop video
+    REPLY_BROWNOUT_TEXT_DEPTH: int = 60  # Queue depth at which replies drop audio too
     
     # ElevenLabs Configuration
     ELEVENLABS_MODEL: str = "eleven_monolingual_v1"
     ELEVENLABS_TOKEN_LIMIT: int = 100000
+    TTS_SENTENCE_PIPELINE: bool = True  # Synthesize per sentence while streaming
+    TTS_MAX_PARALLEL: int = 3  # Concurrent ElevenLabs requests per reply
+    TTS_MIN_SEGMENT_CHARS: int = 40  # Short sentences are merged into the next one
+    TTS_CACHE_ENABLED: bool = True  # Reuse audio for identical text/voice/model
+    TTS_CACHE_TTL: int = 604800  # 7 days since last use
+    TTS_CACHE_MAX_ENTRIES: int = 5000
     
     # D-ID Configuration
     DID_API_URL: str = "https://api.d-id.com"
     DID_TALKS_ENDPOINT: str = "/talks"
     DID_STREAMS_ENDPOINT: str = "/talks/streams"
+    DID_WEBHOOK_URL: str = ""  # Public URL of /api/webhooks/did; empty disables webhooks
+    DID_WEBHOOK_SECRET: str = ""  # Sent as ?token= and verified on callback; required for webhooks
+    DID_VIDEO_TIMEOUT: int = 60  # Seconds to wait for a talk to render
+    DID_POLL_INITIAL_INTERVAL: float = 0.5  # Fallback polling starts fast...
+    DID_POLL_MAX_INTERVAL: float = 5.0  # ...and backs off to this interval
+    DID_WEBHOOK_POLL_DELAY: float = 5.0  # First poll when a webhook is expected
+    DID_PARALLEL_RENDER: bool = True  # Render video from text alongside our TTS; delivered as a follow-up event
+    DID_STREAM_POOL_ENABLED: bool = False  # Real-time avatar over WebRTC instead of rendered /talks
+    DID_STREAM_POOL_SIZE: int = 2  # Idle pre-warmed sessions kept per companion
+    DID_STREAM_IDLE_TIMEOUT: int = 240  # Recycle idle sessions before D-ID expires them
     
     class Config:
         env_file = ".env"
@@ -75,6 +147,10 @@ class Settings(BaseSettings):
         pattern = r'^redis://[^:]+:\d+$'
         return bool(re.match(pattern, self.REDIS_URL))
     
+    def did_webhooks_enabled(self) -> bool:
+        """D-ID callbacks are only used when they can be authenticated"""
+        return bool(self.DID_WEBHOOK_URL and self.DID_WEBHOOK_SECRET)
+    
     def get_ice_servers(self) -> list:
         """Get WebRTC ICE server configuration"""
         return [
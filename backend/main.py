@@ -3,24 +3,32 @@ Main FastAPI application with Lambda handler
 """
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
 from mangum import Mangum
 from datetime import datetime
-import uuid
 import traceback
 from contextlib import asynccontextmanager
 
 from config import settings
 from services.redis_client import redis_client
+from services.rate_limiter import rate_limiter, local_rate_limiter
 from services.ai_tutor import ai_tutor_service
 from services.video_avatar import video_avatar_service
-from utils.logger import logger, request_id_var, user_id_var
-from models.schemas import HealthResponse, ErrorResponse
+from services.tts_cache import tts_audio_cache
+from services.avatar_stream_pool import avatar_stream_pool
+from services.companion_registry import companion_registry
+from services.latency_budget import latency_budget
+from services.reply_scheduler import reply_scheduler
+from services.reply_coordinator import reply_coordinator
+from utils.logger import logger, request_id_var
+from utils.serialization import FastJSONResponse
+from utils.request_middleware import RequestMiddleware
+from models.schemas import HealthResponse, ErrorResponse, ErrorDetail
 
 # Import routers
 from routes.companions import router as companions_router
 from routes.rooms import router as rooms_router
 from routes.sessions import router as sessions_router
+from routes.webhooks import router as webhooks_router
 from socket_server import socket_app, sio
 
 
@@ -30,8 +38,16 @@ async def lifespan(app: FastAPI):
     logger.info("Starting Holo Tutor Hub backend...")
     try:
         await redis_client.connect()
+        if settings.RATE_LIMIT_LOCAL:
+            await local_rate_limiter.initialize()
+        else:
+            await rate_limiter.initialize()
+        await reply_coordinator.start()
+        await companion_registry.start()
         await ai_tutor_service.initialize()
         await video_avatar_service.initialize()
+        if settings.DID_STREAM_POOL_ENABLED:
+            await avatar_stream_pool.start()
         logger.info("All services initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize services: {str(e)}")
@@ -42,8 +58,14 @@ async def lifespan(app: FastAPI):
     # Shutdown
     logger.info("Shutting down Holo Tutor Hub backend...")
     try:
+        await reply_coordinator.stop()
+        await companion_registry.stop()
+        if settings.RATE_LIMIT_LOCAL:
+            await local_rate_limiter.close()
         await redis_client.disconnect()
         await ai_tutor_service.close()
+        if settings.DID_STREAM_POOL_ENABLED:
+            await avatar_stream_pool.stop()
         await video_avatar_service.close()
         logger.info("All services closed successfully")
     except Exception as e:
@@ -55,7 +77,8 @@ app = FastAPI(
     title="Holo Tutor Hub API",
     description="AI Video Tutor Backend with WebRTC and real-time chat",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 # CORS configuration
@@ -67,53 +90,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-
-@app.middleware("http")
-async def add_request_id(request: Request, call_next):
-    """Add unique request ID to each request for tracing"""
-    request_id = str(uuid.uuid4())
-    request_id_var.set(request_id)
-    
-    # Extract user_id from headers if available
-    user_id = request.headers.get("X-User-ID")
-    if user_id:
-        user_id_var.set(user_id)
-    
-    # Add request ID to response headers
-    response = await call_next(request)
-    response.headers["X-Request-ID"] = request_id
-    
-    return response
-
-
-@app.middleware("http")
-async def rate_limiting_middleware(request: Request, call_next):
-    """Simple rate limiting based on IP address"""
-    # Skip rate limiting for health check
-    if request.url.path == "/health":
-        return await call_next(request)
-    
-    client_ip = request.client.host
-    is_allowed = await redis_client.check_rate_limit(
-        client_ip,
-        settings.RATE_LIMIT_PER_MINUTE,
-        window=60
-    )
-    
-    if not is_allowed:
-        return JSONResponse(
-            status_code=429,
-            content={
-                "error": {
-                    "code": "RATE_LIMIT_EXCEEDED",
-                    "message": "Too many requests. Please try again later.",
-                    "timestamp": datetime.utcnow().isoformat() + "Z"
-                }
-            },
-            headers={"Retry-After": "60"}
-        )
-    
-    return await call_next(request)
+# Request ids and per-IP rate limiting, as one raw ASGI layer
+app.add_middleware(
+    RequestMiddleware,
+    limiter=local_rate_limiter if settings.RATE_LIMIT_LOCAL else rate_limiter,
+    limit=settings.RATE_LIMIT_PER_MINUTE,
+    window=60
+)
 
 
 @app.exception_handler(Exception)
@@ -143,9 +126,9 @@ async def global_exception_handler(request: Request, exc: Exception):
         )
     )
     
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=status_code,
-        content=error_response.dict()
+        content=error_response.model_dump()
     )
 
 
@@ -161,7 +144,12 @@ async def health_check():
         status="healthy" if redis_healthy else "degraded",
         timestamp=datetime.utcnow().isoformat() + "Z",
         redis_connected=redis_healthy,
-        environment=settings.ENV
+        environment=settings.ENV,
+        cache=redis_client.cache_stats(),
+        tts_cache=await tts_audio_cache.get_stats() if redis_healthy else None,
+        avatar_streams=avatar_stream_pool.get_stats() if settings.DID_STREAM_POOL_ENABLED else None,
+        reply_latency=await latency_budget.get_stats() if redis_healthy else None,
+        reply_scheduler=reply_scheduler.get_stats()
     )
 
 
@@ -169,6 +157,7 @@ async def health_check():
 app.include_router(companions_router)
 app.include_router(rooms_router)
 app.include_router(sessions_router)
+app.include_router(webhooks_router)
 
 
 @app.get("/")
@@ -0,0 +1,67 @@
+"""
+One-off migration of legacy Redis keys to the current storage layout.
+
+Safe to run repeatedly and while the server is live: keys already in the
+new layout are skipped, and the client also migrates legacy keys lazily
+on first access.
+
+Usage:
+    python migrate_redis.py
+"""
+import asyncio
+from services.redis_client import redis_client
+
+
+async def migrate_conversations() -> int:
+    """Convert JSON-string conversation:{room_id} keys into lists"""
+    migrated = 0
+    async for key in redis_client.redis.scan_iter(match="conversation:*", count=500):
+        room_id = key.split(":", 1)[1]
+        if await redis_client.migrate_conversation(room_id):
+            migrated += 1
+    return migrated
+
+
+async def migrate_session_histories() -> int:
+    """Convert JSON-array sessions:{user_id} keys into sorted set + hash"""
+    migrated = 0
+    async for key in redis_client.redis.scan_iter(match="sessions:*", count=500):
+        user_id = key.split(":", 1)[1]
+        if await redis_client.migrate_session_history(user_id):
+            migrated += 1
+    return migrated
+
+
+async def migrate_rooms() -> int:
+    """Convert JSON-string room:{room_id} keys into hash + participants set"""
+    migrated = 0
+    async for key in redis_client.redis.scan_iter(match="room:*", count=500):
+        if key.endswith(":participants"):
+            continue
+        room_id = key.split(":", 1)[1]
+        if await redis_client.migrate_room(room_id):
+            migrated += 1
+    return migrated
+
+
+async def main():
+    await redis_client.connect()
+    try:
+        print("=" * 60)
+        print("Migrating Redis keys")
+        print("=" * 60)
+        
+        conversations = await migrate_conversations()
+        print(f"   ✅ Conversations migrated: {conversations}")
+        
+        session_histories = await migrate_session_histories()
+        print(f"   ✅ Session histories migrated: {session_histories}")
+        
+        rooms = await migrate_rooms()
+        print(f"   ✅ Rooms migrated: {rooms}")
+    finally:
+        await redis_client.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
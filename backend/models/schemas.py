@@ -26,6 +26,11 @@ class HealthResponse(BaseModel):
     timestamp: str
     redis_connected: bool
     environment: str
+    cache: Optional[Dict[str, Any]] = None
+    tts_cache: Optional[Dict[str, Any]] = None
+    avatar_streams: Optional[Dict[str, Any]] = None
+    reply_latency: Optional[Dict[str, Any]] = None
+    reply_scheduler: Optional[Dict[str, Any]] = None
 
 
 # Companions
@@ -72,6 +77,13 @@ class RoomDetailsResponse(BaseModel):
     participants: List[str]
 
 
+class RoomMessagesResponse(BaseModel):
+    room_id: str
+    last_seq: int
+    messages: List[Dict[str, Any]]
+    has_more: bool
+
+
 # WebRTC
 class WebRTCConfigResponse(BaseModel):
     iceServers: List[Dict[str, Any]]
@@ -124,6 +136,7 @@ class TranscriptMessage(BaseModel):
     role: MessageRole
     content: str
     timestamp: float
+    seq: Optional[int] = None
 
 
 class TranscriptResponse(BaseModel):
@@ -132,6 +145,13 @@ class TranscriptResponse(BaseModel):
     messages: List[TranscriptMessage]
 
 
+class TranscriptPageResponse(BaseModel):
+    session_id: str
+    room_id: str
+    messages: List[TranscriptMessage]
+    next_cursor: Optional[int] = None  # pass as after_seq for the next page
+
+
 # Socket.IO Events
 class JoinRoomEvent(BaseModel):
     room_id: str
@@ -1,61 +1,43 @@
 """
 Companions/Tutors endpoints
 """
-from fastapi import APIRouter, HTTPException
-from typing import List
-import httpx
-from config import settings
-from services.redis_client import redis_client
-from models.schemas import Companion
+from fastapi import APIRouter, HTTPException, Request, Response
+from typing import Optional
+from services.companion_registry import companion_registry
 from utils.logger import logger
 
 router = APIRouter(prefix="/api/companions", tags=["companions"])
 
 
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check (weak comparison, as for GET)"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
 @router.get("")
-async def get_companions():
+async def get_companions(request: Request, tag: Optional[str] = None, voice_id: Optional[str] = None):
     """
-    Get list of available AI tutors/companions.
-    Cached for 1 hour to reduce API calls.
+    Get list of available AI tutors/companions, optionally filtered by tag
+    or voice. Served with an ETag of the catalog version; a matching
+    If-None-Match gets a 304.
     """
     try:
-        # Check cache first
-        cached_companions = await redis_client.cache_get("companions:all")
-        if cached_companions:
-            logger.info("Returning cached companions")
-            return cached_companions
-        
-        # Generate tutors list
-        companions = [
-            {
-                "id": "tutor_math_ada",
-                "name": "Professor Ada Lovelace",
-                "description": "Expert mathematics tutor specializing in algebra, calculus, geometry, and statistics. Known for patient explanations and real-world applications. Perfect for high school and college students.",
-                "avatar_url": "https://api.dicebear.com/7.x/avataaars/svg?seed=Ada&backgroundColor=b6e3f4",
-                "voice_id": "21m00Tcm4TlvDq8ikWAM",
-                "tags": ["Mathematics", "High School", "College"]
-            },
-            {
-                "id": "tutor_physics_newton",
-                "name": "Dr. Isaac Newton",
-                "description": "Physics enthusiast with expertise in classical mechanics, thermodynamics, electromagnetism, and quantum physics. Makes complex concepts accessible through intuitive explanations and practical examples.",
-                "avatar_url": "https://api.dicebear.com/7.x/avataaars/svg?seed=Newton&backgroundColor=c0aede",
-                "voice_id": "pNInz6obpgDQGcFmaJgB",
-                "tags": ["Physics", "College", "Advanced"]
-            }
-        ]
+        etag = companion_registry.etag
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
         
-        # Cache the companions
-        await redis_client.cache_set(
-            "companions:all",
-            companions,
-            settings.COMPANIONS_CACHE_TTL
+        return Response(
+            content=companion_registry.catalog_body(tag, voice_id),
+            media_type="application/json",
+            headers=headers
         )
-        logger.info(f"Generated and cached {len(companions)} companions")
-        return companions
                 
     except Exception as e:
-        logger.error(f"Error generating companions: {str(e)}")
+        logger.error(f"Error loading companions: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail="Failed to load tutors"
@@ -65,21 +47,10 @@ async def get_companions():
 @router.get("/{companion_id}")
 async def get_companion(companion_id: str):
     """Get specific companion by ID"""
-    try:
-        companions = await get_companions()
-        for companion in companions:
-            if companion.get("id") == companion_id:
-                return companion
-        
+    companion = companion_registry.get(companion_id)
+    if companion is None:
         raise HTTPException(
             status_code=404,
             detail=f"Companion {companion_id} not found"
         )
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error fetching companion {companion_id}: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail="Internal server error"
-        )
+    return companion
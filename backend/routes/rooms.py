@@ -1,18 +1,21 @@
 """
 Video room management endpoints
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from datetime import datetime
 import uuid
 from models.schemas import (
     CreateRoomRequest,
     CreateRoomResponse,
     RoomDetailsResponse,
+    RoomMessagesResponse,
     WebRTCConfigResponse
 )
 from services.redis_client import redis_client
+from services.transcript_archive import transcript_archive
 from utils.webrtc_config import get_webrtc_config
 from utils.logger import logger
+from utils.serialization import FastJSONResponse, trusted
 from config import settings
 
 router = APIRouter(prefix="/api/video", tags=["rooms"])
@@ -89,7 +92,8 @@ async def get_room(room_id: str):
                 detail="Room not found or expired"
             )
         
-        return RoomDetailsResponse(**room)
+        # Written by this service: skip re-validating it against the response model
+        return FastJSONResponse(trusted(RoomDetailsResponse, room))
         
     except HTTPException:
         raise
@@ -101,6 +105,27 @@ async def get_room(room_id: str):
         )
 
 
+@router.get("/rooms/{room_id}/messages", response_model=RoomMessagesResponse)
+async def get_room_messages(
+    room_id: str,
+    after_seq: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """
+    Get the messages after a given sequence number (delta sync on reconnect)
+    """
+    try:
+        delta = await redis_client.get_messages_since(room_id, after_seq, limit)
+        return FastJSONResponse(trusted(RoomMessagesResponse, {"room_id": room_id, **delta}))
+        
+    except Exception as e:
+        logger.error(f"Error fetching messages for room {room_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to fetch messages"
+        )
+
+
 @router.delete("/rooms/{room_id}")
 async def end_room(room_id: str):
     """
@@ -120,15 +145,20 @@ async def end_room(room_id: str):
         room["ended_at"] = datetime.now().timestamp()
         
         # Save final state temporarily
-        await redis_client.set_room(room_id, room, ttl=300)  # Keep for 5 minutes
+        await redis_client.update_room(
+            room_id,
+            {"status": room["status"], "ended_at": room["ended_at"]},
+            ttl=300  # Keep for 5 minutes
+        )
         
         # Get conversation for session history
         conversation = await redis_client.get_conversation(room_id, limit=1000)
         
         # Create session record
+        session_id = str(uuid.uuid4())
         duration = int(room["ended_at"] - room["created_at"])
         session_data = {
-            "session_id": str(uuid.uuid4()),
+            "session_id": session_id,
             "room_id": room_id,
             "companion_id": room["companion_id"],
             "started_at": room["created_at"],
@@ -138,12 +168,19 @@ async def end_room(room_id: str):
             "transcript_preview": conversation[0]["message"][:100] if conversation else ""
         }
         
+        # Move the transcript to S3 so it outlives the conversation's Redis TTL
+        archive = None
+        if settings.TRANSCRIPT_ARCHIVE_ENABLED:
+            archive = await transcript_archive.archive(room_id, room["user_id"], session_id)
+            if archive:
+                session_data["transcript_key"] = archive["transcript_key"]
+        
         # Append to user's session history
         await redis_client.append_session(room["user_id"], session_data)
         
         logger.info(f"Room {room_id} ended and saved to history")
         
-        return {"message": "Room ended successfully", "room_id": room_id}
+        return {"message": "Room ended successfully", "room_id": room_id, "archive": archive}
         
     except HTTPException:
         raise
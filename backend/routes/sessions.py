@@ -2,14 +2,46 @@
 Session history endpoints
 """
 from fastapi import APIRouter, HTTPException, Query
-from typing import List
-from models.schemas import SessionHistoryResponse, TranscriptResponse, TranscriptMessage, SessionSummary
+from fastapi.responses import StreamingResponse
+from typing import Any, AsyncIterator, Dict, List
+import asyncio
+from models.schemas import (
+    SessionHistoryResponse,
+    TranscriptResponse,
+    TranscriptMessage,
+    TranscriptPageResponse,
+    SessionSummary
+)
 from services.redis_client import redis_client
-from routes.companions import get_companion
+from services.companion_registry import companion_registry
+from services.transcript_archive import transcript_archive
 from utils.logger import logger
+from utils.serialization import FastJSONResponse, dumps_bytes, trusted
 
 router = APIRouter(prefix="/api/video/sessions", tags=["sessions"])
 
+STREAM_BATCH_SIZE = 100  # messages read from Redis per round trip when streaming
+
+
+def _transcript_entry(msg: Dict[str, Any], position: int) -> Dict[str, Any]:
+    """A stored message in transcript form (seq falls back to its position)"""
+    return {
+        "role": msg.get("sender", "user"),
+        "content": msg.get("message", msg.get("content", "")),
+        "timestamp": msg.get("timestamp", 0),
+        "seq": msg.get("seq", position)
+    }
+
+
+async def _find_session(user_id: str, session_id: str) -> Dict[str, Any]:
+    session = await redis_client.get_session(user_id, session_id)
+    if not session:
+        raise HTTPException(
+            status_code=404,
+            detail="Session not found"
+        )
+    return session
+
 
 @router.get("/{user_id}", response_model=SessionHistoryResponse)
 async def get_user_sessions(
@@ -21,36 +53,40 @@ async def get_user_sessions(
     Get user's past session history with pagination
     """
     try:
-        sessions = await redis_client.get_session_history(user_id, offset, limit)
+        sessions, total = await asyncio.gather(
+            redis_client.get_session_history(user_id, offset, limit),
+            redis_client.count_sessions(user_id)
+        )
         
-        # Enrich with companion data
+        # Enrich with companion data, resolving the page's companions in one lookup
+        companions = await companion_registry.resolve_many(
+            session["companion_id"] for session in sessions
+        )
         enriched_sessions = []
         for session in sessions:
             try:
-                companion = await get_companion(session["companion_id"])
-                session_summary = SessionSummary(
-                    session_id=session["session_id"],
-                    room_id=session["room_id"],
-                    companion={
-                        "id": companion.id,
-                        "name": companion.name,
-                        "avatar_url": companion.avatar_url
+                companion = companions.get(session["companion_id"])
+                if companion is None:
+                    logger.warning(f"Unknown companion {session['companion_id']} in session {session['session_id']}")
+                    continue
+                enriched_sessions.append(trusted(SessionSummary, {
+                    **session,
+                    "companion": {
+                        "id": companion["id"],
+                        "name": companion["name"],
+                        "avatar_url": companion.get("avatar_url", "")
                     },
-                    started_at=session["started_at"],
-                    ended_at=session.get("ended_at"),
-                    duration_seconds=session["duration_seconds"],
-                    message_count=session["message_count"],
-                    transcript_preview=session.get("transcript_preview", "")
-                )
-                enriched_sessions.append(session_summary)
+                    "transcript_preview": session.get("transcript_preview", "")
+                }))
             except Exception as e:
                 logger.error(f"Error enriching session: {str(e)}")
                 continue
         
-        return SessionHistoryResponse(
-            sessions=enriched_sessions,
-            total=len(enriched_sessions)
-        )
+        # Session records and companions are trusted: skip response re-validation
+        return FastJSONResponse({
+            "sessions": enriched_sessions,
+            "total": total
+        })
         
     except Exception as e:
         logger.error(f"Error fetching session history for user {user_id}: {str(e)}")
@@ -66,14 +102,8 @@ async def get_session_transcript(user_id: str, session_id: str):
     Get full conversation transcript for a specific session
     """
     try:
-        # Get user's sessions to find the room_id
-        sessions = await redis_client.get_session_history(user_id, offset=0, limit=1000)
-        
-        target_session = None
-        for session in sessions:
-            if session["session_id"] == session_id:
-                target_session = session
-                break
+        # Look up the session to find the room_id
+        target_session = await redis_client.get_session(user_id, session_id)
         
         if not target_session:
             raise HTTPException(
@@ -81,9 +111,14 @@ async def get_session_transcript(user_id: str, session_id: str):
                 detail="Session not found"
             )
         
-        # Get conversation from room
+        # Archived sessions are read from S3 (through the cache); older
+        # sessions only have the room's conversation while it lasts in Redis
         room_id = target_session["room_id"]
-        conversation = await redis_client.get_conversation(room_id, limit=1000)
+        conversation = None
+        if target_session.get("transcript_key"):
+            conversation = await transcript_archive.load(target_session["transcript_key"])
+        if conversation is None:
+            conversation = await redis_client.get_conversation(room_id, limit=1000)
         
         # Format messages
         messages = []
@@ -108,3 +143,91 @@ async def get_session_transcript(user_id: str, session_id: str):
             status_code=500,
             detail="Failed to fetch transcript"
         )
+
+
+@router.get("/{user_id}/{session_id}/transcript/page", response_model=TranscriptPageResponse)
+async def get_session_transcript_page(
+    user_id: str,
+    session_id: str,
+    after_seq: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500)
+):
+    """
+    Get one page of a transcript, oldest first. Pass next_cursor back as
+    after_seq for the following page; it is null on the last page.
+    """
+    try:
+        target_session = await _find_session(user_id, session_id)
+        room_id = target_session["room_id"]
+        
+        conversation = None
+        if target_session.get("transcript_key"):
+            conversation = await transcript_archive.load(target_session["transcript_key"])
+        if conversation is not None:
+            entries = [
+                entry for entry in (
+                    _transcript_entry(msg, position)
+                    for position, msg in enumerate(conversation, start=1)
+                )
+                if entry["seq"] > after_seq
+            ]
+            has_more = len(entries) > limit
+            entries = entries[:limit]
+        else:
+            delta = await redis_client.get_messages_since(room_id, after_seq, limit)
+            entries = [_transcript_entry(msg, after_seq + i) for i, msg in enumerate(delta["messages"], start=1)]
+            has_more = delta["has_more"]
+        
+        return FastJSONResponse({
+            "session_id": session_id,
+            "room_id": room_id,
+            "messages": entries,
+            "next_cursor": entries[-1]["seq"] if has_more and entries else None
+        })
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching transcript page for session {session_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to fetch transcript"
+        )
+
+
+@router.get("/{user_id}/{session_id}/transcript/stream")
+async def stream_session_transcript(user_id: str, session_id: str):
+    """
+    Stream a transcript as NDJSON (one message per line), read from the S3
+    archive or Redis as it is sent, so memory use does not grow with its length
+    """
+    target_session = await _find_session(user_id, session_id)
+    room_id = target_session["room_id"]
+    transcript_key = target_session.get("transcript_key")
+    
+    async def archived_messages() -> AsyncIterator[Dict[str, Any]]:
+        position = 0
+        async for msg in transcript_archive.iter_messages(transcript_key):
+            position += 1
+            yield _transcript_entry(msg, position)
+    
+    async def redis_messages() -> AsyncIterator[Dict[str, Any]]:
+        after_seq = 0
+        while True:
+            delta = await redis_client.get_messages_since(room_id, after_seq, STREAM_BATCH_SIZE)
+            for msg in delta["messages"]:
+                after_seq = msg.get("seq", after_seq + 1)
+                yield _transcript_entry(msg, after_seq)
+            if not delta["has_more"] or not delta["messages"]:
+                return
+    
+    async def ndjson() -> AsyncIterator[bytes]:
+        try:
+            messages = archived_messages() if transcript_key else redis_messages()
+            async for entry in messages:
+                yield dumps_bytes(entry) + b"\n"
+        except Exception as e:
+            # Headers are already sent: end the stream early
+            logger.error(f"Error streaming transcript for session {session_id}: {str(e)}")
+    
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
@@ -0,0 +1,43 @@
+"""
+Inbound webhooks from external providers
+"""
+import hmac
+from fastapi import APIRouter, HTTPException, Query
+from typing import Any, Dict, Optional
+from config import settings
+from services.video_avatar import video_avatar_service
+from utils.logger import logger
+
+router = APIRouter(prefix="/api/webhooks", tags=["webhooks"])
+
+
+@router.post("/did")
+async def did_talk_webhook(talk: Dict[str, Any], token: Optional[str] = Query(None)):
+    """
+    D-ID talk completion callback.
+    Resolves every process waiting on the talk immediately.
+    Rejected unless webhooks are enabled with a secret, since the
+    result_url it carries is broadcast to the room.
+    """
+    if not settings.did_webhooks_enabled() or not hmac.compare_digest(token or "", settings.DID_WEBHOOK_SECRET):
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid webhook token"
+        )
+    
+    if not talk.get("id"):
+        raise HTTPException(
+            status_code=400,
+            detail="Missing talk id"
+        )
+    
+    try:
+        await video_avatar_service.completion_tracker.publish(talk)
+        logger.info(f"D-ID webhook received for talk {talk['id']}: {talk.get('status')}")
+        return {"received": True}
+    except Exception as e:
+        logger.error(f"Error handling D-ID webhook: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to process webhook"
+        )
@@ -0,0 +1,263 @@
+"""
+AI reply generation and delivery to a Socket.IO room
+"""
+import asyncio
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, List, Optional, Union
+import socketio
+from services.redis_client import redis_client
+from services.ai_tutor import ai_tutor_service
+from services.reply_scheduler import reply_scheduler
+from services.reply_coordinator import reply_coordinator
+from utils.logger import logger, log_with_context
+
+# Anything with Socket.IO's emit(event, data, room=...) signature
+Emitter = Union[socketio.AsyncServer, socketio.AsyncRedisManager]
+DeliveryCheck = Callable[[], Awaitable[bool]]
+DeliveryHook = Callable[[], Awaitable[Any]]
+
+
+async def generate_ai_response(
+    emitter: Emitter,
+    room_id: str,
+    user_message: str,
+    companion_id: str,
+    message_id: Optional[str] = None,
+    is_delivered: Optional[DeliveryCheck] = None,
+    mark_delivered: Optional[DeliveryHook] = None,
+    generation: Optional[int] = None,
+    consumed: int = 0,
+    client_message_ids: Optional[List[str]] = None
+):
+    """
+    Generate an AI response with video avatar and broadcast it to the room
+    
+    Args:
+        emitter: Socket.IO server (in-process) or write-only Redis manager (worker)
+        message_id: Stable id for the reply; retried jobs reuse it so clients
+            overwrite the same draft instead of showing duplicates
+        is_delivered: Awaited before the reply is stored and broadcast; if it
+            returns True an earlier delivery already went out and this one
+            is dropped
+        mark_delivered: Awaited once the reply has been broadcast. A crash
+            before that leaves the reply to be generated again (clients
+            collapse the repeat by message_id)
+        generation: Room reply generation (see reply_coordinator) this reply
+            answers; it is cancelled as soon as a newer user message arrives
+        consumed: Number of queued user messages user_message merges
+        client_message_ids: Client ids of those messages; duplicates of them
+            are answered with this reply once it is delivered
+    """
+    message_id = message_id or uuid.uuid4().hex
+    work = _generate_and_deliver(
+        emitter, room_id, user_message, companion_id, message_id, is_delivered,
+        mark_delivered, generation, consumed, client_message_ids or []
+    )
+    if generation is None:
+        await work
+    elif not await reply_coordinator.run(room_id, generation, work):
+        await _emit_superseded(emitter, room_id, message_id)
+
+
+async def _generate_and_deliver(
+    emitter: Emitter,
+    room_id: str,
+    user_message: str,
+    companion_id: str,
+    message_id: str,
+    is_delivered: Optional[DeliveryCheck],
+    mark_delivered: Optional[DeliveryHook],
+    generation: Optional[int],
+    consumed: int,
+    client_message_ids: List[str]
+):
+    started = time.perf_counter()
+    first_chunk_at = None
+    seq = 0
+    stages = {}
+    # Resolves True once the final message is out, False if it never will be
+    delivered = asyncio.get_running_loop().create_future()
+    
+    async def emit_chunk(delta: str):
+        """Forward each streamed text delta to the room as it arrives"""
+        nonlocal first_chunk_at, seq
+        if first_chunk_at is None:
+            first_chunk_at = time.perf_counter()
+        await emitter.emit(
+            'message-chunk',
+            {
+                "message_id": message_id,
+                "seq": seq,
+                "delta": delta,
+                "sender": "ai"
+            },
+            room=room_id
+        )
+        seq += 1
+    
+    async def emit_audio_segment(index: int, text: str, audio_url: str):
+        """Announce each sentence's audio, in order, as soon as it is uploaded"""
+        if not audio_url:
+            return
+        await emitter.emit(
+            'audio-segment',
+            {
+                "message_id": message_id,
+                "index": index,
+                "text": text,
+                "audio_url": audio_url
+            },
+            room=room_id
+        )
+    
+    async def emit_video(video_url: Optional[str], video_ms: float):
+        """Follow-up for avatars rendered in parallel; never overtakes the message"""
+        if not video_url or not await delivered:
+            return
+        await emitter.emit(
+            'message-video',
+            {
+                "message_id": message_id,
+                "video_url": video_url,
+                "latency": {
+                    "video_ms": video_ms,
+                    "total_ms": round((time.perf_counter() - started) * 1000, 1)
+                }
+            },
+            room=room_id
+        )
+    
+    # Wait for a reply slot; under load the level strips media from the reply
+    media_level = await reply_scheduler.acquire(room_id)
+    if media_level is None:
+        delivered.set_result(False)
+        # The student is told to try again: let the retry be processed
+        await redis_client.release_client_messages(room_id, client_message_ids)
+        await emitter.emit(
+            'message',
+            {
+                "message_id": message_id,
+                "message": "Lots of students are asking questions right now. Please try again in a moment.",
+                "sender": "ai",
+                "timestamp": datetime.now().timestamp(),
+                # The queued input stays pending for the next reply
+                "reply_seq": await _next_reply_seq(room_id, 0)
+            },
+            room=room_id
+        )
+        return
+    
+    try:
+        # Generate AI response with video avatar
+        try:
+            response_text, audio_url, video_url = await ai_tutor_service.generate_response(
+                room_id,
+                user_message,
+                companion_id,
+                on_text_chunk=emit_chunk,
+                on_audio_segment=emit_audio_segment,
+                on_video=emit_video,
+                timings=stages,
+                media_level=media_level
+            )
+        finally:
+            reply_scheduler.release()
+        
+        if is_delivered and await is_delivered():
+            logger.info(f"AI response {message_id} already delivered, skipping duplicate")
+            delivered.set_result(False)
+            return
+        
+        if generation is not None:
+            # Detach before checking: a notice arriving after is_current
+            # passed must not cancel the delivery below
+            reply_coordinator.detach()
+            if not await reply_coordinator.is_current(room_id, generation):
+                logger.info(f"AI response {message_id} superseded before delivery")
+                delivered.set_result(False)
+                await _emit_superseded(emitter, room_id, message_id)
+                return
+        
+        reply_seq = await reply_coordinator.complete(room_id, consumed)
+        timestamp = datetime.now().timestamp()
+        
+        # Create AI message object (message_id lets a client that syncs
+        # after a reconnect replace the draft built from its chunks)
+        ai_message = {
+            "message_id": message_id,
+            "message": response_text,
+            "sender": "ai",
+            "timestamp": timestamp,
+            "audio_url": audio_url,
+            "video_url": video_url,
+            "reply_seq": reply_seq
+        }
+        
+        # Append to conversation
+        conversation_seq = await redis_client.append_message(room_id, ai_message)
+        
+        latency = {
+            "first_token_ms": round((first_chunk_at - started) * 1000, 1) if first_chunk_at else None,
+            "total_ms": round((time.perf_counter() - started) * 1000, 1),
+            "stages": stages,
+            "media_level": media_level
+        }
+        
+        reply = {
+            "message_id": message_id,
+            "message": response_text,
+            "sender": "ai",
+            "timestamp": timestamp,
+            "audio_url": audio_url,
+            "video_url": video_url,
+            "reply_seq": reply_seq,
+            "seq": conversation_seq,
+            "chunks": seq,
+            "latency": latency
+        }
+        
+        # Broadcast AI response with video avatar
+        await emitter.emit('message', reply, room=room_id)
+        delivered.set_result(True)
+        if mark_delivered:
+            await mark_delivered()
+        
+        # Retried deliveries of the same client messages get this reply back
+        await redis_client.record_client_reply(room_id, client_message_ids, reply)
+        
+        log_with_context(logger, "info", f"AI response sent to room {room_id}", **latency)
+        
+    except Exception as e:
+        logger.error(f"Error generating AI response: {str(e)}")
+        if not delivered.done():
+            delivered.set_result(False)
+        # Let the client retry these messages
+        await redis_client.release_client_messages(room_id, client_message_ids)
+        # Send fallback message
+        await emitter.emit(
+            'message',
+            {
+                "message_id": message_id,
+                "message": "I'm having trouble responding right now. Please try again.",
+                "sender": "ai",
+                "timestamp": datetime.now().timestamp(),
+                "reply_seq": await _next_reply_seq(room_id, consumed)
+            },
+            room=room_id
+        )
+
+
+async def _next_reply_seq(room_id: str, consumed: int) -> Optional[int]:
+    """Sequence number for canned replies; never fails the reply itself"""
+    try:
+        return await reply_coordinator.complete(room_id, consumed)
+    except Exception as e:
+        logger.error(f"Failed to assign reply sequence in room {room_id}: {str(e)}")
+        return None
+
+
+async def _emit_superseded(emitter: Emitter, room_id: str, message_id: str):
+    """Let clients drop the draft of a reply that will never be finished"""
+    await emitter.emit('message-superseded', {"message_id": message_id}, room=room_id)
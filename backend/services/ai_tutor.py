@@ -3,15 +3,34 @@ AI Tutor service integrating Google Gemini, ElevenLabs, and D-ID
 """
 import httpx
 import asyncio
-from typing import Optional, Dict, List, Tuple
-from datetime import datetime
-from elevenlabs.client import ElevenLabs
+import time
+import uuid
+from typing import Optional, Dict, List, Tuple, Callable, Awaitable
+from elevenlabs.client import AsyncElevenLabs
 from elevenlabs import VoiceSettings
 from config import settings
 from services.redis_client import redis_client
 from services.s3_client import s3_client
 from services.video_avatar import video_avatar_service
-from utils.logger import logger
+from services.avatar_stream_pool import avatar_stream_pool
+from services.companion_registry import companion_registry
+from services.tts_pipeline import SentenceTTSPipeline, SegmentHandler
+from services.tts_cache import tts_audio_cache
+from services.latency_budget import Deadline, latency_budget
+from services.reply_scheduler import LEVEL_FULL, LEVEL_TEXT
+from services.reply_coordinator import reply_coordinator
+from utils.logger import logger, log_with_context
+from utils.stage_timer import StageTimer
+from utils.serialization import loads
+
+# Receives each incremental piece of LLM text as it is generated
+TextChunkHandler = Callable[[str], Awaitable[None]]
+
+# Receives (video_url, video_ms) for avatars rendered in parallel with the audio
+VideoHandler = Callable[[Optional[str], float], Awaitable[None]]
+
+# ElevenLabs voice settings (also part of the TTS cache key)
+VOICE_SETTINGS = {"stability": 0.5, "similarity_boost": 0.75}
 
 
 class AITutorService:
@@ -20,8 +39,9 @@ class AITutorService:
     def __init__(self):
         self.openrouter_url = settings.OPENROUTER_API_URL
         self.api_key = settings.OPENROUTER_API_KEY
-        self.elevenlabs_client = ElevenLabs(api_key=settings.ELEVENLABS_API_KEY)
+        self.elevenlabs_client = AsyncElevenLabs(api_key=settings.ELEVENLABS_API_KEY)
         self.http_client: Optional[httpx.AsyncClient] = None
+        self._video_tasks = set()
     
     async def initialize(self):
         """Initialize async HTTP client"""
@@ -37,12 +57,40 @@ class AITutorService:
         self,
         room_id: str,
         user_message: str,
-        companion_id: str
+        companion_id: str,
+        on_text_chunk: Optional[TextChunkHandler] = None,
+        on_audio_segment: Optional[SegmentHandler] = None,
+        on_video: Optional[VideoHandler] = None,
+        timings: Optional[Dict[str, float]] = None,
+        media_level: str = LEVEL_FULL
     ) -> Tuple[str, Optional[str], Optional[str]]:
         """
         Generate AI response with text, audio, and video avatar
+        If on_text_chunk is given (and GEMINI_STREAMING is enabled), it is
+        awaited with each text delta while Gemini is still generating.
+        If on_audio_segment is also given (and TTS_SENTENCE_PIPELINE is
+        enabled), each sentence is synthesized while generation continues
+        and announced in order as soon as its audio is uploaded.
+        If on_video is given (and DID_PARALLEL_RENDER is enabled), D-ID renders
+        from the text while our own audio is synthesized; the result is handed
+        to on_video later and video_url is returned as None.
+        Per-stage durations (ms) are recorded into timings when given.
+        Stages are bounded by REPLY_DEADLINE_SECONDS: TTS and video are
+        skipped when their recent p90 no longer fits in the time left, and
+        cancelled when they overrun their stage budget. If the deadline fires
+        while Gemini is still streaming, the text already sent is returned
+        without media.
+        media_level (the scheduler's brownout level) drops video ("audio")
+        or both audio and video ("text") up front.
         Returns: (response_text, audio_url, video_url)
         """
+        pipeline: Optional[SentenceTTSPipeline] = None
+        timer = StageTimer(timings)
+        deadline = Deadline(settings.REPLY_DEADLINE_SECONDS)
+        skipped: List[str] = []
+        # Resolved with the audio URL once the TTS stage is over
+        audio_done = asyncio.get_running_loop().create_future()
+        video_pending = False
         try:
             # Get companion data
             companion = await self._get_companion_data(companion_id)
@@ -55,83 +103,230 @@ class AITutorService:
             # Build prompt for Gemini
             prompt = await self._build_prompt(companion, user_message, conversation)
             
-            # Generate text response from Gemini
-            response_text = await self._call_gemini(prompt)
+            # Check ElevenLabs token usage
+            token_usage = await redis_client.get_token_usage("elevenlabs")
+            voice_id = companion.get("voice_id", "")
+            
+            # Rooms with a leased streaming avatar are fed audio as it is produced
+            stream_lease = await avatar_stream_pool.get_lease(room_id) if settings.DID_STREAM_POOL_ENABLED else None
+            if stream_lease and on_audio_segment:
+                on_audio_segment = self._speak_segments(stream_lease, on_audio_segment)
+            
+            timer.mark("context")
+            
+            want_audio = media_level != LEVEL_TEXT
+            want_video = media_level == LEVEL_FULL
+            if not want_audio:
+                skipped.append("brownout:tts")
+            if not want_video:
+                skipped.append("brownout:video")
+            
+            streaming = bool(on_text_chunk) and settings.GEMINI_STREAMING
+            if (
+                streaming
+                and want_audio
+                and on_audio_segment
+                and settings.TTS_SENTENCE_PIPELINE
+                and voice_id
+                and token_usage < settings.ELEVENLABS_TOKEN_LIMIT
+            ):
+                pipeline = self._create_tts_pipeline(voice_id, room_id, on_audio_segment)
+            
+            # Deltas already sent to the room, kept if the deadline cuts the stream short
+            streamed: List[str] = []
+            
+            async def on_chunk(delta: str):
+                streamed.append(delta)
+                if pipeline:
+                    pipeline.feed(delta)
+                await on_text_chunk(delta)
+            
+            # Generate text response from Gemini, within what is left of the deadline
+            try:
+                if streaming:
+                    response_text = await asyncio.wait_for(self._stream_gemini(prompt, on_chunk), deadline.remaining())
+                else:
+                    response_text = await asyncio.wait_for(self._call_gemini(prompt), deadline.remaining())
+            except asyncio.TimeoutError:
+                logger.warning(f"Gemini exceeded the {settings.REPLY_DEADLINE_SECONDS}s reply deadline")
+                response_text = "".join(streamed).strip()
+                if response_text:
+                    # The room already shows this text; deliver it without media
+                    if pipeline:
+                        pipeline.cancel()
+                    if want_audio:
+                        skipped.append("tts")
+                    if want_video:
+                        skipped.append("video")
+                    timer.mark("llm")
+                    await latency_budget.record(timer.stages)
+                    await self._record_tier(None, None, skipped)
+                    return response_text, None, None
             if not response_text:
+                if pipeline:
+                    pipeline.cancel()
                 return self._fallback_response()
+            timer.mark("llm")
             
-            # Check ElevenLabs token usage
-            token_usage = await redis_client.get_token_usage("elevenlabs")
             audio_url = None
             video_url = None
             
-            if token_usage < settings.ELEVENLABS_TOKEN_LIMIT:
-                # Generate voice audio
-                audio_url = await self._generate_audio(
-                    response_text,
-                    companion.get("voice_id", ""),
-                    room_id
+            if want_audio and token_usage < settings.ELEVENLABS_TOKEN_LIMIT:
+                avatar_image_url = companion.get("avatar_url", "") if want_video else ""
+                render_in_parallel = bool(
+                    on_video
+                    and settings.DID_PARALLEL_RENDER
+                    and not stream_lease
+                    and avatar_image_url
+                    and voice_id
                 )
+                if render_in_parallel:
+                    if await latency_budget.fits("video", deadline):
+                        # D-ID synthesizes the same voice itself, so it needs no audio from us
+                        self._render_video_in_background(
+                            response_text, avatar_image_url, voice_id, on_video, deadline, audio_done
+                        )
+                        video_pending = True
+                    else:
+                        skipped.append("video")
                 
-                if audio_url:
-                    # Track token usage (approximate)
-                    estimated_tokens = len(response_text)
-                    await redis_client.increment_token_usage("elevenlabs", estimated_tokens)
-                    
+                # Generate voice audio
+                if await latency_budget.fits("tts", deadline):
+                    try:
+                        if pipeline:
+                            tts = self._finish_tts_pipeline(pipeline, response_text, voice_id, room_id)
+                        else:
+                            tts = self._generate_audio(response_text, voice_id, room_id)
+                        audio_url = await asyncio.wait_for(tts, deadline.timeout_for(settings.TTS_STAGE_BUDGET))
+                    except asyncio.TimeoutError:
+                        logger.warning("TTS overran its budget, delivering text only")
+                        skipped.append("tts")
+                        if pipeline:
+                            pipeline.cancel()
+                    timer.mark("tts")
+                else:
+                    skipped.append("tts")
+                    if pipeline:
+                        pipeline.cancel()
+                audio_done.set_result(audio_url)
+                
+                if audio_url and stream_lease:
+                    # Pipelined replies were already spoken sentence by sentence
+                    if not pipeline:
+                        await avatar_stream_pool.speak(stream_lease, audio_url)
+                elif audio_url and not render_in_parallel and avatar_image_url:
                     # Generate video avatar with D-ID
-                    avatar_image_url = companion.get("avatar_url", "")
-                    if avatar_image_url:
-                        video_result = await video_avatar_service.create_talking_avatar(
-                            text=response_text,
-                            audio_url=audio_url,
-                            avatar_image_url=avatar_image_url,
-                            voice_id=companion.get("voice_id")
-                        )
+                    if await latency_budget.fits("video", deadline):
+                        try:
+                            video_result = await asyncio.wait_for(
+                                video_avatar_service.create_talking_avatar(
+                                    text=response_text,
+                                    audio_url=audio_url,
+                                    avatar_image_url=avatar_image_url,
+                                    voice_id=companion.get("voice_id")
+                                ),
+                                deadline.timeout_for(settings.VIDEO_STAGE_BUDGET)
+                            )
+                        except asyncio.TimeoutError:
+                            logger.warning("D-ID overran its budget, delivering audio only")
+                            skipped.append("video")
+                            video_result = None
                         
                         if video_result:
                             video_url = video_result.get("video_url")
                             logger.info(f"Video avatar generated: {video_url}")
                         else:
                             logger.warning("Failed to generate video avatar, falling back to audio only")
-            else:
+                        timer.mark("video")
+                    else:
+                        skipped.append("video")
+            elif want_audio:
                 logger.warning("ElevenLabs token limit reached, returning text-only response")
             
+            await latency_budget.record(timer.stages)
+            if not video_pending:
+                # Parallel renders record the tier once the video settles
+                await self._record_tier(video_url, audio_url, skipped)
+            
             return response_text, audio_url, video_url
             
+        except asyncio.CancelledError:
+            # Superseded: stop synthesizing and announcing the remaining segments
+            if pipeline:
+                pipeline.cancel()
+            raise
         except Exception as e:
             logger.error(f"Error generating AI response: {str(e)}")
+            if pipeline:
+                pipeline.cancel()
             return self._fallback_response()
+        finally:
+            if not audio_done.done():
+                audio_done.set_result(None)
     
-    async def _get_companion_data(self, companion_id: str) -> Optional[Dict]:
-        """Retrieve companion data from cache"""
-        try:
-            # Check cache first
-            companions = await redis_client.cache_get("companions:all")
-            if companions:
-                for companion in companions:
-                    if companion.get("id") == companion_id:
-                        return companion
-            
-            # Fallback: fetch from external API
-            response = await self.http_client.get(
-                settings.PERSONAS_API_URL,
-                timeout=10.0
-            )
-            if response.status_code == 200:
-                companions = response.json()
-                # Cache for future use
-                await redis_client.cache_set(
-                    "companions:all",
-                    companions,
-                    settings.COMPANIONS_CACHE_TTL
+    async def _record_tier(self, video_url: Optional[str], audio_url: Optional[str], skipped: List[str]):
+        tier = "video" if video_url else "audio" if audio_url else "text"
+        await latency_budget.record_tier(tier, skipped)
+        log_with_context(logger, "info", f"Reply delivered as {tier}", tier=tier, skipped=skipped)
+    
+    def _render_video_in_background(
+        self,
+        text: str,
+        avatar_image_url: str,
+        voice_id: str,
+        on_video: VideoHandler,
+        deadline: Deadline,
+        audio_done: asyncio.Future
+    ):
+        """Render the avatar from text off the critical path and report it via on_video"""
+        async def render():
+            started = time.perf_counter()
+            video_url = None
+            skipped = []
+            try:
+                video_result = await asyncio.wait_for(
+                    video_avatar_service.create_talking_avatar(
+                        text=text,
+                        audio_url=None,
+                        avatar_image_url=avatar_image_url,
+                        voice_id=voice_id
+                    ),
+                    deadline.timeout_for(settings.VIDEO_STAGE_BUDGET)
                 )
-                
-                for companion in companions:
-                    if companion.get("id") == companion_id:
-                        return companion
-            
-            return None
+                if video_result:
+                    video_url = video_result.get("video_url")
+                    logger.info(f"Video avatar generated: {video_url}")
+                else:
+                    logger.warning("Failed to generate video avatar, falling back to audio only")
+            except asyncio.TimeoutError:
+                logger.warning("D-ID overran its budget, delivering audio only")
+                skipped.append("video")
+            except Exception as e:
+                logger.error(f"Error rendering video avatar: {str(e)}")
             
+            video_ms = round((time.perf_counter() - started) * 1000, 1)
+            await latency_budget.record({"video": video_ms})
+            await self._record_tier(video_url, await audio_done, skipped)
+            await on_video(video_url, video_ms)
+        
+        task = asyncio.create_task(render())
+        reply_coordinator.attach(task)
+        self._video_tasks.add(task)
+        task.add_done_callback(self._video_tasks.discard)
+    
+    def _speak_segments(self, stream_lease: Dict, on_audio_segment: SegmentHandler) -> SegmentHandler:
+        """Also play each announced sentence through the room's streaming avatar"""
+        async def announce(index: int, text: str, audio_url: Optional[str]):
+            await on_audio_segment(index, text, audio_url)
+            if audio_url:
+                await avatar_stream_pool.speak(stream_lease, audio_url)
+        
+        return announce
+    
+    async def _get_companion_data(self, companion_id: str) -> Optional[Dict]:
+        """Retrieve companion data from the registry"""
+        try:
+            return await companion_registry.resolve(companion_id)
         except Exception as e:
             logger.error(f"Failed to get companion data: {str(e)}")
             return None
@@ -180,8 +375,8 @@ Be encouraging, specific, and actionable in your suggestions."""
 
         return prompt
     
-    async def _call_gemini(self, prompt: str, max_retries: int = 3) -> Optional[str]:
-        """Call Google Gemini via OpenRouter API with retry logic"""
+    def _openrouter_request(self, prompt: str, stream: bool = False) -> Tuple[Dict, Dict]:
+        """Build OpenRouter chat completion headers and payload"""
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
@@ -197,6 +392,14 @@ Be encouraging, specific, and actionable in your suggestions."""
             "temperature": settings.GEMINI_TEMPERATURE,
             "max_tokens": settings.GEMINI_MAX_TOKENS
         }
+        if stream:
+            payload["stream"] = True
+        
+        return headers, payload
+    
+    async def _call_gemini(self, prompt: str, max_retries: int = 3) -> Optional[str]:
+        """Call Google Gemini via OpenRouter API with retry logic"""
+        headers, payload = self._openrouter_request(prompt)
         
         for attempt in range(max_retries):
             try:
@@ -231,47 +434,136 @@ Be encouraging, specific, and actionable in your suggestions."""
         
         return None
     
+    async def _stream_gemini(
+        self,
+        prompt: str,
+        on_chunk: TextChunkHandler,
+        max_retries: int = 3
+    ) -> Optional[str]:
+        """
+        Stream Gemini output via OpenRouter SSE, passing each delta to on_chunk
+        Retries only happen before the first delta has been delivered.
+        Returns the full response text.
+        """
+        headers, payload = self._openrouter_request(prompt, stream=True)
+        
+        for attempt in range(max_retries):
+            started = time.perf_counter()
+            first_token_at = None
+            parts: List[str] = []
+            try:
+                async with self.http_client.stream(
+                    "POST",
+                    self.openrouter_url,
+                    headers=headers,
+                    json=payload,
+                    timeout=20.0
+                ) as response:
+                    if response.status_code == 200:
+                        async for line in response.aiter_lines():
+                            # Skip keep-alive comments and blank separators
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[len("data:"):].strip()
+                            if data == "[DONE]":
+                                break
+                            
+                            chunk = loads(data)
+                            delta = chunk.get("choices", [{}])[0].get("delta", {}).get("content")
+                            if delta:
+                                if first_token_at is None:
+                                    first_token_at = time.perf_counter()
+                                parts.append(delta)
+                                await on_chunk(delta)
+                        
+                        text = "".join(parts).strip()
+                        if text:
+                            log_with_context(
+                                logger, "info", "Gemini response streamed successfully",
+                                first_token_ms=round((first_token_at - started) * 1000, 1),
+                                total_ms=round((time.perf_counter() - started) * 1000, 1)
+                            )
+                            return text
+                    
+                    elif response.status_code == 429:
+                        # Rate limited, exponential backoff
+                        logger.warning(f"Gemini rate limited, attempt {attempt + 1}")
+                        if attempt < max_retries - 1:
+                            await asyncio.sleep(2 ** attempt)
+                            continue
+                    
+                    else:
+                        body = await response.aread()
+                        logger.error(f"Gemini API error: {response.status_code} - {body.decode(errors='replace')}")
+                        
+            except Exception as e:
+                logger.error(f"Gemini stream attempt {attempt + 1} failed: {str(e)}")
+                if parts:
+                    # Text already reached the room; keep what was delivered
+                    return "".join(parts).strip()
+                if attempt < max_retries - 1:
+                    await asyncio.sleep(2 ** attempt)
+        
+        return None
+    
+    async def _synthesize(self, text: str, voice_id: str) -> bytes:
+        """
+        Synthesize speech with ElevenLabs, returning MP3 bytes
+        Only real synthesis is charged against ELEVENLABS_TOKEN_LIMIT.
+        """
+        audio_stream = await self.elevenlabs_client.generate(
+            text=text,
+            voice=voice_id,
+            model=settings.ELEVENLABS_MODEL,
+            voice_settings=VoiceSettings(**VOICE_SETTINGS)
+        )
+        audio_bytes = b"".join([chunk async for chunk in audio_stream])
+        
+        if audio_bytes:
+            # Track token usage (approximate)
+            await redis_client.increment_token_usage("elevenlabs", len(text))
+        
+        return audio_bytes
+    
     async def _generate_audio(
         self,
         text: str,
         voice_id: str,
         room_id: str
     ) -> Optional[str]:
-        """Generate audio using ElevenLabs and upload to S3"""
+        """Generate audio using ElevenLabs (or the TTS cache) and upload to S3"""
         try:
             if not voice_id:
                 logger.warning("No voice_id provided, skipping audio generation")
                 return None
             
-            # Run ElevenLabs generation in thread pool (it's synchronous)
-            loop = asyncio.get_event_loop()
-            
-            def generate_audio():
-                return self.elevenlabs_client.generate(
-                    text=text,
-                    voice=voice_id,
-                    model=settings.ELEVENLABS_MODEL,
-                    voice_settings=VoiceSettings(
-                        stability=0.5,
-                        similarity_boost=0.75
-                    )
-                )
+            digest = tts_audio_cache.digest(text, voice_id, VOICE_SETTINGS)
+            if settings.TTS_CACHE_ENABLED:
+                cached_url = await tts_audio_cache.get(digest)
+                if cached_url:
+                    logger.info(f"Audio served from TTS cache: {digest}")
+                    return cached_url
             
             # Generate audio bytes
-            audio_generator = await loop.run_in_executor(None, generate_audio)
-            audio_bytes = b"".join(audio_generator)
+            audio_bytes = await self._synthesize(text, voice_id)
             
             if not audio_bytes:
                 logger.error("ElevenLabs returned empty audio")
                 return None
             
             # Upload to S3
-            timestamp = int(datetime.now().timestamp())
-            filename = f"response_{timestamp}.mp3"
-            audio_url = await s3_client.upload_audio(room_id, audio_bytes, filename)
+            # Audio missing a segment must not be cached under the full text
+            complete = all(segment_urls) and not pipeline.segments_without_audio()
+            if settings.TTS_CACHE_ENABLED and complete:
+                audio_url = await tts_audio_cache.put(digest, audio_bytes)
+            else:
+                if not complete:
+                    logger.warning("Pipelined audio is missing segments, uploading it uncached")
+                filename = f"response_{uuid.uuid4().hex[:12]}.mp3"
+                audio_url = await s3_client.upload_audio(room_id, audio_bytes, filename)
             
             if audio_url:
-                logger.info(f"Audio generated and uploaded: {filename}")
+                logger.info(f"Audio generated and uploaded: {audio_url}")
             
             return audio_url
             
@@ -279,6 +571,97 @@ Be encouraging, specific, and actionable in your suggestions."""
             logger.error(f"Failed to generate audio: {str(e)}")
             return None
     
+    def _create_tts_pipeline(
+        self,
+        voice_id: str,
+        room_id: str,
+        on_audio_segment: SegmentHandler
+    ) -> SentenceTTSPipeline:
+        """Build a sentence pipeline that uploads each segment for this reply"""
+        reply_id = uuid.uuid4().hex[:12]
+        
+        async def render(text: str, index: int) -> Tuple[bytes, Optional[str]]:
+            digest = tts_audio_cache.digest(text, voice_id, VOICE_SETTINGS)
+            if settings.TTS_CACHE_ENABLED:
+                cached_url = await tts_audio_cache.get(digest)
+                if cached_url:
+                    # Downloaded later only if the reply's full audio is not cached
+                    return b"", cached_url
+            
+            audio_bytes = await self._synthesize(text, voice_id)
+            if not audio_bytes:
+                return b"", None
+            
+            if settings.TTS_CACHE_ENABLED:
+                return audio_bytes, await tts_audio_cache.put(digest, audio_bytes)
+            filename = f"response_{reply_id}_{index:03d}.mp3"
+            return audio_bytes, await s3_client.upload_audio(room_id, audio_bytes, filename)
+        
+        return SentenceTTSPipeline(
+            render,
+            on_segment=on_audio_segment,
+            max_parallel=settings.TTS_MAX_PARALLEL,
+            min_segment_chars=settings.TTS_MIN_SEGMENT_CHARS
+        )
+    
+    async def _finish_tts_pipeline(
+        self,
+        pipeline: SentenceTTSPipeline,
+        text: str,
+        voice_id: str,
+        room_id: str
+    ) -> Optional[str]:
+        """
+        Wait for all sentence segments, then upload their concatenation as
+        the reply's single audio file (used by D-ID and the final message).
+        With the TTS cache the file is cached under the full text (only if
+        no segment is missing), so a repeated reply reuses it without
+        downloading or uploading anything.
+        """
+        try:
+            segment_urls = await pipeline.finish()
+            
+            digest = tts_audio_cache.digest(text, voice_id, VOICE_SETTINGS)
+            if settings.TTS_CACHE_ENABLED:
+                cached_url = await tts_audio_cache.get(digest)
+                if cached_url:
+                    logger.info(f"Pipelined audio served from TTS cache: {digest}")
+                    return cached_url
+                
+                # Segments served from the cache were not downloaded while streaming
+                cached_segments = [
+                    (index, tts_audio_cache.digest(segment_text, voice_id, VOICE_SETTINGS))
+                    for index, segment_text in pipeline.segments_without_audio()
+                    if segment_urls[index]
+                ]
+                downloads = await asyncio.gather(
+                    *(tts_audio_cache.get_bytes(segment_digest) for _, segment_digest in cached_segments)
+                )
+                for (index, _), segment_bytes in zip(cached_segments, downloads):
+                    if segment_bytes:
+                        pipeline.set_audio(index, segment_bytes)
+            
+            audio_bytes = pipeline.audio_bytes()
+            if not audio_bytes:
+                logger.error("ElevenLabs returned no audio for any segment")
+                return None
+            
+            # Audio missing a segment must not be cached under the full text
+            complete = all(segment_urls) and not pipeline.segments_without_audio()
+            if settings.TTS_CACHE_ENABLED and complete:
+                audio_url = await tts_audio_cache.put(digest, audio_bytes)
+            else:
+                if not complete:
+                    logger.warning("Pipelined audio is missing segments, uploading it uncached")
+                filename = f"response_{uuid.uuid4().hex[:12]}.mp3"
+                audio_url = await s3_client.upload_audio(room_id, audio_bytes, filename)
+            logger.info(f"Audio pipelined in {len(segment_urls)} segments and uploaded: {audio_url}")
+            return audio_url
+            
+        except Exception as e:
+            logger.error(f"Failed to finish audio pipeline: {str(e)}")
+            return None
+    
     def _fallback_response(self) -> Tuple[str, None, None]:
         """Return fallback response when AI fails"""
         return (
@@ -0,0 +1,264 @@
+"""
+Pool of pre-warmed D-ID streaming avatar sessions per companion
+
+Creating a /talks/streams session (and its WebRTC offer) costs a round trip
+to D-ID, so each companion keeps DID_STREAM_POOL_SIZE idle sessions ready.
+A session is leased to a room when a participant joins. The lease lives in
+Redis (avatar_stream:{room_id}) so that signaling and reply delivery work
+from any web or worker process. Idle sessions are recycled before D-ID
+expires them.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+from config import settings
+from services.companion_registry import companion_registry
+from services.redis_client import redis_client
+from services.video_avatar import video_avatar_service
+from utils.logger import logger
+
+MAINTENANCE_INTERVAL = 15  # seconds between idle-recycling passes
+WAIT_SAMPLES = 500  # recent lease wait times kept for percentiles
+CLAIM_TTL = 120  # seconds a room claim outlives a process that died while leasing
+
+
+class _IdleStream:
+    """A created but not yet leased session"""
+    
+    def __init__(self, stream: Dict):
+        self.stream = stream
+        self.created_at = time.monotonic()
+    
+    def expired(self) -> bool:
+        return time.monotonic() - self.created_at > settings.DID_STREAM_IDLE_TIMEOUT
+
+
+class AvatarStreamPool:
+    """Per-companion pools of idle D-ID streams plus Redis-backed room leases"""
+    
+    def __init__(self):
+        self._idle: Dict[str, Deque[_IdleStream]] = {}
+        self._source_urls: Dict[str, str] = {}
+        self._refilling = set()
+        self._maintenance_task: Optional[asyncio.Task] = None
+        self._wait_ms: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        self._counters = {"leases": 0, "warm": 0, "cold": 0, "failed": 0, "recycled": 0}
+    
+    async def start(self):
+        """Warm a pool for every companion and start idle recycling"""
+        self._refresh_companions()
+        for companion_id in self._source_urls:
+            self._schedule_refill(companion_id)
+        self._maintenance_task = asyncio.create_task(self._maintain())
+        logger.info(f"Avatar stream pool started for {len(self._source_urls)} companions")
+    
+    async def stop(self):
+        """Stop recycling and close every idle session"""
+        if self._maintenance_task:
+            self._maintenance_task.cancel()
+            try:
+                await self._maintenance_task
+            except asyncio.CancelledError:
+                pass
+        idle = [entry for pool in self._idle.values() for entry in pool]
+        self._idle.clear()
+        await asyncio.gather(*(self._close(entry.stream) for entry in idle))
+    
+    async def lease(self, room_id: str, companion_id: str, sid: str) -> Optional[Dict]:
+        """
+        Lease a session to a room on behalf of the joining socket.
+        Returns the offer to relay to the client, or None if the room already
+        has a session or none could be created.
+        """
+        started = time.perf_counter()
+        key = self._lease_key(room_id)
+        claimed = False
+        stream = None
+        try:
+            # Claim the room first so concurrent joins lease only one session.
+            # The claim expires on its own (NX keeps a full lease's TTL).
+            async with redis_client.redis.pipeline(transaction=True) as pipe:
+                pipe.hsetnx(key, "sid", sid)
+                pipe.expire(key, CLAIM_TTL, nx=True)
+                claimed, _ = await pipe.execute()
+            if not claimed:
+                return None
+            
+            entry = self._take_idle(companion_id)
+            if entry:
+                stream = entry.stream
+                self._counters["warm"] += 1
+            else:
+                source_url = await self._source_url(companion_id)
+                stream = await video_avatar_service.create_streaming_avatar(source_url) if source_url else None
+                if not stream:
+                    self._counters["failed"] += 1
+                    await self._abandon_claim(key, None)
+                    return None
+                self._counters["cold"] += 1
+            self._schedule_refill(companion_id)
+            
+            async with redis_client.redis.pipeline(transaction=True) as pipe:
+                pipe.hset(key, mapping={
+                    "stream_id": stream["id"],
+                    "session_id": stream["session_id"],
+                    "companion_id": companion_id
+                })
+                pipe.expire(key, settings.SOCKET_SESSION_TTL)
+                await pipe.execute()
+            claimed = False  # the room now holds a full lease
+            
+            self._counters["leases"] += 1
+            self._wait_ms.append((time.perf_counter() - started) * 1000)
+            logger.info(f"Leased avatar stream {stream['id']} to room {room_id}")
+            return {
+                "stream_id": stream["id"],
+                "offer": stream.get("offer"),
+                "ice_servers": stream.get("ice_servers", [])
+            }
+        except Exception as e:
+            logger.error(f"Failed to lease avatar stream for room {room_id}: {str(e)}")
+            if claimed:
+                await self._abandon_claim(key, stream)
+            return None
+    
+    async def _abandon_claim(self, key: str, stream: Optional[Dict]):
+        """Release a room claimed by a lease that failed part way"""
+        try:
+            await redis_client.redis.delete(key)
+        except Exception as e:
+            logger.error(f"Failed to release avatar stream claim {key}: {str(e)}")
+        if stream:
+            await self._close(stream)
+    
+    async def get_lease(self, room_id: str) -> Optional[Dict]:
+        """The room's leased session, if it has a ready one"""
+        try:
+            lease = await redis_client.redis.hgetall(self._lease_key(room_id))
+            return lease if lease.get("stream_id") else None
+        except Exception as e:
+            logger.error(f"Failed to get avatar stream lease for room {room_id}: {str(e)}")
+            return None
+    
+    async def submit_answer(self, room_id: str, answer: Dict) -> bool:
+        """Forward the client's SDP answer for the room's session to D-ID"""
+        lease = await self.get_lease(room_id)
+        if not lease:
+            return False
+        return await video_avatar_service.submit_stream_answer(lease["stream_id"], lease["session_id"], answer)
+    
+    async def submit_candidate(self, room_id: str, candidate: Dict) -> bool:
+        """Forward a client ICE candidate for the room's session to D-ID"""
+        lease = await self.get_lease(room_id)
+        if not lease:
+            return False
+        return await video_avatar_service.submit_stream_candidate(lease["stream_id"], lease["session_id"], candidate)
+    
+    async def speak(self, lease: Dict, audio_url: str) -> bool:
+        """Play a piece of reply audio through the leased avatar"""
+        return await video_avatar_service.stream_audio(lease["stream_id"], lease["session_id"], audio_url)
+    
+    async def release(self, room_id: str, sid: Optional[str] = None):
+        """Close the room's session; with sid, only if that socket holds it"""
+        try:
+            key = self._lease_key(room_id)
+            lease = await redis_client.redis.hgetall(key)
+            if not lease or (sid and lease.get("sid") != sid):
+                return
+            await redis_client.redis.delete(key)
+            if lease.get("stream_id"):
+                await video_avatar_service.delete_stream(lease["stream_id"], lease["session_id"])
+                logger.info(f"Released avatar stream {lease['stream_id']} from room {room_id}")
+        except Exception as e:
+            logger.error(f"Failed to release avatar stream for room {room_id}: {str(e)}")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Pool sizes, lease counters and lease wait percentiles"""
+        waits = sorted(self._wait_ms)
+        
+        def percentile(p: float) -> Optional[float]:
+            if not waits:
+                return None
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))], 1)
+        
+        return {
+            "idle": {companion_id: len(pool) for companion_id, pool in self._idle.items()},
+            **self._counters,
+            "lease_wait_ms": {
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": round(waits[-1], 1) if waits else None
+            }
+        }
+    
+    def _take_idle(self, companion_id: str) -> Optional[_IdleStream]:
+        pool = self._idle.get(companion_id)
+        while pool:
+            entry = pool.popleft()
+            if not entry.expired():
+                return entry
+            self._recycle(entry)
+        return None
+    
+    def _schedule_refill(self, companion_id: str):
+        if companion_id in self._refilling:
+            return
+        self._refilling.add(companion_id)
+        asyncio.create_task(self._refill(companion_id))
+    
+    async def _refill(self, companion_id: str):
+        """Top the companion's pool back up to DID_STREAM_POOL_SIZE"""
+        try:
+            pool = self._idle.setdefault(companion_id, deque())
+            source_url = await self._source_url(companion_id)
+            while source_url and len(pool) < settings.DID_STREAM_POOL_SIZE:
+                stream = await video_avatar_service.create_streaming_avatar(source_url)
+                if not stream:
+                    break
+                pool.append(_IdleStream(stream))
+        except Exception as e:
+            logger.error(f"Failed to refill avatar stream pool for {companion_id}: {str(e)}")
+        finally:
+            self._refilling.discard(companion_id)
+    
+    def _recycle(self, entry: _IdleStream):
+        self._counters["recycled"] += 1
+        asyncio.create_task(self._close(entry.stream))
+    
+    async def _close(self, stream: Dict):
+        await video_avatar_service.delete_stream(stream["id"], stream["session_id"])
+    
+    async def _maintain(self):
+        """Replace idle sessions before D-ID times them out"""
+        while True:
+            await asyncio.sleep(MAINTENANCE_INTERVAL)
+            try:
+                self._refresh_companions()
+                for pool in self._idle.values():
+                    for entry in [entry for entry in pool if entry.expired()]:
+                        pool.remove(entry)
+                        self._recycle(entry)
+                for companion_id in self._source_urls:
+                    self._schedule_refill(companion_id)
+            except Exception as e:
+                logger.error(f"Avatar stream pool maintenance failed: {str(e)}")
+    
+    def _refresh_companions(self):
+        self._source_urls = {
+            companion["id"]: companion["avatar_url"]
+            for companion in companion_registry.get_all()
+            if companion.get("avatar_url")
+        }
+    
+    async def _source_url(self, companion_id: str) -> Optional[str]:
+        if companion_id not in self._source_urls:
+            self._refresh_companions()
+        return self._source_urls.get(companion_id)
+    
+    def _lease_key(self, room_id: str) -> str:
+        return f"avatar_stream:{room_id}"
+
+
+# Global avatar stream pool instance
+avatar_stream_pool = AvatarStreamPool()
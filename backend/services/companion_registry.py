@@ -0,0 +1,207 @@
+"""
+In-memory registry of AI tutors/companions
+
+The catalog is indexed by id, tag and voice_id and versioned by a hash of
+its content. Responses are serialized once per version, so the catalog
+endpoint can answer with pre-built bytes, or a 304 when the client's ETag
+still matches. Personas from PERSONAS_API_URL are fetched in the background
+(through the shared Redis cache, so one process fetches for all) and indexed
+for lookups by id only; they are not part of the public catalog.
+"""
+import asyncio
+import hashlib
+import time
+from typing import Any, Dict, Iterable, List, Optional
+import httpx
+from config import settings
+from services.redis_client import redis_client
+from utils.logger import logger
+from utils.serialization import dumps_bytes
+
+PERSONAS_CACHE_KEY = "companions:personas"
+REFRESH_INTERVAL = 60  # seconds between reads of the shared persona cache
+MISS_REFRESH_INTERVAL = 30  # min seconds between persona fetches triggered by unknown ids
+
+BUILTIN_COMPANIONS: List[Dict[str, Any]] = [
+    {
+        "id": "tutor_math_ada",
+        "name": "Professor Ada Lovelace",
+        "description": "Expert mathematics tutor specializing in algebra, calculus, geometry, and statistics. Known for patient explanations and real-world applications. Perfect for high school and college students.",
+        "avatar_url": "https://api.dicebear.com/7.x/avataaars/svg?seed=Ada&backgroundColor=b6e3f4",
+        "voice_id": "21m00Tcm4TlvDq8ikWAM",
+        "tags": ["Mathematics", "High School", "College"]
+    },
+    {
+        "id": "tutor_physics_newton",
+        "name": "Dr. Isaac Newton",
+        "description": "Physics enthusiast with expertise in classical mechanics, thermodynamics, electromagnetism, and quantum physics. Makes complex concepts accessible through intuitive explanations and practical examples.",
+        "avatar_url": "https://api.dicebear.com/7.x/avataaars/svg?seed=Newton&backgroundColor=c0aede",
+        "voice_id": "pNInz6obpgDQGcFmaJgB",
+        "tags": ["Physics", "College", "Advanced"]
+    }
+]
+
+
+class _Snapshot:
+    """One immutable version of the catalog and its indexes"""
+    
+    def __init__(self, companions: List[Dict[str, Any]], personas: List[Dict[str, Any]]):
+        self.companions = companions
+        self.body = dumps_bytes(companions)
+        self.version = hashlib.sha256(self.body).hexdigest()[:16]
+        self.etag = f'"{self.version}"'
+        
+        # Catalog entries win over personas sharing an id
+        self.by_id = {persona["id"]: persona for persona in personas if persona.get("id")}
+        self.by_id.update({companion["id"]: companion for companion in companions})
+        self.by_tag: Dict[str, List[Dict[str, Any]]] = {}
+        self.by_voice: Dict[str, List[Dict[str, Any]]] = {}
+        for companion in companions:
+            for tag in companion.get("tags", []):
+                self.by_tag.setdefault(tag.lower(), []).append(companion)
+            if companion.get("voice_id"):
+                self.by_voice.setdefault(companion["voice_id"], []).append(companion)
+        
+        # Filtered catalog bodies, serialized on first request
+        self._bodies: Dict[str, bytes] = {}
+    
+    def filtered_body(self, key: str, companions: List[Dict[str, Any]]) -> bytes:
+        body = self._bodies.get(key)
+        if body is None:
+            body = dumps_bytes(companions)
+            self._bodies[key] = body
+        return body
+
+
+class CompanionRegistry:
+    """Versioned companion catalog with O(1) lookups"""
+    
+    def __init__(self):
+        self._personas: List[Dict[str, Any]] = []
+        self._snapshot = _Snapshot(BUILTIN_COMPANIONS, self._personas)
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._last_refresh = 0.0
+    
+    async def start(self):
+        """Fetch remote personas and keep them refreshed in the background"""
+        self._http_client = httpx.AsyncClient(timeout=10.0)
+        await self.refresh()
+        self._refresh_task = asyncio.create_task(self._refresh_loop())
+        logger.info(f"Companion registry loaded (version {self.version}, {len(self._snapshot.by_id)} entries)")
+    
+    async def stop(self):
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+        if self._http_client:
+            await self._http_client.aclose()
+    
+    @property
+    def version(self) -> str:
+        return self._snapshot.version
+    
+    @property
+    def etag(self) -> str:
+        return self._snapshot.etag
+    
+    def get_all(self) -> List[Dict[str, Any]]:
+        """The public catalog (read-only)"""
+        return self._snapshot.companions
+    
+    def get(self, companion_id: str) -> Optional[Dict[str, Any]]:
+        """A catalog companion or remote persona by id (read-only)"""
+        return self._snapshot.by_id.get(companion_id)
+    
+    def get_by_tag(self, tag: str) -> List[Dict[str, Any]]:
+        """Catalog companions with a tag (case-insensitive)"""
+        return self._snapshot.by_tag.get(tag.lower(), [])
+    
+    def get_by_voice(self, voice_id: str) -> List[Dict[str, Any]]:
+        """Catalog companions speaking with an ElevenLabs voice"""
+        return self._snapshot.by_voice.get(voice_id, [])
+    
+    def catalog_body(self, tag: Optional[str] = None, voice_id: Optional[str] = None) -> bytes:
+        """Serialized catalog, optionally filtered, for the current version"""
+        snapshot = self._snapshot
+        if not tag and not voice_id:
+            return snapshot.body
+        
+        companions = snapshot.companions
+        if tag:
+            companions = snapshot.by_tag.get(tag.lower(), [])
+        if voice_id:
+            companions = [companion for companion in companions if companion.get("voice_id") == voice_id]
+        if not companions:
+            return b"[]"
+        return snapshot.filtered_body(f"{(tag or '').lower()}|{voice_id or ''}", companions)
+    
+    async def resolve(self, companion_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a companion, refreshing the remote personas on a miss
+        (at most every MISS_REFRESH_INTERVAL seconds)
+        """
+        companion = self.get(companion_id)
+        if companion is not None:
+            return companion
+        if time.monotonic() - self._last_refresh >= MISS_REFRESH_INTERVAL:
+            await self.refresh(force=True)
+        return self.get(companion_id)
+    
+    async def resolve_many(self, companion_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Look up several companions at once (read-only); missing ids share a
+        single persona refresh. Unknown ids are left out of the result.
+        """
+        ids = set(companion_ids)
+        snapshot = self._snapshot
+        found = {cid: snapshot.by_id[cid] for cid in ids if cid in snapshot.by_id}
+        missing = ids - found.keys()
+        if missing and time.monotonic() - self._last_refresh >= MISS_REFRESH_INTERVAL:
+            await self.refresh(force=True)
+            found.update({cid: self._snapshot.by_id[cid] for cid in missing if cid in self._snapshot.by_id})
+        return found
+    
+    async def refresh(self, force: bool = False) -> bool:
+        """
+        Pick up the latest personas from the shared cache (fetching them if
+        missing, or with force); keeps the previous ones on failure
+        """
+        if not self._http_client:
+            return False
+        if force:
+            self._last_refresh = time.monotonic()
+            personas = await redis_client.cache_refresh(
+                PERSONAS_CACHE_KEY, self._fetch_personas, settings.COMPANIONS_CACHE_TTL
+            )
+        else:
+            personas = await redis_client.cache_get_or_fetch(
+                PERSONAS_CACHE_KEY, self._fetch_personas, settings.COMPANIONS_CACHE_TTL
+            )
+        if personas is None:
+            return False
+        
+        if personas != self._personas:
+            self._personas = personas
+            self._snapshot = _Snapshot(BUILTIN_COMPANIONS, personas)
+        return True
+    
+    async def _fetch_personas(self) -> List[Dict[str, Any]]:
+        response = await self._http_client.get(settings.PERSONAS_API_URL)
+        response.raise_for_status()
+        personas = response.json()
+        if not isinstance(personas, list):
+            raise ValueError("expected a list of personas")
+        return [persona for persona in personas if isinstance(persona, dict)]
+    
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(REFRESH_INTERVAL)
+            await self.refresh()
+
+
+# Global companion registry instance
+companion_registry = CompanionRegistry()
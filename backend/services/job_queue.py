@@ -0,0 +1,129 @@
+"""
+Durable AI reply job queue on Redis Streams with consumer groups
+"""
+import uuid
+from typing import Any, Dict, List, Tuple
+import redis.asyncio as redis
+from config import settings
+from services.redis_client import redis_client
+from utils.logger import logger
+from utils.serialization import dumps, loads
+
+# (stream entry id, job payload)
+Job = Tuple[str, Dict[str, Any]]
+
+
+class AIJobQueue:
+    """
+    At-least-once job queue: jobs stay pending in the consumer group until
+    acknowledged, and entries left pending by a crashed worker are
+    reclaimed by the others. Results are applied at most once per job_id.
+    """
+    
+    def __init__(self):
+        self.stream = settings.AI_JOB_STREAM
+        self.group = settings.AI_JOB_GROUP
+        self.dead_letter_stream = f"{settings.AI_JOB_STREAM}:dead"
+    
+    async def ensure_group(self):
+        """Create the stream and consumer group if they do not exist"""
+        try:
+            await redis_client.redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+            logger.info(f"Created consumer group {self.group} on {self.stream}")
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+    
+    async def enqueue(self, job: Dict[str, Any]) -> str:
+        """Add a job and return its job_id"""
+        job_id = job.get("job_id") or uuid.uuid4().hex
+        await redis_client.redis.xadd(
+            self.stream,
+            {"job_id": job_id, "payload": dumps({**job, "job_id": job_id})},
+            maxlen=settings.AI_JOB_MAX_LEN,
+            approximate=True
+        )
+        return job_id
+    
+    async def consume(self, consumer: str, count: int, block_ms: int = 5000) -> List[Job]:
+        """Read new jobs for this consumer, blocking up to block_ms"""
+        response = await redis_client.redis.xreadgroup(
+            self.group,
+            consumer,
+            {self.stream: ">"},
+            count=count,
+            block=block_ms
+        )
+        return [
+            (entry_id, loads(fields["payload"]))
+            for _, entries in response or []
+            for entry_id, fields in entries
+        ]
+    
+    async def reclaim(self, consumer: str, count: int) -> List[Job]:
+        """
+        Take over jobs pending longer than AI_JOB_CLAIM_IDLE_MS (their worker
+        most likely crashed). Jobs already delivered AI_JOB_MAX_DELIVERIES
+        times are moved to the dead-letter stream instead.
+        """
+        pending = await redis_client.redis.xpending_range(
+            self.stream,
+            self.group,
+            min="-",
+            max="+",
+            count=count,
+            idle=settings.AI_JOB_CLAIM_IDLE_MS
+        )
+        if not pending:
+            return []
+        
+        retry_ids = []
+        for entry in pending:
+            if entry["times_delivered"] >= settings.AI_JOB_MAX_DELIVERIES:
+                await self._dead_letter(entry["message_id"])
+            else:
+                retry_ids.append(entry["message_id"])
+        
+        if not retry_ids:
+            return []
+        
+        claimed = await redis_client.redis.xclaim(
+            self.stream,
+            self.group,
+            consumer,
+            min_idle_time=settings.AI_JOB_CLAIM_IDLE_MS,
+            message_ids=retry_ids
+        )
+        jobs = [(entry_id, loads(fields["payload"])) for entry_id, fields in claimed if fields]
+        if jobs:
+            logger.warning(f"Reclaimed {len(jobs)} stalled AI jobs")
+        return jobs
+    
+    async def ack(self, entry_id: str):
+        """Acknowledge a finished job"""
+        await redis_client.redis.xack(self.stream, self.group, entry_id)
+    
+    async def mark_completed(self, job_id: str):
+        """
+        Record that a job's result was delivered, so redeliveries of the job
+        are dropped. Set only after the broadcast: a worker that crashes
+        before then leaves the job to be reclaimed and answered again.
+        """
+        await redis_client.redis.set(f"ai_job_done:{job_id}", 1, ex=settings.AI_JOB_RESULT_TTL)
+    
+    async def is_completed(self, job_id: str) -> bool:
+        """Whether a job's result has already been applied"""
+        return bool(await redis_client.redis.exists(f"ai_job_done:{job_id}"))
+    
+    async def _dead_letter(self, entry_id: str):
+        entries = await redis_client.redis.xrange(self.stream, entry_id, entry_id)
+        async with redis_client.redis.pipeline(transaction=True) as pipe:
+            if entries:
+                pipe.xadd(self.dead_letter_stream, entries[0][1], maxlen=settings.AI_JOB_MAX_LEN, approximate=True)
+            pipe.xack(self.stream, self.group, entry_id)
+            await pipe.execute()
+        logger.error(f"AI job {entry_id} exceeded {settings.AI_JOB_MAX_DELIVERIES} deliveries, moved to {self.dead_letter_stream}")
+
+
+# Global AI job queue instance
+ai_job_queue = AIJobQueue()
@@ -0,0 +1,122 @@
+"""
+Reply deadline and live per-stage latency estimates
+
+Every worker records how long each reply stage (llm, tts, video) took into
+a capped Redis list per stage; the recent p90 across all workers decides
+whether a stage still fits in what is left of a reply's deadline. The media
+tier each reply ends up with is counted so budgets can be tuned.
+"""
+import random
+import time
+from typing import Any, Dict, Iterable, Optional
+from config import settings
+from services.redis_client import redis_client
+from utils.local_cache import LocalCache
+from utils.logger import logger
+
+STAGES = ("context", "llm", "tts", "video")
+MIN_SAMPLES = 5  # below this a stage is always attempted
+PROBE_RATE = 0.05  # share of would-be skips attempted anyway so estimates can recover
+TIERS_KEY = "reply_tiers"
+
+
+class Deadline:
+    """End-to-end time budget for one reply"""
+    
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds if seconds > 0 else None
+    
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None without a deadline"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+    
+    def timeout_for(self, stage_budget: float) -> float:
+        """Timeout for a stage: its own budget, capped by the time left"""
+        remaining = self.remaining()
+        return stage_budget if remaining is None else min(stage_budget, remaining)
+
+
+class LatencyBudget:
+    """Redis-backed stage latency samples and delivered-tier counters"""
+    
+    def __init__(self):
+        # p90s are refreshed from Redis at most every few seconds per process
+        self._estimates = LocalCache(max_entries=len(STAGES), default_ttl=5)
+    
+    async def fits(self, stage: str, deadline: Deadline) -> bool:
+        """Whether the stage's recent p90 fits in the deadline's remaining time"""
+        remaining = deadline.remaining()
+        if remaining is None:
+            return True
+        estimate = await self.estimate(stage)
+        if estimate is None or estimate / 1000 <= remaining:
+            return True
+        if random.random() < PROBE_RATE:
+            return True
+        logger.warning(
+            f"Skipping {stage}: p90 {estimate:.0f}ms exceeds remaining {remaining * 1000:.0f}ms"
+        )
+        return False
+    
+    async def estimate(self, stage: str) -> Optional[float]:
+        """Recent p90 latency of a stage in ms, or None without enough samples"""
+        cached = self._estimates.get(stage)
+        if cached is not None:
+            return cached.get("p90")
+        try:
+            samples = sorted(float(ms) for ms in await redis_client.redis.lrange(self._samples_key(stage), 0, -1))
+            p90 = samples[int(0.9 * (len(samples) - 1))] if len(samples) >= MIN_SAMPLES else None
+            self._estimates.set(stage, {"p90": p90})
+            return p90
+        except Exception as e:
+            logger.error(f"Failed to read {stage} latency estimate: {str(e)}")
+            return None
+    
+    async def record(self, stages: Dict[str, float]):
+        """Add one reply's measured stage durations (ms) to the samples"""
+        try:
+            async with redis_client.redis.pipeline(transaction=False) as pipe:
+                for stage, ms in stages.items():
+                    if stage not in STAGES:
+                        continue
+                    key = self._samples_key(stage)
+                    pipe.lpush(key, ms)
+                    pipe.ltrim(key, 0, settings.STAGE_LATENCY_SAMPLES - 1)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to record stage latencies: {str(e)}")
+    
+    async def record_tier(self, tier: str, skipped: Iterable[str] = ()):
+        """Count the media tier a reply was delivered with, and why it degraded"""
+        try:
+            async with redis_client.redis.pipeline(transaction=False) as pipe:
+                pipe.hincrby(TIERS_KEY, tier, 1)
+                for stage in skipped:
+                    pipe.hincrby(TIERS_KEY, f"skipped:{stage}", 1)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Failed to record reply tier: {str(e)}")
+    
+    async def get_stats(self) -> Dict[str, Any]:
+        """Current p90 estimates and tier counters"""
+        try:
+            return {
+                "deadline_seconds": settings.REPLY_DEADLINE_SECONDS,
+                "p90_ms": {stage: await self.estimate(stage) for stage in STAGES},
+                "tiers": {
+                    tier: int(count)
+                    for tier, count in (await redis_client.redis.hgetall(TIERS_KEY)).items()
+                }
+            }
+        except Exception as e:
+            logger.error(f"Failed to read latency budget stats: {str(e)}")
+            return {}
+    
+    def _samples_key(self, stage: str) -> str:
+        return f"stage_latency:{stage}"
+
+
+# Global latency budget instance
+latency_budget = LatencyBudget()
@@ -0,0 +1,273 @@
+"""
+Rate limiting: atomic Redis-backed limiters using server-side Lua scripts,
+and a local token bucket that syncs counts to Redis in batches
+"""
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+from redis.commands.core import AsyncScript
+from config import settings
+from services.redis_client import redis_client
+from utils.logger import logger
+
+
+# Sliding window log: one sorted-set member per accepted request, scored by
+# server time in milliseconds. Returns {allowed, remaining, reset_ms, retry_ms}.
+SLIDING_WINDOW_SCRIPT = """
+local key = KEYS[1]
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local member = ARGV[3]
+
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+local count = redis.call('ZCARD', key)
+
+local allowed = 0
+if count < limit then
+    redis.call('ZADD', key, now, member)
+    count = count + 1
+    allowed = 1
+end
+redis.call('PEXPIRE', key, window)
+
+local reset = window
+local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+if oldest[2] then
+    reset = tonumber(oldest[2]) + window - now
+end
+
+local retry = 0
+if allowed == 0 then
+    retry = reset
+end
+
+return {allowed, limit - count, reset, retry}
+"""
+
+# Token bucket: capacity `limit`, refilled continuously at limit/window tokens
+# per millisecond. Returns {allowed, remaining, reset_ms, retry_ms}.
+TOKEN_BUCKET_SCRIPT = """
+local key = KEYS[1]
+local capacity = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local rate = capacity / window
+
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local state = redis.call('HMGET', key, 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local allowed = 0
+local retry = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry = math.ceil((1 - tokens) / rate)
+end
+
+local reset = math.ceil((capacity - tokens) / rate)
+redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', key, reset + 1000)
+
+return {allowed, math.floor(tokens), reset, retry}
+"""
+
+ALGORITHMS = {
+    "sliding_window": SLIDING_WINDOW_SCRIPT,
+    "token_bucket": TOKEN_BUCKET_SCRIPT,
+}
+
+
+class RateLimitResult(NamedTuple):
+    """Outcome of a single rate limit check"""
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float  # seconds until the quota is fully restored
+    retry_after: float  # seconds until the next request would be accepted
+
+
+class RateLimiter:
+    """Single round-trip rate limiter (one EVALSHA per check)"""
+    
+    def __init__(self, algorithm: str = None):
+        self.algorithm = algorithm or settings.RATE_LIMIT_ALGORITHM
+        if self.algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown rate limit algorithm: {self.algorithm}")
+        self.script: Optional[AsyncScript] = None
+    
+    async def initialize(self):
+        """Register and preload the Lua script so checks use EVALSHA"""
+        self.script = redis_client.redis.register_script(ALGORITHMS[self.algorithm])
+        await redis_client.redis.script_load(self.script.script)
+        logger.info(f"Rate limiter initialized ({self.algorithm})")
+    
+    async def check(self, identifier: str, limit: int, window: int = 60) -> RateLimitResult:
+        """
+        Consume one request from identifier's quota
+        
+        Args:
+            identifier: Client key (e.g. IP address)
+            limit: Requests allowed per window
+            window: Window length in seconds
+        
+        Returns:
+            RateLimitResult with remaining quota and reset/retry times
+        """
+        try:
+            if not self.script:
+                await self.initialize()
+            
+            key = f"rate_limit:{self.algorithm}:{identifier}"
+            args = [limit, window * 1000]
+            if self.algorithm == "sliding_window":
+                args.append(uuid.uuid4().hex)
+            
+            allowed, remaining, reset_ms, retry_ms = await self.script(keys=[key], args=args)
+            return RateLimitResult(
+                allowed=bool(allowed),
+                limit=limit,
+                remaining=max(0, int(remaining)),
+                reset_after=reset_ms / 1000,
+                retry_after=retry_ms / 1000
+            )
+        except Exception as e:
+            logger.error(f"Rate limit check failed for {identifier}: {str(e)}")
+            # Allow on error to avoid blocking legitimate requests
+            return RateLimitResult(
+                allowed=True,
+                limit=limit,
+                remaining=limit,
+                reset_after=float(window),
+                retry_after=0.0
+            )
+
+
+class _LocalBucket:
+    """One client's local tokens plus its last known cluster-wide count"""
+    
+    __slots__ = ("tokens", "updated", "window_index", "shared_count")
+    
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.updated = now
+        self.window_index = -1
+        self.shared_count = 0
+
+
+class LocalRateLimiter:
+    """
+    Rate limiter that decides without a Redis round trip.
+    
+    Each process keeps a token bucket per client. Accepted requests are
+    added to a per-window counter in Redis in batches every
+    RATE_LIMIT_SYNC_INTERVAL seconds, and the returned totals cap each
+    client across processes too. The cross-process limit is approximate:
+    it can be exceeded by what other processes accept between two syncs.
+    """
+    
+    def __init__(self):
+        self._buckets: "OrderedDict[Tuple[str, int], _LocalBucket]" = OrderedDict()
+        # (identifier, window, window_index) -> accepted requests not yet synced
+        self._pending: Dict[Tuple[str, int, int], int] = {}
+        self._sync_task: Optional[asyncio.Task] = None
+    
+    async def initialize(self):
+        """Start the background sync of request counts"""
+        self._sync_task = asyncio.create_task(self._sync_loop())
+        logger.info("Rate limiter initialized (local)")
+    
+    async def close(self):
+        if self._sync_task:
+            self._sync_task.cancel()
+            try:
+                await self._sync_task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+    
+    async def check(self, identifier: str, limit: int, window: int = 60) -> RateLimitResult:
+        """Consume one request from identifier's quota (same contract as RateLimiter.check)"""
+        now = time.monotonic()
+        rate = limit / window
+        bucket = self._bucket(identifier, window, limit, now)
+        bucket.tokens = min(limit, bucket.tokens + (now - bucket.updated) * rate)
+        bucket.updated = now
+        
+        window_index = int(time.time() // window)
+        shared = bucket.shared_count if bucket.window_index == window_index else 0
+        pending_key = (identifier, window, window_index)
+        used = shared + self._pending.get(pending_key, 0)
+        
+        if bucket.tokens < 1 or used >= limit:
+            retry_after = (1 - bucket.tokens) / rate if bucket.tokens < 1 else window - time.time() % window
+            return RateLimitResult(
+                allowed=False,
+                limit=limit,
+                remaining=0,
+                reset_after=(limit - bucket.tokens) / rate,
+                retry_after=retry_after
+            )
+        
+        bucket.tokens -= 1
+        self._pending[pending_key] = self._pending.get(pending_key, 0) + 1
+        return RateLimitResult(
+            allowed=True,
+            limit=limit,
+            remaining=max(0, min(int(bucket.tokens), limit - used - 1)),
+            reset_after=(limit - bucket.tokens) / rate,
+            retry_after=0.0
+        )
+    
+    async def flush(self):
+        """Add pending counts to Redis and pick up the cluster-wide totals"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        try:
+            async with redis_client.redis.pipeline(transaction=False) as pipe:
+                for (identifier, window, window_index), count in pending.items():
+                    key = f"rate_limit:local:{identifier}:{window_index}"
+                    pipe.incrby(key, count)
+                    pipe.expire(key, window * 2)
+                results = await pipe.execute()
+            
+            for ((identifier, window, window_index), _), total in zip(pending.items(), results[::2]):
+                bucket = self._buckets.get((identifier, window))
+                if bucket and window_index >= bucket.window_index:
+                    bucket.window_index = window_index
+                    bucket.shared_count = int(total)
+        except Exception as e:
+            # Fail open: these requests just don't count towards the shared limit
+            logger.error(f"Rate limit sync failed: {str(e)}")
+    
+    def _bucket(self, identifier: str, window: int, limit: int, now: float) -> _LocalBucket:
+        key = (identifier, window)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = _LocalBucket(float(limit), now)
+            self._buckets[key] = bucket
+            if len(self._buckets) > settings.RATE_LIMIT_LOCAL_MAX_CLIENTS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+    
+    async def _sync_loop(self):
+        while True:
+            await asyncio.sleep(settings.RATE_LIMIT_SYNC_INTERVAL)
+            await self.flush()
+
+
+# Global rate limiter instances
+rate_limiter = RateLimiter()
+local_rate_limiter = LocalRateLimiter()
@@ -2,11 +2,86 @@
 Redis client for session state and conversation memory
 """
 import redis.asyncio as redis
-import json
+import math
+import random
+import time
+import uuid
 import asyncio
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Callable, Awaitable
+from redis.asyncio.client import PubSub
 from config import settings
+from utils.local_cache import LocalCache
 from utils.logger import logger
+from utils.serialization import dumps, loads
+
+CACHE_INVALIDATION_CHANNEL = "cache:invalidate"
+
+# Receives the data of each message published on a subscribed channel
+ChannelHandler = Callable[[str], None]
+
+
+# Adds/removes (ARGV[1] = SADD | SREM) a participant only if the room hash
+# exists, and copies the room's TTL onto the participants set.
+# Returns -1 for a missing room and -2 for a legacy (JSON string) room.
+PARTICIPANT_SCRIPT = """
+local ttl = redis.call('PTTL', KEYS[1])
+if ttl == -2 then
+    return -1
+end
+if redis.call('TYPE', KEYS[1]).ok == 'string' then
+    return -2
+end
+local changed = redis.call(ARGV[1], KEYS[2], ARGV[2])
+if ttl > 0 then
+    redis.call('PEXPIRE', KEYS[2], ttl)
+end
+return changed
+"""
+
+
+# Appends a message (ARGV[1]: its JSON without the outer braces) under the
+# next per-room sequence number, so list order always matches seq order.
+# Returns the seq, or -1 for a legacy (JSON string) conversation.
+APPEND_MESSAGE_SCRIPT = """
+if redis.call('TYPE', KEYS[1]).ok == 'string' then
+    return -1
+end
+local seq = redis.call('INCR', KEYS[2])
+local body = ARGV[1]
+if body ~= '' then
+    body = ', ' .. body
+end
+redis.call('RPUSH', KEYS[1], '{"seq": ' .. seq .. body .. '}')
+redis.call('LTRIM', KEYS[1], -tonumber(ARGV[2]), -1)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return seq
+"""
+
+# Returns {last_seq, messages with seq > ARGV[1] (at most ARGV[2] of them)}.
+# Sequence numbers are contiguous, so the delta is the list's tail; when
+# LTRIM has already dropped part of it, the delta starts at the oldest
+# message still kept.
+MESSAGES_SINCE_SCRIPT = """
+local last = tonumber(redis.call('GET', KEYS[2]) or '0')
+local missing = last - tonumber(ARGV[1])
+if missing <= 0 then
+    return {last, {}}
+end
+local length = redis.call('LLEN', KEYS[1])
+local start = length - math.min(missing, length)
+return {last, redis.call('LRANGE', KEYS[1], start, start + tonumber(ARGV[2]) - 1)}
+"""
+
+
+# Deletes a lock only if it still holds our token (it may have expired and
+# been taken by another process meanwhile)
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
 
 
 class RedisClient:
@@ -15,6 +90,23 @@ class RedisClient:
     def __init__(self):
         self.redis: Optional[redis.Redis] = None
         self.pool: Optional[redis.ConnectionPool] = None
+        self._participant_script = None
+        self._append_message_script = None
+        self._messages_since_script = None
+        self._release_lock_script = None
+        # In-flight cache_get_or_fetch fetches, one per key
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # L1 cache in front of cache_get, kept coherent across workers via pub/sub
+        self.local_cache = LocalCache(
+            max_entries=settings.LOCAL_CACHE_MAX_ENTRIES,
+            default_ttl=settings.LOCAL_CACHE_TTL
+        )
+        self.instance_id = uuid.uuid4().hex
+        # One pub/sub connection shared by every subscriber in the process
+        self._channel_handlers: Dict[str, ChannelHandler] = {}
+        self._reconnect_handlers: Dict[str, Callable[[], None]] = {}
+        self._pubsub: Optional[PubSub] = None
+        self._subscriber_task: Optional[asyncio.Task] = None
     
     async def connect(self):
         """Initialize Redis connection with retry logic"""
@@ -23,13 +115,23 @@ class RedisClient:
         
         for attempt in range(max_retries):
             try:
-                self.pool = redis.ConnectionPool.from_url(
+                # Waits for a free connection under bursts instead of raising
+                self.pool = redis.BlockingConnectionPool.from_url(
                     settings.REDIS_URL,
-                    max_connections=10,
+                    max_connections=settings.REDIS_MAX_CONNECTIONS,
+                    timeout=settings.REDIS_POOL_TIMEOUT,
                     decode_responses=True
                 )
                 self.redis = redis.Redis(connection_pool=self.pool)
                 await self.redis.ping()
+                self._participant_script = self.redis.register_script(PARTICIPANT_SCRIPT)
+                self._append_message_script = self.redis.register_script(APPEND_MESSAGE_SCRIPT)
+                self._messages_since_script = self.redis.register_script(MESSAGES_SINCE_SCRIPT)
+                self._release_lock_script = self.redis.register_script(RELEASE_LOCK_SCRIPT)
+                self._channel_handlers[CACHE_INVALIDATION_CHANNEL] = self._handle_invalidation
+                # Invalidations may have been missed while disconnected
+                self._reconnect_handlers[CACHE_INVALIDATION_CHANNEL] = self.local_cache.clear
+                self._subscriber_task = asyncio.create_task(self._listen())
                 logger.info("Redis connection established successfully")
                 return
             except Exception as e:
@@ -42,6 +144,13 @@ class RedisClient:
     
     async def disconnect(self):
         """Close Redis connection"""
+        if self._subscriber_task:
+            self._subscriber_task.cancel()
+            try:
+                await self._subscriber_task
+            except asyncio.CancelledError:
+                pass
+            self._subscriber_task = None
         if self.redis:
             await self.redis.close()
         if self.pool:
@@ -60,13 +169,25 @@ class RedisClient:
             return False
     
     # Room Management
+    # room:{room_id} is a hash of JSON-encoded metadata fields and
+    # room:{room_id}:participants is a set of user ids; both share one TTL.
     async def set_room(self, room_id: str, data: Dict[str, Any], ttl: int = None) -> bool:
-        """Store room metadata"""
+        """Store room metadata, replacing any existing room"""
         try:
             key = f"room:{room_id}"
-            value = json.dumps(data)
+            participants_key = f"room:{room_id}:participants"
             ttl = ttl or settings.ROOM_TTL
-            await self.redis.setex(key, ttl, value)
+            metadata = {k: v for k, v in data.items() if k != "participants"}
+            participants = data.get("participants", [])
+            
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.delete(key, participants_key)
+                pipe.hset(key, mapping=_encode_fields(metadata))
+                pipe.expire(key, ttl)
+                if participants:
+                    pipe.sadd(participants_key, *participants)
+                    pipe.expire(participants_key, ttl)
+                await pipe.execute()
             logger.info(f"Room {room_id} stored with TTL {ttl}s")
             return True
         except Exception as e:
@@ -74,158 +195,713 @@ class RedisClient:
             return False
     
     async def get_room(self, room_id: str) -> Optional[Dict[str, Any]]:
-        """Retrieve room metadata"""
+        """Retrieve room metadata and participants in one pipelined read"""
         try:
-            key = f"room:{room_id}"
-            value = await self.redis.get(key)
-            if value:
-                return json.loads(value)
-            return None
+            try:
+                fields, participants = await self._read_room(room_id)
+            except redis.ResponseError as e:
+                if not _is_wrong_type(e):
+                    raise
+                await self.migrate_room(room_id)
+                fields, participants = await self._read_room(room_id)
+            
+            if not fields:
+                return None
+            room = _decode_fields(fields)
+            room["participants"] = sorted(participants)
+            return room
         except Exception as e:
             logger.error(f"Failed to retrieve room {room_id}: {str(e)}")
             return None
     
+    async def _read_room(self, room_id: str):
+        """HGETALL + SMEMBERS in a single round trip"""
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hgetall(f"room:{room_id}")
+            pipe.smembers(f"room:{room_id}:participants")
+            return await pipe.execute()
+    
+    async def update_room(self, room_id: str, fields: Dict[str, Any], ttl: int = None) -> bool:
+        """Update individual room metadata fields, optionally resetting the TTL"""
+        try:
+            key = f"room:{room_id}"
+            participants_key = f"room:{room_id}:participants"
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hset(key, mapping=_encode_fields(fields))
+                if ttl:
+                    pipe.expire(key, ttl)
+                    pipe.expire(participants_key, ttl)
+                await pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Failed to update room {room_id}: {str(e)}")
+            return False
+    
     async def delete_room(self, room_id: str) -> bool:
         """Delete room data"""
         try:
-            key = f"room:{room_id}"
-            await self.redis.delete(key)
+            await self.redis.delete(f"room:{room_id}", f"room:{room_id}:participants")
             logger.info(f"Room {room_id} deleted")
             return True
         except Exception as e:
             logger.error(f"Failed to delete room {room_id}: {str(e)}")
             return False
     
-    async def update_room_participants(self, room_id: str, participants: List[str]) -> bool:
-        """Update room participants list"""
+    async def add_participant(self, room_id: str, user_id: str) -> bool:
+        """
+        Atomically add a participant to an existing room.
+        Returns False if the room does not exist.
+        """
+        return await self._change_participant(room_id, user_id, "SADD")
+    
+    async def remove_participant(self, room_id: str, user_id: str) -> bool:
+        """
+        Atomically remove a participant from a room.
+        Returns False if the room does not exist.
+        """
+        return await self._change_participant(room_id, user_id, "SREM")
+    
+    async def _change_participant(self, room_id: str, user_id: str, command: str) -> bool:
         try:
-            room = await self.get_room(room_id)
-            if room:
-                room["participants"] = participants
-                return await self.set_room(room_id, room)
-            return False
+            keys = [f"room:{room_id}", f"room:{room_id}:participants"]
+            result = await self._participant_script(keys=keys, args=[command, user_id])
+            if result == -2:
+                await self.migrate_room(room_id)
+                result = await self._participant_script(keys=keys, args=[command, user_id])
+            return result >= 0
         except Exception as e:
             logger.error(f"Failed to update participants for room {room_id}: {str(e)}")
             return False
     
+    async def migrate_room(self, room_id: str) -> bool:
+        """
+        Convert a legacy JSON-string room:{room_id} key into the
+        hash + participants set layout, preserving its remaining TTL.
+        Returns True if a legacy key was migrated.
+        """
+        key = f"room:{room_id}"
+        participants_key = f"room:{room_id}:participants"
+        async with self.redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    if await pipe.type(key) != "string":
+                        await pipe.unwatch()
+                        return False
+                    
+                    value = await pipe.get(key)
+                    ttl = await pipe.ttl(key)
+                    room = loads(value) if value else {}
+                    ttl = ttl if ttl > 0 else settings.ROOM_TTL
+                    metadata = {k: v for k, v in room.items() if k != "participants"}
+                    participants = room.get("participants", [])
+                    
+                    pipe.multi()
+                    pipe.delete(key, participants_key)
+                    if metadata:
+                        pipe.hset(key, mapping=_encode_fields(metadata))
+                        pipe.expire(key, ttl)
+                    if participants:
+                        pipe.sadd(participants_key, *participants)
+                        pipe.expire(participants_key, ttl)
+                    await pipe.execute()
+                    logger.info(f"Migrated legacy room {room_id}")
+                    return True
+                except redis.WatchError:
+                    continue
+    
+    # Socket Sessions
+    # sid -> {room_id, user_id, is_host}, shared by every Socket.IO worker
+    async def set_socket_session(self, sid: str, data: Dict[str, Any], ttl: int = None) -> bool:
+        """Store the room/user a socket is bound to"""
+        try:
+            key = f"socket_session:{sid}"
+            ttl = ttl or settings.SOCKET_SESSION_TTL
+            await self.redis.setex(key, ttl, dumps(data))
+            return True
+        except Exception as e:
+            logger.error(f"Failed to store socket session {sid}: {str(e)}")
+            return False
+    
+    async def get_socket_session(self, sid: str) -> Optional[Dict[str, Any]]:
+        """Retrieve the room/user a socket is bound to"""
+        try:
+            value = await self.redis.get(f"socket_session:{sid}")
+            if value:
+                return loads(value)
+            return None
+        except Exception as e:
+            logger.error(f"Failed to retrieve socket session {sid}: {str(e)}")
+            return None
+    
+    async def pop_socket_session(self, sid: str) -> Optional[Dict[str, Any]]:
+        """Atomically retrieve and delete a socket session"""
+        try:
+            key = f"socket_session:{sid}"
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.get(key)
+                pipe.delete(key)
+                value, _ = await pipe.execute()
+            if value:
+                return loads(value)
+            return None
+        except Exception as e:
+            logger.error(f"Failed to pop socket session {sid}: {str(e)}")
+            return None
+    
+    # Client Message Deduplication
+    # message_dedupe:{room_id}:{client_message_id} -> {"status": "pending"}
+    # until the reply answering it is delivered, then {"status": "done", "reply": {...}}
+    async def claim_client_message(self, room_id: str, client_message_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Claim a client message id. Returns None for the first delivery, or the
+        existing record for a duplicate.
+        """
+        try:
+            key = f"message_dedupe:{room_id}:{client_message_id}"
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.set(key, dumps({"status": "pending"}), nx=True, ex=settings.MESSAGE_DEDUPE_TTL)
+                pipe.get(key)
+                claimed, value = await pipe.execute()
+            if claimed:
+                return None
+            return loads(value) if value else {"status": "pending"}
+        except Exception as e:
+            # Fail open: a duplicate reply is better than a dropped message
+            logger.error(f"Failed to claim client message {client_message_id}: {str(e)}")
+            return None
+    
+    async def record_client_reply(self, room_id: str, client_message_ids: List[str], reply: Dict[str, Any]) -> bool:
+        """Attach the delivered reply to the client messages it answered"""
+        if not client_message_ids:
+            return True
+        try:
+            value = dumps({"status": "done", "reply": reply})
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for client_message_id in client_message_ids:
+                    pipe.set(f"message_dedupe:{room_id}:{client_message_id}", value, xx=True, keepttl=True)
+                await pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Failed to record reply for client messages in room {room_id}: {str(e)}")
+            return False
+    
+    async def release_client_messages(self, room_id: str, client_message_ids: List[str]) -> bool:
+        """Forget client message ids whose reply failed, so a retry is processed"""
+        if not client_message_ids:
+            return True
+        try:
+            await self.redis.delete(*(f"message_dedupe:{room_id}:{cid}" for cid in client_message_ids))
+            return True
+        except Exception as e:
+            logger.error(f"Failed to release client messages in room {room_id}: {str(e)}")
+            return False
+    
     # Conversation Management
+    # Conversations are stored as native Redis lists (one JSON-encoded message
+    # per element) so appends are O(1) and never rewrite the transcript.
+    # Each message carries a per-room "seq" (counter at conversation_seq:{room_id})
+    # so reconnecting clients can fetch only what they missed.
     async def set_conversation(self, room_id: str, messages: List[Dict[str, Any]], ttl: int = None) -> bool:
-        """Store conversation history"""
+        """Store conversation history, replacing any existing messages"""
         try:
             key = f"conversation:{room_id}"
-            value = json.dumps(messages)
+            seq_key = f"conversation_seq:{room_id}"
             ttl = ttl or settings.CONVERSATION_TTL
-            await self.redis.setex(key, ttl, value)
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.delete(key, seq_key)
+                if messages:
+                    pipe.rpush(key, *[
+                        dumps({**message, "seq": seq})
+                        for seq, message in enumerate(messages, start=1)
+                    ])
+                    pipe.ltrim(key, -settings.CONVERSATION_MAX_MESSAGES, -1)
+                    pipe.expire(key, ttl)
+                    pipe.setex(seq_key, ttl, len(messages))
+                await pipe.execute()
             return True
         except Exception as e:
             logger.error(f"Failed to store conversation for room {room_id}: {str(e)}")
             return False
     
     async def get_conversation(self, room_id: str, limit: int = 10) -> List[Dict[str, Any]]:
-        """Retrieve conversation history"""
+        """Retrieve the most recent `limit` messages of a conversation"""
         try:
             key = f"conversation:{room_id}"
-            value = await self.redis.get(key)
-            if value:
-                messages = json.loads(value)
-                return messages[-limit:] if len(messages) > limit else messages
-            return []
+            try:
+                values = await self.redis.lrange(key, -limit, -1)
+            except redis.ResponseError as e:
+                if not _is_wrong_type(e):
+                    raise
+                await self.migrate_conversation(room_id)
+                values = await self.redis.lrange(key, -limit, -1)
+            return [loads(value) for value in values]
         except Exception as e:
             logger.error(f"Failed to retrieve conversation for room {room_id}: {str(e)}")
             return []
     
-    async def append_message(self, room_id: str, message: Dict[str, Any]) -> bool:
-        """Add single message to conversation"""
+    async def append_message(self, room_id: str, message: Dict[str, Any]) -> Optional[int]:
+        """Add single message to conversation (one round trip); returns its seq"""
         try:
-            conversation = await self.get_conversation(room_id, limit=1000)
-            conversation.append(message)
-            return await self.set_conversation(room_id, conversation)
+            seq = await self._push_message(room_id, message)
+            if seq == -1:
+                await self.migrate_conversation(room_id)
+                seq = await self._push_message(room_id, message)
+            return seq
         except Exception as e:
             logger.error(f"Failed to append message to room {room_id}: {str(e)}")
+            return None
+    
+    async def _push_message(self, room_id: str, message: Dict[str, Any]) -> int:
+        """INCR seq + RPUSH + LTRIM + EXPIRE in one script"""
+        body = dumps({k: v for k, v in message.items() if k != "seq"})[1:-1]
+        return await self._append_message_script(
+            keys=[f"conversation:{room_id}", f"conversation_seq:{room_id}"],
+            args=[body, settings.CONVERSATION_MAX_MESSAGES, settings.CONVERSATION_TTL]
+        )
+    
+    async def expire_conversation(self, room_id: str, ttl: int) -> bool:
+        """Shorten a conversation's lifetime (e.g. once it has been archived)"""
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.expire(f"conversation:{room_id}", ttl)
+                pipe.expire(f"conversation_seq:{room_id}", ttl)
+                await pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Failed to expire conversation for room {room_id}: {str(e)}")
             return False
     
+    async def get_messages_since(self, room_id: str, after_seq: int, limit: int = 100) -> Dict[str, Any]:
+        """
+        Messages with seq greater than after_seq, oldest first and at most
+        limit of them. has_more tells the client to ask again from the last
+        seq it received.
+        """
+        try:
+            keys = [f"conversation:{room_id}", f"conversation_seq:{room_id}"]
+            try:
+                last_seq, values = await self._messages_since_script(keys=keys, args=[after_seq, limit])
+            except redis.ResponseError as e:
+                if not _is_wrong_type(e):
+                    raise
+                await self.migrate_conversation(room_id)
+                last_seq, values = await self._messages_since_script(keys=keys, args=[after_seq, limit])
+            messages = [loads(value) for value in values]
+            return {
+                "last_seq": last_seq,
+                "messages": messages,
+                "has_more": bool(messages) and messages[-1].get("seq", last_seq) < last_seq
+            }
+        except Exception as e:
+            logger.error(f"Failed to retrieve messages since {after_seq} for room {room_id}: {str(e)}")
+            return {"last_seq": after_seq, "messages": [], "has_more": False}
+    
+    async def migrate_conversation(self, room_id: str) -> bool:
+        """
+        Convert a legacy JSON-string conversation key into a list,
+        preserving its messages and remaining TTL.
+        Returns True if a legacy key was migrated.
+        """
+        key = f"conversation:{room_id}"
+        async with self.redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    if await pipe.type(key) != "string":
+                        await pipe.unwatch()
+                        return False
+                    
+                    value = await pipe.get(key)
+                    ttl = await pipe.ttl(key)
+                    messages = loads(value) if value else []
+                    
+                    seq_key = f"conversation_seq:{room_id}"
+                    ttl = ttl if ttl > 0 else settings.CONVERSATION_TTL
+                    pipe.multi()
+                    pipe.delete(key, seq_key)
+                    if messages:
+                        pipe.rpush(key, *[
+                            dumps({**message, "seq": seq})
+                            for seq, message in enumerate(messages, start=1)
+                        ])
+                        pipe.ltrim(key, -settings.CONVERSATION_MAX_MESSAGES, -1)
+                        pipe.expire(key, ttl)
+                        pipe.setex(seq_key, ttl, len(messages))
+                    await pipe.execute()
+                    logger.info(f"Migrated legacy conversation for room {room_id} ({len(messages)} messages)")
+                    return True
+                except redis.WatchError:
+                    continue
+    
     # Session History
+    # sessions:{user_id} is a sorted set of session ids scored by started_at;
+    # session_data:{user_id} is a hash of session_id -> JSON session body.
     async def set_session_history(self, user_id: str, sessions: List[Dict[str, Any]], ttl: int = None) -> bool:
-        """Store user session history"""
+        """Store user session history, replacing any existing sessions"""
         try:
-            key = f"sessions:{user_id}"
-            value = json.dumps(sessions)
+            index_key = f"sessions:{user_id}"
+            data_key = f"session_data:{user_id}"
             ttl = ttl or settings.SESSION_HISTORY_TTL
-            await self.redis.setex(key, ttl, value)
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.delete(index_key, data_key)
+                if sessions:
+                    pipe.zadd(index_key, {s["session_id"]: s.get("started_at", 0) for s in sessions})
+                    pipe.hset(data_key, mapping={s["session_id"]: dumps(s) for s in sessions})
+                    pipe.expire(index_key, ttl)
+                    pipe.expire(data_key, ttl)
+                await pipe.execute()
             return True
         except Exception as e:
             logger.error(f"Failed to store session history for user {user_id}: {str(e)}")
             return False
     
     async def get_session_history(self, user_id: str, offset: int = 0, limit: int = 20) -> List[Dict[str, Any]]:
-        """Retrieve user session history with pagination"""
+        """Retrieve user session history, newest first, with pagination"""
         try:
-            key = f"sessions:{user_id}"
-            value = await self.redis.get(key)
-            if value:
-                sessions = json.loads(value)
-                # Sort by timestamp descending
-                sessions.sort(key=lambda x: x.get("started_at", 0), reverse=True)
-                return sessions[offset:offset + limit]
-            return []
+            index_key = f"sessions:{user_id}"
+            try:
+                session_ids = await self.redis.zrevrange(index_key, offset, offset + limit - 1)
+            except redis.ResponseError as e:
+                if not _is_wrong_type(e):
+                    raise
+                await self.migrate_session_history(user_id)
+                session_ids = await self.redis.zrevrange(index_key, offset, offset + limit - 1)
+            
+            if not session_ids:
+                return []
+            
+            values = await self.redis.hmget(f"session_data:{user_id}", session_ids)
+            return [loads(value) for value in values if value]
         except Exception as e:
             logger.error(f"Failed to retrieve session history for user {user_id}: {str(e)}")
             return []
     
+    async def count_sessions(self, user_id: str) -> int:
+        """Total number of sessions in a user's history"""
+        try:
+            key = f"sessions:{user_id}"
+            try:
+                return await self.redis.zcard(key)
+            except redis.ResponseError as e:
+                if not _is_wrong_type(e):
+                    raise
+                await self.migrate_session_history(user_id)
+                return await self.redis.zcard(key)
+        except Exception as e:
+            logger.error(f"Failed to count sessions for user {user_id}: {str(e)}")
+            return 0
+    
+    async def get_session(self, user_id: str, session_id: str) -> Optional[Dict[str, Any]]:
+        """Retrieve a single session record by id"""
+        try:
+            key = f"session_data:{user_id}"
+            value = await self.redis.hget(key, session_id)
+            if value is None and await self.migrate_session_history(user_id):
+                value = await self.redis.hget(key, session_id)
+            if value:
+                return loads(value)
+            return None
+        except Exception as e:
+            logger.error(f"Failed to retrieve session {session_id} for user {user_id}: {str(e)}")
+            return None
+    
     async def append_session(self, user_id: str, session: Dict[str, Any]) -> bool:
         """Add session to user history"""
         try:
-            key = f"sessions:{user_id}"
-            value = await self.redis.get(key)
-            sessions = json.loads(value) if value else []
-            sessions.append(session)
-            return await self.set_session_history(user_id, sessions)
+            try:
+                await self._add_session(user_id, session)
+            except redis.ResponseError as e:
+                if not _is_wrong_type(e):
+                    raise
+                await self.migrate_session_history(user_id)
+                await self._add_session(user_id, session)
+            return True
         except Exception as e:
             logger.error(f"Failed to append session for user {user_id}: {str(e)}")
             return False
     
+    async def _add_session(self, user_id: str, session: Dict[str, Any]):
+        """ZADD + HSET + EXPIRE in a single MULTI/EXEC"""
+        index_key = f"sessions:{user_id}"
+        data_key = f"session_data:{user_id}"
+        session_id = session["session_id"]
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zadd(index_key, {session_id: session.get("started_at", 0)})
+            pipe.hset(data_key, session_id, dumps(session))
+            pipe.expire(index_key, settings.SESSION_HISTORY_TTL)
+            pipe.expire(data_key, settings.SESSION_HISTORY_TTL)
+            await pipe.execute()
+    
+    async def migrate_session_history(self, user_id: str) -> bool:
+        """
+        Convert a legacy JSON-array sessions:{user_id} key into the
+        sorted set + hash layout, preserving its remaining TTL.
+        Returns True if a legacy key was migrated.
+        """
+        index_key = f"sessions:{user_id}"
+        data_key = f"session_data:{user_id}"
+        async with self.redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(index_key)
+                    if await pipe.type(index_key) != "string":
+                        await pipe.unwatch()
+                        return False
+                    
+                    value = await pipe.get(index_key)
+                    ttl = await pipe.ttl(index_key)
+                    sessions = loads(value) if value else []
+                    ttl = ttl if ttl > 0 else settings.SESSION_HISTORY_TTL
+                    
+                    pipe.multi()
+                    pipe.delete(index_key)
+                    if sessions:
+                        pipe.zadd(index_key, {s["session_id"]: s.get("started_at", 0) for s in sessions})
+                        pipe.hset(data_key, mapping={s["session_id"]: dumps(s) for s in sessions})
+                        pipe.expire(index_key, ttl)
+                        pipe.expire(data_key, ttl)
+                    await pipe.execute()
+                    logger.info(f"Migrated legacy session history for user {user_id} ({len(sessions)} sessions)")
+                    return True
+                except redis.WatchError:
+                    continue
+    
     # Caching
     async def cache_set(self, key: str, value: Any, ttl: int) -> bool:
-        """Generic cache set operation"""
+        """Generic cache set operation; invalidates the key in other workers' L1"""
         try:
-            serialized = json.dumps(value)
-            await self.redis.setex(key, ttl, serialized)
+            serialized = dumps(value)
+            invalidation = dumps({"key": key, "origin": self.instance_id})
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.setex(key, ttl, serialized)
+                pipe.publish(CACHE_INVALIDATION_CHANNEL, invalidation)
+                await pipe.execute()
+            self.local_cache.set(key, value, ttl)
             return True
         except Exception as e:
             logger.error(f"Failed to cache key {key}: {str(e)}")
             return False
     
     async def cache_get(self, key: str) -> Optional[Any]:
-        """Generic cache get operation"""
+        """
+        Generic cache get operation, served from the in-process L1 when hot.
+        Returned values are shared with the L1 and must not be mutated.
+        """
         try:
-            value = await self.redis.get(key)
-            if value:
-                return json.loads(value)
+            value = self.local_cache.get(key)
+            if value is not None:
+                return value
+            
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                pipe.pttl(key)
+                serialized, pttl = await pipe.execute()
+            if serialized:
+                value = loads(serialized)
+                # Never outlive the Redis entry
+                self.local_cache.set(key, value, pttl / 1000 if pttl > 0 else None)
+                return value
+            return None
+        except Exception as e:
+            logger.error(f"Failed to retrieve cache key {key}: {str(e)}")
             return None
+    
+    async def cache_get_or_fetch(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[Any]],
+        ttl: int,
+        beta: float = None
+    ) -> Optional[Any]:
+        """
+        Cached value of key, calling fetch() to fill it on a miss.
+        
+        Concurrent misses share one fetch per process, and a short Redis lock
+        lets a single process fetch while the others wait for its result.
+        Values are refreshed in the background a little before they expire,
+        with a probability that rises as expiry nears and with how long the
+        fetch takes (XFetch), so a TTL never causes a synchronized miss storm.
+        fetch() returning None (or failing) caches nothing.
+        Returned values are shared with the L1 and must not be mutated.
+        """
+        beta = settings.CACHE_EARLY_REFRESH_BETA if beta is None else beta
+        try:
+            value, fetch_seconds, remaining = await self._read_fetched(key)
         except Exception as e:
             logger.error(f"Failed to retrieve cache key {key}: {str(e)}")
+            value = None
+        
+        if value is None:
+            return await self.cache_refresh(key, fetch, ttl)
+        
+        if fetch_seconds and remaining is not None:
+            if remaining <= fetch_seconds * beta * -math.log(1.0 - random.random()):
+                # Serve the current value while one caller refreshes it
+                self._start_fetch(key, fetch, ttl)
+        return value
+    
+    async def cache_refresh(self, key: str, fetch: Callable[[], Awaitable[Any]], ttl: int) -> Optional[Any]:
+        """Fetch and cache a value now, joining a fetch already in flight"""
+        try:
+            return await asyncio.shield(self._start_fetch(key, fetch, ttl))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Logged once by _start_fetch for every caller sharing the fetch
             return None
     
-    # Rate Limiting
-    async def check_rate_limit(self, identifier: str, limit: int, window: int = 60) -> bool:
-        """Check if identifier is within rate limit"""
+    def _start_fetch(self, key: str, fetch: Callable[[], Awaitable[Any]], ttl: int) -> asyncio.Future:
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch_and_store(key, fetch, ttl))
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._finish_fetch(key, done))
+        return future
+    
+    def _finish_fetch(self, key: str, future: asyncio.Future):
+        self._inflight.pop(key, None)
+        if not future.cancelled() and future.exception():
+            logger.error(f"Failed to fetch cache key {key}: {str(future.exception())}")
+    
+    async def _fetch_and_store(self, key: str, fetch: Callable[[], Awaitable[Any]], ttl: int) -> Optional[Any]:
+        """Fetch under a cross-process lock, or wait for the process holding it"""
+        lock_key = f"lock:{key}"
+        token = uuid.uuid4().hex
+        lock_timeout = settings.CACHE_FETCH_LOCK_TIMEOUT
+        if not await self.redis.set(lock_key, token, nx=True, px=int(lock_timeout * 1000)):
+            written_before = await self.redis.get(f"{key}:fetched_at")
+            deadline = time.monotonic() + lock_timeout
+            while time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.get(f"{key}:fetched_at")
+                    pipe.exists(lock_key)
+                    written, locked = await pipe.execute()
+                if written and written != written_before:
+                    self.local_cache.invalidate(key)
+                    value, _, _ = await self._read_fetched(key)
+                    return value
+                if not locked:
+                    break
+            # The holder failed or gave up: fetch ourselves
+            token = None
+        
         try:
-            key = f"rate_limit:{identifier}"
-            current = await self.redis.get(key)
-            
-            if current is None:
-                await self.redis.setex(key, window, 1)
-                return True
-            
-            count = int(current)
-            if count >= limit:
-                return False
+            started = time.perf_counter()
+            value = await fetch()
+            fetch_seconds = time.perf_counter() - started
+            if value is None:
+                return None
             
-            await self.redis.incr(key)
-            return True
-        except Exception as e:
-            logger.error(f"Rate limit check failed for {identifier}: {str(e)}")
-            return True  # Allow on error to avoid blocking legitimate requests
+            meta = dumps({"fetch_seconds": round(fetch_seconds, 4), "at": time.time()})
+            invalidation = dumps({"key": key, "origin": self.instance_id})
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.setex(key, ttl, dumps(value))
+                pipe.setex(f"{key}:fetched_at", ttl, meta)
+                pipe.publish(CACHE_INVALIDATION_CHANNEL, invalidation)
+                await pipe.execute()
+            self.local_cache.set(key, value, ttl)
+            self.local_cache.set(f"{key}:fetched_at", (fetch_seconds, time.monotonic() + ttl), ttl)
+            return value
+        finally:
+            if token:
+                await self._release_lock_script(keys=[lock_key], args=[token])
+    
+    async def _read_fetched(self, key: str):
+        """(value, fetch duration in seconds, seconds until expiry) from L1 or Redis"""
+        value = self.local_cache.get(key)
+        meta = self.local_cache.get(f"{key}:fetched_at")
+        if value is not None and meta is not None:
+            fetch_seconds, expires_at = meta
+            return value, fetch_seconds, expires_at - time.monotonic()
+        
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.get(key)
+            pipe.pttl(key)
+            pipe.get(f"{key}:fetched_at")
+            serialized, pttl, fetched_at = await pipe.execute()
+        if not serialized:
+            return None, None, None
+        
+        value = loads(serialized)
+        remaining = pttl / 1000 if pttl > 0 else None
+        fetch_seconds = loads(fetched_at)["fetch_seconds"] if fetched_at else None
+        self.local_cache.set(key, value, remaining)
+        if remaining is not None and fetch_seconds is not None:
+            self.local_cache.set(f"{key}:fetched_at", (fetch_seconds, time.monotonic() + remaining), remaining)
+        return value, fetch_seconds, remaining
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters of the in-process L1 cache"""
+        return self.local_cache.stats()
+    
+    def _handle_invalidation(self, data: str):
+        """Drop L1 entries written by other workers"""
+        invalidation = loads(data)
+        if invalidation.get("origin") != self.instance_id:
+            self.local_cache.invalidate(invalidation["key"])
+    
+    # Pub/Sub
+    async def subscribe(
+        self,
+        channel: str,
+        handler: ChannelHandler,
+        on_reconnect: Optional[Callable[[], None]] = None
+    ):
+        """
+        Call handler with each message published on channel, through the
+        process's single pub/sub connection. on_reconnect is called after
+        the connection was lost (messages may have been missed).
+        """
+        self._channel_handlers[channel] = handler
+        if on_reconnect:
+            self._reconnect_handlers[channel] = on_reconnect
+        if self._pubsub:
+            try:
+                await self._pubsub.subscribe(channel)
+            except Exception as e:
+                # The listener resubscribes every channel when it reconnects
+                logger.error(f"Failed to subscribe to {channel}: {str(e)}")
+    
+    async def unsubscribe(self, channel: str):
+        """Stop delivering channel's messages"""
+        self._channel_handlers.pop(channel, None)
+        self._reconnect_handlers.pop(channel, None)
+        if self._pubsub:
+            try:
+                await self._pubsub.unsubscribe(channel)
+            except Exception as e:
+                logger.error(f"Failed to unsubscribe from {channel}: {str(e)}")
+    
+    async def _listen(self):
+        """Dispatch pub/sub messages to channel handlers (runs for the client's lifetime)"""
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                # Set first, so channels added meanwhile are subscribed too
+                self._pubsub = pubsub
+                await pubsub.subscribe(*self._channel_handlers)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    handler = self._channel_handlers.get(message["channel"])
+                    if not handler:
+                        continue
+                    try:
+                        handler(message["data"])
+                    except Exception as e:
+                        logger.error(f"Handler for {message['channel']} failed: {str(e)}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Pub/sub listener failed: {str(e)}")
+                for on_reconnect in list(self._reconnect_handlers.values()):
+                    on_reconnect()
+                await asyncio.sleep(1)
+            finally:
+                self._pubsub = None
+                await pubsub.aclose()
     
     # Token Usage Tracking
     async def increment_token_usage(self, service: str, tokens: int) -> int:
@@ -251,5 +927,20 @@ class RedisClient:
             return 0
 
 
+def _is_wrong_type(error: Exception) -> bool:
+    """Whether a Redis error was caused by a key holding a legacy value type"""
+    return "WRONGTYPE" in str(error)
+
+
+def _encode_fields(data: Dict[str, Any]) -> Dict[str, str]:
+    """JSON-encode each hash field value so types survive the round trip"""
+    return {field: dumps(value) for field, value in data.items()}
+
+
+def _decode_fields(fields: Dict[str, str]) -> Dict[str, Any]:
+    """Inverse of _encode_fields"""
+    return {field: loads(value) for field, value in fields.items()}
+
+
 # Global Redis client instance
 redis_client = RedisClient()
@@ -0,0 +1,179 @@
+"""
+Per-room coordination of AI replies
+
+Every user message bumps the room's reply generation (reply_gen:{room_id})
+and is queued in reply_inputs:{room_id}. Only the newest generation may
+deliver a reply: it answers every input still queued, while older
+generations still running in any process are cancelled through a Redis
+pub/sub notice. Delivered replies get a per-room monotonic reply_seq.
+"""
+import asyncio
+import contextvars
+from typing import Awaitable, Dict, List, Optional, Set, Tuple
+from config import settings
+from services.redis_client import redis_client
+from utils.logger import logger
+from utils.serialization import dumps, loads
+
+SUPERSEDED_CHANNEL = "reply:superseded"
+
+
+class _Generation:
+    """A reply generation running in this process, plus tasks it spawned"""
+    
+    def __init__(self, room_id: str, generation: int):
+        self.room_id = room_id
+        self.generation = generation
+        self.tasks: Set[asyncio.Task] = set()
+    
+    def cancel(self):
+        for task in self.tasks:
+            task.cancel()
+
+
+# The generation the current task is working for (inherited by child tasks)
+_current: contextvars.ContextVar[Optional[_Generation]] = contextvars.ContextVar(
+    "reply_generation", default=None
+)
+
+
+class ReplyCoordinator:
+    """Single-flight reply generation per room, across processes"""
+    
+    def __init__(self):
+        self._running: Dict[str, Set[_Generation]] = {}
+    
+    async def start(self):
+        """Start listening for supersession notices"""
+        await redis_client.subscribe(SUPERSEDED_CHANNEL, self._handle_superseded)
+    
+    async def stop(self):
+        await redis_client.unsubscribe(SUPERSEDED_CHANNEL)
+    
+    async def submit(self, room_id: str, message: str, client_message_id: Optional[str] = None) -> int:
+        """Queue a user message; returns the generation that should answer it"""
+        entry = dumps({"message": message, "client_message_id": client_message_id})
+        async with redis_client.redis.pipeline(transaction=True) as pipe:
+            pipe.rpush(self._inputs_key(room_id), entry)
+            pipe.expire(self._inputs_key(room_id), settings.SOCKET_SESSION_TTL)
+            pipe.incr(self._generation_key(room_id))
+            pipe.expire(self._generation_key(room_id), settings.SOCKET_SESSION_TTL)
+            _, _, generation, _ = await pipe.execute()
+        
+        # Tell every process which generation is now current
+        await redis_client.redis.publish(
+            SUPERSEDED_CHANNEL,
+            dumps({"room_id": room_id, "generation": generation})
+        )
+        return generation
+    
+    async def wait_for_quiet(self, room_id: str, generation: int) -> Optional[Tuple[str, int, List[str]]]:
+        """
+        Wait out the debounce window. Returns the merged pending input, how
+        many messages it covers and their client message ids, or None if a
+        newer message superseded this one.
+        """
+        if settings.REPLY_DEBOUNCE_MS > 0:
+            await asyncio.sleep(settings.REPLY_DEBOUNCE_MS / 1000)
+        if not await self.is_current(room_id, generation):
+            return None
+        inputs = [loads(entry) for entry in await redis_client.redis.lrange(self._inputs_key(room_id), 0, -1)]
+        if not inputs:
+            return None
+        return (
+            "\n".join(entry["message"] for entry in inputs),
+            len(inputs),
+            [entry["client_message_id"] for entry in inputs if entry.get("client_message_id")]
+        )
+    
+    async def is_current(self, room_id: str, generation: int) -> bool:
+        """Whether no newer user message has arrived since generation"""
+        current = await redis_client.redis.get(self._generation_key(room_id))
+        return current is None or int(current) <= generation
+    
+    async def run(self, room_id: str, generation: int, work: Awaitable) -> bool:
+        """
+        Run a generation's work; returns False if it was cancelled because a
+        newer message superseded it. Tasks spawned by the work (see attach)
+        are cancelled with it.
+        """
+        handle = _Generation(room_id, generation)
+        token = _current.set(handle)
+        try:
+            task = asyncio.ensure_future(work)
+        finally:
+            _current.reset(token)
+        handle.tasks.add(task)
+        self._running.setdefault(room_id, set()).add(handle)
+        
+        try:
+            await asyncio.wait({task})
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            running = self._running.get(room_id)
+            if running is not None:
+                running.discard(handle)
+                if not running:
+                    del self._running[room_id]
+        
+        if task.cancelled():
+            logger.info(f"Reply generation {generation} in room {room_id} superseded")
+            return False
+        task.result()
+        return True
+    
+    def detach(self):
+        """
+        Stop supersession notices from cancelling the generation the caller
+        works for. Called before delivery: once its inputs are trimmed the
+        reply has to go out, or they would never be answered.
+        """
+        handle = _current.get()
+        if handle:
+            running = self._running.get(handle.room_id)
+            if running is not None:
+                running.discard(handle)
+                if not running:
+                    del self._running[handle.room_id]
+    
+    def attach(self, task: asyncio.Task):
+        """Cancel task along with the generation the caller is working for"""
+        handle = _current.get()
+        if handle:
+            handle.tasks.add(task)
+            task.add_done_callback(handle.tasks.discard)
+    
+    async def complete(self, room_id: str, consumed: int) -> int:
+        """Drop the answered inputs and return the reply's sequence number"""
+        async with redis_client.redis.pipeline(transaction=True) as pipe:
+            pipe.ltrim(self._inputs_key(room_id), consumed, -1)
+            pipe.incr(self._seq_key(room_id))
+            pipe.expire(self._seq_key(room_id), settings.SOCKET_SESSION_TTL)
+            _, reply_seq, _ = await pipe.execute()
+        return reply_seq
+    
+    def _supersede(self, room_id: str, generation: int):
+        for handle in list(self._running.get(room_id, ())):
+            if handle.generation < generation:
+                handle.cancel()
+    
+    def _handle_superseded(self, data: str):
+        """Cancel local generations made stale by a message on any process"""
+        notice = loads(data)
+        if notice.get("generation"):
+            self._supersede(notice["room_id"], notice["generation"])
+    
+    def _generation_key(self, room_id: str) -> str:
+        return f"reply_gen:{room_id}"
+    
+    def _inputs_key(self, room_id: str) -> str:
+        return f"reply_inputs:{room_id}"
+    
+    def _seq_key(self, room_id: str) -> str:
+        return f"reply_seq:{room_id}"
+
+
+# Global reply coordinator instance
+reply_coordinator = ReplyCoordinator()
@@ -0,0 +1,109 @@
+"""
+Admission control for AI replies
+
+At most REPLY_MAX_CONCURRENCY replies are generated at once per process.
+Further requests wait in a bounded queue served round-robin across rooms,
+so a single busy classroom cannot starve the others. The queue depth also
+selects a brownout level that strips media from replies as load rises.
+"""
+import asyncio
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Optional
+from config import settings
+from utils.logger import logger
+
+# Brownout levels, from no degradation to the cheapest reply
+LEVEL_FULL = "full"
+LEVEL_AUDIO = "audio"
+LEVEL_TEXT = "text"
+
+
+class ReplyScheduler:
+    """Concurrency limit plus a per-room fair wait queue"""
+    
+    def __init__(self):
+        self.active = 0
+        self._queues: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._depth = 0
+        self.admitted = 0
+        self.rejected = 0
+    
+    def level(self) -> str:
+        """Current brownout level from the wait queue depth"""
+        if self._depth >= settings.REPLY_BROWNOUT_TEXT_DEPTH:
+            return LEVEL_TEXT
+        if self._depth >= settings.REPLY_BROWNOUT_AUDIO_DEPTH:
+            return LEVEL_AUDIO
+        return LEVEL_FULL
+    
+    async def acquire(self, room_id: str) -> Optional[str]:
+        """
+        Wait for a reply slot. Returns the brownout level the reply should be
+        generated at, or None if the queue is full and the request is shed.
+        """
+        if self.active < settings.REPLY_MAX_CONCURRENCY and not self._depth:
+            self.active += 1
+            self.admitted += 1
+            return self.level()
+        
+        if self._depth >= settings.REPLY_QUEUE_MAX:
+            self.rejected += 1
+            logger.warning(f"Reply queue full ({self._depth}), shedding request for room {room_id}")
+            return None
+        
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(room_id, deque()).append(future)
+        self._depth += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we were cancelled
+                self.release()
+            else:
+                self._forget(room_id, future)
+            raise
+        
+        self.admitted += 1
+        return self.level()
+    
+    def release(self):
+        """Hand the slot to the next waiting room, or free it"""
+        while self._queues:
+            room_id, queue = next(iter(self._queues.items()))
+            future = queue.popleft()
+            self._depth -= 1
+            if queue:
+                # Round-robin: the room's next request waits behind other rooms
+                self._queues.move_to_end(room_id)
+            else:
+                del self._queues[room_id]
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Load and brownout state for /health"""
+        return {
+            "level": self.level(),
+            "active": self.active,
+            "limit": settings.REPLY_MAX_CONCURRENCY,
+            "queue_depth": self._depth,
+            "queue_max": settings.REPLY_QUEUE_MAX,
+            "rooms_waiting": len(self._queues),
+            "admitted": self.admitted,
+            "rejected": self.rejected
+        }
+    
+    def _forget(self, room_id: str, future: asyncio.Future):
+        queue = self._queues.get(room_id)
+        if queue and future in queue:
+            queue.remove(future)
+            self._depth -= 1
+            if not queue:
+                del self._queues[room_id]
+
+
+# Global reply scheduler instance
+reply_scheduler = ReplyScheduler()
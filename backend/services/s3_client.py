@@ -3,7 +3,7 @@ AWS S3 client for audio and recording uploads
 """
 import boto3
 from botocore.exceptions import ClientError
-from typing import Optional
+from typing import AsyncIterator, Optional
 import asyncio
 from functools import partial
 from config import settings
@@ -50,7 +50,14 @@ class S3Client:
         """Upload audio file to S3 and return URL"""
         try:
             key = f"audio/{room_id}/{filename}"
-            
+            return await self.upload_audio_object(key, audio_bytes)
+        except Exception as e:
+            logger.error(f"Failed to upload audio for room {room_id}: {str(e)}")
+            return None
+    
+    async def upload_audio_object(self, key: str, audio_bytes: bytes) -> Optional[str]:
+        """Upload publicly readable audio at an exact key and return its URL"""
+        try:
             def upload_op():
                 self.s3_client.put_object(
                     Bucket=self.bucket_name,
@@ -65,17 +72,93 @@ class S3Client:
             result = await self._retry_operation(upload_op)
             
             if result:
-                # Generate public URL (no pre-signing needed)
-                public_url = f"https://{self.bucket_name}.s3.{settings.AWS_REGION}.amazonaws.com/{key}"
+                public_url = self.public_url(key)
                 logger.info(f"Audio uploaded successfully: {public_url}")
                 return public_url
             
             return None
             
         except Exception as e:
-            logger.error(f"Failed to upload audio for room {room_id}: {str(e)}")
+            logger.error(f"Failed to upload audio {key}: {str(e)}")
+            return None
+    
+    async def upload_object(
+        self,
+        key: str,
+        body: bytes,
+        content_type: str,
+        content_encoding: Optional[str] = None
+    ) -> bool:
+        """Upload a private object at an exact key"""
+        try:
+            def upload_op():
+                extra = {"ContentEncoding": content_encoding} if content_encoding else {}
+                self.s3_client.put_object(
+                    Bucket=self.bucket_name,
+                    Key=key,
+                    Body=body,
+                    ContentType=content_type,
+                    **extra
+                )
+                return key
+            
+            return bool(await self._retry_operation(upload_op))
+            
+        except Exception as e:
+            logger.error(f"Failed to upload object {key}: {str(e)}")
+            return False
+    
+    def public_url(self, key: str) -> str:
+        """Public URL of an object (no pre-signing needed)"""
+        return f"https://{self.bucket_name}.s3.{settings.AWS_REGION}.amazonaws.com/{key}"
+    
+    async def object_exists(self, key: str) -> bool:
+        """Check whether an object exists (HEAD, no retries on 404)"""
+        try:
+            def head_op():
+                try:
+                    self.s3_client.head_object(Bucket=self.bucket_name, Key=key)
+                    return True
+                except ClientError as e:
+                    if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                        return False
+                    raise
+            
+            return bool(await self._retry_operation(head_op))
+            
+        except Exception as e:
+            logger.error(f"Failed to check object {key}: {str(e)}")
+            return False
+    
+    async def download_object(self, key: str) -> Optional[bytes]:
+        """Download an object's bytes"""
+        try:
+            def download_op():
+                response = self.s3_client.get_object(Bucket=self.bucket_name, Key=key)
+                return response["Body"].read()
+            
+            return await self._retry_operation(download_op)
+            
+        except Exception as e:
+            logger.error(f"Failed to download object {key}: {str(e)}")
             return None
     
+    async def stream_object(self, key: str, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+        """Yield an object's bytes chunk by chunk as they are downloaded"""
+        loop = asyncio.get_event_loop()
+        response = await loop.run_in_executor(
+            None, partial(self.s3_client.get_object, Bucket=self.bucket_name, Key=key)
+        )
+        body = response["Body"]
+        try:
+            while True:
+                chunk = await loop.run_in_executor(None, body.read, chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            body.close()
+    
     async def upload_recording(
         self,
         room_id: str,
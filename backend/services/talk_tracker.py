@@ -0,0 +1,157 @@
+"""
+Shared completion tracking for D-ID talks
+
+Waiters await a future per talk_id. Futures are resolved by D-ID webhook
+callbacks (relayed to every process over Redis pub/sub) or, as a fallback,
+by a single scheduler that polls all outstanding talks with adaptive backoff.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional
+from config import settings
+from services.redis_client import redis_client
+from utils.local_cache import LocalCache
+from utils.logger import logger
+from utils.serialization import dumps, loads
+
+TALK_RESULTS_CHANNEL = "did:talk_results"
+
+# talk_id -> D-ID talk object, or None if the status could not be fetched
+StatusFetcher = Callable[[str], Awaitable[Optional[Dict]]]
+
+
+class _PendingTalk:
+    """Bookkeeping for one outstanding talk"""
+    
+    def __init__(self, future: asyncio.Future, first_poll_at: float):
+        self.future = future
+        self.next_poll_at = first_poll_at
+        self.polls = 0
+        self.waiters = 0
+
+
+class TalkCompletionTracker:
+    """Resolves talk_id futures from webhooks, falling back to batched polling"""
+    
+    def __init__(self, fetch_status: StatusFetcher):
+        self.fetch_status = fetch_status
+        self._pending: Dict[str, _PendingTalk] = {}
+        # Results that arrived before (or without) a local waiter
+        self._recent = LocalCache(max_entries=1000, default_ttl=120)
+        self._wakeup = asyncio.Event()
+        self._poller_task: Optional[asyncio.Task] = None
+    
+    async def start(self):
+        """Start the shared poller and the webhook result listener"""
+        self._poller_task = asyncio.create_task(self._poll_loop())
+        await redis_client.subscribe(TALK_RESULTS_CHANNEL, self._handle_result)
+    
+    async def stop(self):
+        """Stop background tasks and release any waiters"""
+        await redis_client.unsubscribe(TALK_RESULTS_CHANNEL)
+        if self._poller_task:
+            self._poller_task.cancel()
+            try:
+                await self._poller_task
+            except asyncio.CancelledError:
+                pass
+        for talk_id in list(self._pending):
+            self._resolve(talk_id, None)
+    
+    async def wait(self, talk_id: str, timeout: float = None) -> Optional[str]:
+        """Wait for a talk to finish; returns its result_url or None"""
+        timeout = timeout or settings.DID_VIDEO_TIMEOUT
+        recent = self._recent.get(talk_id)
+        if recent is not None:
+            return recent.get("result_url")
+        
+        loop = asyncio.get_running_loop()
+        pending = self._pending.get(talk_id)
+        if not pending:
+            # With a webhook configured, polling is only a safety net
+            first_poll = settings.DID_WEBHOOK_POLL_DELAY if settings.did_webhooks_enabled() else settings.DID_POLL_INITIAL_INTERVAL
+            pending = _PendingTalk(loop.create_future(), loop.time() + first_poll)
+            self._pending[talk_id] = pending
+            self._wakeup.set()
+        
+        pending.waiters += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(pending.future), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"D-ID video generation timeout for talk {talk_id}")
+            self._resolve(talk_id, None)
+            return None
+        finally:
+            pending.waiters -= 1
+            if not pending.waiters and self._pending.get(talk_id) is pending:
+                # Every waiter gave up (cancelled): stop polling for it
+                self._resolve(talk_id, None)
+    
+    async def publish(self, talk: Dict):
+        """Fan a webhook result out to every process waiting on it"""
+        await redis_client.redis.publish(TALK_RESULTS_CHANNEL, dumps(talk))
+    
+    def _handle_talk(self, talk: Dict) -> bool:
+        """Resolve from a talk object if it is final; returns True if it was"""
+        talk_id = talk.get("id")
+        status = talk.get("status")
+        if status == "done":
+            logger.info(f"D-ID video ready: {talk.get('result_url')}")
+            self._recent.set(talk_id, talk)
+            self._resolve(talk_id, talk.get("result_url"))
+            return True
+        if status in ("error", "rejected"):
+            logger.error(f"D-ID video generation failed: {talk.get('error')}")
+            self._recent.set(talk_id, talk)
+            self._resolve(talk_id, None)
+            return True
+        return False
+    
+    def _resolve(self, talk_id: str, video_url: Optional[str]):
+        pending = self._pending.pop(talk_id, None)
+        if pending and not pending.future.done():
+            pending.future.set_result(video_url)
+    
+    def _next_interval(self, polls: int) -> float:
+        """Fast early, slower later"""
+        return min(
+            settings.DID_POLL_MAX_INTERVAL,
+            settings.DID_POLL_INITIAL_INTERVAL * (1.5 ** polls)
+        )
+    
+    async def _poll(self, talk_id: str, pending: _PendingTalk):
+        talk = await self.fetch_status(talk_id)
+        if talk and self._handle_talk(talk):
+            return
+        pending.polls += 1
+        pending.next_poll_at = asyncio.get_running_loop().time() + self._next_interval(pending.polls)
+    
+    async def _poll_loop(self):
+        """Single scheduler polling every due talk in one batch"""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                self._wakeup.clear()
+                if not self._pending:
+                    await self._wakeup.wait()
+                    continue
+                
+                now = loop.time()
+                due = {tid: p for tid, p in self._pending.items() if p.next_poll_at <= now}
+                if due:
+                    await asyncio.gather(*(self._poll(tid, p) for tid, p in due.items()))
+                    continue
+                
+                next_at = min(p.next_poll_at for p in self._pending.values())
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), next_at - now)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"D-ID poller error: {str(e)}")
+                await asyncio.sleep(1)
+    
+    def _handle_result(self, data: str):
+        """Resolve local waiters from webhook results published by any process"""
+        self._handle_talk(loads(data))
@@ -0,0 +1,111 @@
+"""
+Archive of ended sessions' transcripts in S3
+
+When a room ends its conversation is written to
+transcripts/{user_id}/{session_id}.jsonl.gz (one JSON message per line,
+gzipped) and the Redis copy is left to expire shortly after, instead of
+holding every transcript in memory for CONVERSATION_TTL. Reads go through
+the shared Redis/L1 cache, so a transcript being viewed is fetched from S3
+once.
+"""
+import asyncio
+import gzip
+import zlib
+from typing import Any, AsyncIterator, Dict, List, Optional
+from config import settings
+from services.redis_client import redis_client
+from services.s3_client import s3_client
+from utils.logger import logger
+from utils.serialization import dumps, loads
+
+
+def encode_transcript(messages: List[Dict[str, Any]]) -> bytes:
+    lines = "".join(dumps(message) + "\n" for message in messages)
+    return gzip.compress(lines.encode(), compresslevel=6)
+
+
+def decode_transcript(body: bytes) -> List[Dict[str, Any]]:
+    # Only "\n" separates lines: orjson writes U+2028/U+2029/U+0085 raw inside strings
+    return [loads(line) for line in gzip.decompress(body).split(b"\n") if line]
+
+
+class TranscriptArchive:
+    """Writes transcripts to S3 and reads them back through the cache"""
+    
+    async def archive(self, room_id: str, user_id: str, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Archive a room's conversation for a session and schedule its Redis
+        copy for removal. Returns the object key and sizes, or None if
+        there was nothing to archive or the upload failed (the conversation
+        then keeps its normal TTL).
+        """
+        try:
+            messages = await redis_client.get_conversation(room_id, limit=settings.CONVERSATION_MAX_MESSAGES)
+            if not messages:
+                return None
+            
+            key = self._object_key(user_id, session_id)
+            body = await asyncio.to_thread(encode_transcript, messages)
+            if not await s3_client.upload_object(key, body, "application/x-ndjson", content_encoding="gzip"):
+                return None
+            
+            redis_bytes = await self._memory_usage(room_id)
+            await redis_client.expire_conversation(room_id, settings.TRANSCRIPT_REDIS_GRACE)
+            
+            stats = {
+                "transcript_key": key,
+                "messages": len(messages),
+                "compressed_bytes": len(body),
+                "redis_bytes_freed": redis_bytes
+            }
+            logger.info(
+                f"Archived transcript of room {room_id} to {key}: {len(messages)} messages, "
+                f"{len(body)} bytes compressed, ~{redis_bytes or 0} bytes of Redis freed"
+            )
+            return stats
+        except Exception as e:
+            logger.error(f"Failed to archive transcript for room {room_id}: {str(e)}")
+            return None
+    
+    async def load(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """An archived transcript, or None if it could not be read"""
+        async def fetch():
+            body = await s3_client.download_object(key)
+            return await asyncio.to_thread(decode_transcript, body) if body else None
+        
+        return await redis_client.cache_get_or_fetch(
+            f"transcript:{key}", fetch, settings.TRANSCRIPT_CACHE_TTL
+        )
+    
+    async def iter_messages(self, key: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield an archived transcript's messages while it downloads, holding
+        only one chunk in memory at a time
+        """
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)  # gzip framing
+        pending = b""
+        async for chunk in s3_client.stream_object(key):
+            pending += decompressor.decompress(chunk)
+            *lines, pending = pending.split(b"\n")
+            for line in lines:
+                if line:
+                    yield loads(line)
+        pending += decompressor.flush()
+        if pending.strip():
+            yield loads(pending)
+    
+    async def _memory_usage(self, room_id: str) -> Optional[int]:
+        """Bytes Redis holds for the conversation (MEMORY USAGE), if available"""
+        try:
+            usage = await redis_client.redis.memory_usage(f"conversation:{room_id}", samples=0)
+            return int(usage) if usage else None
+        except Exception as e:
+            logger.warning(f"Could not measure conversation memory for room {room_id}: {str(e)}")
+            return None
+    
+    def _object_key(self, user_id: str, session_id: str) -> str:
+        return f"transcripts/{user_id}/{session_id}.jsonl.gz"
+
+
+# Global transcript archive instance
+transcript_archive = TranscriptArchive()
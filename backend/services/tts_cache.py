@@ -0,0 +1,158 @@
+"""
+Content-addressed cache of synthesized TTS audio
+
+Entries are keyed by a hash of (normalized text, voice_id, model, voice
+settings). Redis maps the hash to the audio URL; the S3 object under
+tts-cache/{hash}.mp3 is the backing store, so an entry whose Redis key
+expired is recovered with a HEAD instead of a new synthesis.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import time
+import unicodedata
+from typing import Any, Dict, Optional
+from config import settings
+from services.redis_client import redis_client
+from services.s3_client import s3_client
+from utils.logger import logger
+
+LRU_KEY = "tts_cache:lru"
+STATS_KEY = "tts_cache:stats"
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form of TTS input: NFC, trimmed, whitespace collapsed"""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+class TTSAudioCache:
+    """Redis index + S3 store for previously synthesized audio"""
+    
+    def __init__(self):
+        self._eviction_task: Optional[asyncio.Task] = None
+    
+    def digest(self, text: str, voice_id: str, voice_settings: Dict[str, Any]) -> str:
+        """Content address of a synthesis request"""
+        material = json.dumps(
+            {
+                "text": normalize_text(text),
+                "voice_id": voice_id,
+                "model": settings.ELEVENLABS_MODEL,
+                "voice_settings": voice_settings
+            },
+            sort_keys=True
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+    
+    async def get(self, digest: str) -> Optional[str]:
+        """Return the cached audio URL for digest, or None on miss"""
+        try:
+            key = f"tts_audio:{digest}"
+            audio_url = await redis_client.redis.get(key)
+            
+            if not audio_url:
+                # Redis entry expired: fall back to the S3 backing store
+                s3_key = self._s3_key(digest)
+                if await s3_client.object_exists(s3_key):
+                    audio_url = s3_client.public_url(s3_key)
+            
+            async with redis_client.redis.pipeline(transaction=False) as pipe:
+                if audio_url:
+                    # Sliding TTL + LRU position
+                    pipe.setex(key, settings.TTS_CACHE_TTL, audio_url)
+                    pipe.zadd(LRU_KEY, {digest: time.time()})
+                    pipe.hincrby(STATS_KEY, "hits", 1)
+                else:
+                    pipe.hincrby(STATS_KEY, "misses", 1)
+                await pipe.execute()
+            
+            return audio_url
+        except Exception as e:
+            logger.error(f"TTS cache lookup failed for {digest}: {str(e)}")
+            return None
+    
+    async def get_bytes(self, digest: str) -> Optional[bytes]:
+        """Download the cached audio for digest"""
+        return await s3_client.download_object(self._s3_key(digest))
+    
+    async def put(self, digest: str, audio_bytes: bytes) -> Optional[str]:
+        """Upload audio under its content address and index it"""
+        try:
+            audio_url = await s3_client.upload_audio_object(self._s3_key(digest), audio_bytes)
+            if not audio_url:
+                return None
+            
+            async with redis_client.redis.pipeline(transaction=False) as pipe:
+                pipe.setex(f"tts_audio:{digest}", settings.TTS_CACHE_TTL, audio_url)
+                pipe.zadd(LRU_KEY, {digest: time.time()})
+                pipe.zcard(LRU_KEY)
+                _, _, size = await pipe.execute()
+            
+            if size > settings.TTS_CACHE_MAX_ENTRIES and not self._eviction_running():
+                self._eviction_task = asyncio.create_task(self.evict())
+            
+            return audio_url
+        except Exception as e:
+            logger.error(f"TTS cache store failed for {digest}: {str(e)}")
+            return None
+    
+    async def evict(self) -> int:
+        """
+        Remove entries idle for longer than TTS_CACHE_TTL, then the least
+        recently used ones above TTS_CACHE_MAX_ENTRIES. Returns count removed.
+        """
+        try:
+            cold = await redis_client.redis.zrangebyscore(
+                LRU_KEY, "-inf", time.time() - settings.TTS_CACHE_TTL
+            )
+            size = await redis_client.redis.zcard(LRU_KEY) - len(cold)
+            excess = max(0, size - settings.TTS_CACHE_MAX_ENTRIES)
+            if excess:
+                cold += await redis_client.redis.zrange(LRU_KEY, len(cold), len(cold) + excess - 1)
+            
+            for digest in cold:
+                await s3_client.delete_object(self._s3_key(digest))
+                async with redis_client.redis.pipeline(transaction=False) as pipe:
+                    pipe.delete(f"tts_audio:{digest}")
+                    pipe.zrem(LRU_KEY, digest)
+                    pipe.hincrby(STATS_KEY, "evictions", 1)
+                    await pipe.execute()
+            
+            if cold:
+                logger.info(f"Evicted {len(cold)} TTS cache entries")
+            return len(cold)
+        except Exception as e:
+            logger.error(f"TTS cache eviction failed: {str(e)}")
+            return 0
+    
+    async def get_stats(self) -> Dict[str, Any]:
+        """Hit ratio and counters across all workers"""
+        try:
+            async with redis_client.redis.pipeline(transaction=False) as pipe:
+                pipe.hgetall(STATS_KEY)
+                pipe.zcard(LRU_KEY)
+                counters, size = await pipe.execute()
+            hits = int(counters.get("hits", 0))
+            misses = int(counters.get("misses", 0))
+            return {
+                "size": size,
+                "hits": hits,
+                "misses": misses,
+                "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+                "evictions": int(counters.get("evictions", 0))
+            }
+        except Exception as e:
+            logger.error(f"Failed to read TTS cache stats: {str(e)}")
+            return {}
+    
+    def _eviction_running(self) -> bool:
+        return self._eviction_task is not None and not self._eviction_task.done()
+    
+    def _s3_key(self, digest: str) -> str:
+        return f"tts-cache/{digest}.mp3"
+
+
+# Global TTS audio cache instance
+tts_audio_cache = TTSAudioCache()
@@ -0,0 +1,120 @@
+"""
+Sentence-pipelined text-to-speech for streamed LLM output
+"""
+import asyncio
+import re
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from utils.logger import logger
+
+# Split after sentence-ending punctuation followed by whitespace, or at newlines
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n+")
+
+# (text, index) -> (audio bytes, public audio URL); empty bytes on failure,
+# or when the audio was not downloaded (e.g. served from a cache by URL)
+SegmentRenderer = Callable[[str, int], Awaitable[Tuple[bytes, Optional[str]]]]
+# (index, text, audio_url) -> announce a ready segment, called in index order
+SegmentHandler = Callable[[int, str, Optional[str]], Awaitable[None]]
+
+
+class SentenceTTSPipeline:
+    """
+    Splits streamed text at sentence boundaries and synthesizes each
+    sentence concurrently (bounded by max_parallel), announcing finished
+    segments strictly in order so playback can start after the first one.
+    """
+    
+    def __init__(
+        self,
+        render: SegmentRenderer,
+        on_segment: Optional[SegmentHandler] = None,
+        max_parallel: int = 3,
+        min_segment_chars: int = 40
+    ):
+        self.render = render
+        self.on_segment = on_segment
+        self.min_segment_chars = min_segment_chars
+        self._semaphore = asyncio.Semaphore(max_parallel)
+        self._buffer = ""
+        self._pending = ""
+        self._tasks: List[asyncio.Task] = []
+        self._texts: List[str] = []
+        self._announced: List[asyncio.Event] = []
+        self._audio: Dict[int, bytes] = {}
+    
+    def feed(self, delta: str):
+        """Add streamed text; schedules synthesis of every completed sentence"""
+        self._buffer += delta
+        parts = SENTENCE_BOUNDARY.split(self._buffer)
+        # The last part has no boundary after it yet
+        self._buffer = parts.pop()
+        for sentence in parts:
+            self._add_sentence(sentence)
+    
+    async def finish(self) -> List[Optional[str]]:
+        """Flush remaining text and wait for all segments; returns URLs in order"""
+        self._add_sentence(self._buffer)
+        self._buffer = ""
+        if self._pending:
+            self._submit(self._pending)
+            self._pending = ""
+        return list(await asyncio.gather(*self._tasks))
+    
+    def cancel(self):
+        """Abort any in-flight synthesis"""
+        for task in self._tasks:
+            task.cancel()
+    
+    @property
+    def segment_count(self) -> int:
+        return len(self._tasks)
+    
+    def audio_bytes(self) -> bytes:
+        """Concatenated MP3 of every synthesized segment, in order"""
+        return b"".join(self._audio[index] for index in sorted(self._audio))
+    
+    def segments_without_audio(self) -> List[Tuple[int, str]]:
+        """(index, text) of the segments whose bytes the renderer did not return"""
+        return [(index, text) for index, text in enumerate(self._texts) if index not in self._audio]
+    
+    def set_audio(self, index: int, audio_bytes: bytes):
+        """Supply a segment's bytes after the fact (for audio_bytes)"""
+        self._audio[index] = audio_bytes
+    
+    def _add_sentence(self, sentence: str):
+        sentence = sentence.strip()
+        if not sentence:
+            return
+        # Merge short fragments (abbreviations, bullets) into one request
+        self._pending = f"{self._pending} {sentence}" if self._pending else sentence
+        if len(self._pending) >= self.min_segment_chars:
+            self._submit(self._pending)
+            self._pending = ""
+    
+    def _submit(self, text: str):
+        index = len(self._tasks)
+        self._announced.append(asyncio.Event())
+        self._texts.append(text)
+        self._tasks.append(asyncio.create_task(self._run(index, text)))
+    
+    async def _run(self, index: int, text: str) -> Optional[str]:
+        audio_url = None
+        try:
+            async with self._semaphore:
+                audio_bytes, audio_url = await self.render(text, index)
+            if audio_bytes:
+                self._audio[index] = audio_bytes
+        except Exception as e:
+            logger.error(f"TTS segment {index} failed: {str(e)}")
+        
+        # Announce in order, after every earlier segment
+        try:
+            if index > 0:
+                await self._announced[index - 1].wait()
+            if self.on_segment:
+                await self.on_segment(index, text, audio_url)
+        except Exception as e:
+            logger.error(f"Failed to announce TTS segment {index}: {str(e)}")
+        finally:
+            self._announced[index].set()
+        
+        return audio_url
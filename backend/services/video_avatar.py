@@ -6,6 +6,7 @@ import httpx
 import asyncio
 from typing import Optional, Dict
 from config import settings
+from services.talk_tracker import TalkCompletionTracker
 from utils.logger import logger
 
 
@@ -16,14 +17,19 @@ class VideoAvatarService:
         self.api_key = settings.DID_API_KEY
         self.base_url = settings.DID_API_URL
         self.http_client: Optional[httpx.AsyncClient] = None
+        self.completion_tracker = TalkCompletionTracker(self.get_talk_status)
     
     async def initialize(self):
-        """Initialize async HTTP client"""
+        """Initialize async HTTP client and talk completion tracking"""
         self.http_client = httpx.AsyncClient(timeout=60.0)
+        await self.completion_tracker.start()
+        if settings.DID_WEBHOOK_URL and not settings.DID_WEBHOOK_SECRET:
+            logger.warning("DID_WEBHOOK_URL is set without DID_WEBHOOK_SECRET; webhooks disabled, polling D-ID")
         logger.info("Video Avatar service initialized")
     
     async def close(self):
         """Close HTTP client"""
+        await self.completion_tracker.stop()
         if self.http_client:
             await self.http_client.aclose()
     
@@ -79,6 +85,10 @@ class VideoAvatarService:
                     }
                 }
             
+            # Ask D-ID to call us back as soon as the video is ready
+            if settings.did_webhooks_enabled():
+                payload["webhook"] = self._webhook_url()
+            
             # Create talk
             url = f"{self.base_url}{settings.DID_TALKS_ENDPOINT}"
             response = await self.http_client.post(url, headers=headers, json=payload)
@@ -89,8 +99,13 @@ class VideoAvatarService:
                 
                 logger.info(f"D-ID talk created: {talk_id}")
                 
-                # Poll for completion
-                video_url = await self._wait_for_video(talk_id, headers)
+                # Wait for the webhook (or the shared poller) to report completion
+                try:
+                    video_url = await self.completion_tracker.wait(talk_id)
+                except asyncio.CancelledError:
+                    # Reply superseded or out of time: stop D-ID rendering it
+                    await asyncio.shield(self.delete_talk(talk_id))
+                    raise
                 
                 if video_url:
                     return {
@@ -107,65 +122,20 @@ class VideoAvatarService:
             logger.error(f"Error creating talking avatar: {str(e)}")
             return None
     
-    async def _wait_for_video(self, talk_id: str, headers: Dict, max_attempts: int = 30) -> Optional[str]:
-        """
-        Poll D-ID API until video is ready
-        
-        Args:
-            talk_id: The talk ID to poll
-            headers: Authorization headers
-            max_attempts: Maximum polling attempts (30 = ~60 seconds)
-        
-        Returns:
-            Video URL when ready, or None on timeout/failure
-        """
-        url = f"{self.base_url}{settings.DID_TALKS_ENDPOINT}/{talk_id}"
-        
-        for attempt in range(max_attempts):
-            try:
-                response = await self.http_client.get(url, headers=headers)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    status = data.get("status")
-                    
-                    if status == "done":
-                        video_url = data.get("result_url")
-                        logger.info(f"D-ID video ready: {video_url}")
-                        return video_url
-                    elif status == "error":
-                        logger.error(f"D-ID video generation failed: {data.get('error')}")
-                        return None
-                    else:
-                        # Still processing, wait and retry
-                        await asyncio.sleep(2)
-                else:
-                    logger.error(f"D-ID poll error: {response.status_code}")
-                    return None
-                    
-            except Exception as e:
-                logger.error(f"Error polling D-ID: {str(e)}")
-                return None
-        
-        logger.warning(f"D-ID video generation timeout for talk {talk_id}")
-        return None
+    def _webhook_url(self) -> str:
+        """Webhook URL including the shared secret D-ID must echo back"""
+        separator = "&" if "?" in settings.DID_WEBHOOK_URL else "?"
+        return f"{settings.DID_WEBHOOK_URL}{separator}token={settings.DID_WEBHOOK_SECRET}"
     
-    async def create_streaming_avatar(
-        self,
-        text: str,
-        avatar_image_url: str,
-        voice_id: str
-    ) -> Optional[Dict]:
+    async def create_streaming_avatar(self, avatar_image_url: str) -> Optional[Dict]:
         """
         Create streaming avatar session (for real-time streaming)
         
         Args:
-            text: Initial text to speak
             avatar_image_url: Avatar image URL
-            voice_id: ElevenLabs voice ID
         
         Returns:
-            Stream session info with WebRTC offer
+            Stream session info: id, session_id, WebRTC offer and ice_servers
         """
         try:
             headers = {
@@ -174,21 +144,13 @@ class VideoAvatarService:
             }
             
             payload = {
-                "source_url": avatar_image_url,
-                "script": {
-                    "type": "text",
-                    "provider": {
-                        "type": "elevenlabs",
-                        "voice_id": voice_id
-                    },
-                    "input": text
-                }
+                "source_url": avatar_image_url
             }
             
             url = f"{self.base_url}{settings.DID_STREAMS_ENDPOINT}"
             response = await self.http_client.post(url, headers=headers, json=payload)
             
-            if response.status_code == 201:
+            if response.status_code in (200, 201):
                 data = response.json()
                 logger.info(f"D-ID streaming session created: {data.get('id')}")
                 return data
@@ -200,6 +162,68 @@ class VideoAvatarService:
             logger.error(f"Error creating streaming avatar: {str(e)}")
             return None
     
+    async def submit_stream_answer(self, stream_id: str, session_id: str, answer: Dict) -> bool:
+        """Complete the WebRTC handshake with the client's SDP answer"""
+        return await self._stream_request(
+            "POST",
+            f"/{stream_id}/sdp",
+            {"answer": answer, "session_id": session_id}
+        )
+    
+    async def submit_stream_candidate(self, stream_id: str, session_id: str, candidate: Dict) -> bool:
+        """Relay one of the client's ICE candidates"""
+        return await self._stream_request(
+            "POST",
+            f"/{stream_id}/ice",
+            {
+                "candidate": candidate.get("candidate"),
+                "sdpMid": candidate.get("sdpMid"),
+                "sdpMLineIndex": candidate.get("sdpMLineIndex"),
+                "session_id": session_id
+            }
+        )
+    
+    async def stream_audio(self, stream_id: str, session_id: str, audio_url: str) -> bool:
+        """Have a connected streaming avatar speak pre-synthesized audio"""
+        return await self._stream_request(
+            "POST",
+            f"/{stream_id}",
+            {
+                "script": {
+                    "type": "audio",
+                    "audio_url": audio_url
+                },
+                "session_id": session_id
+            }
+        )
+    
+    async def delete_stream(self, stream_id: str, session_id: str) -> bool:
+        """Close a streaming avatar session"""
+        return await self._stream_request(
+            "DELETE",
+            f"/{stream_id}",
+            {"session_id": session_id}
+        )
+    
+    async def _stream_request(self, method: str, path: str, payload: Dict) -> bool:
+        try:
+            headers = {
+                "Authorization": f"Basic {self.api_key}",
+                "Content-Type": "application/json"
+            }
+            
+            url = f"{self.base_url}{settings.DID_STREAMS_ENDPOINT}{path}"
+            response = await self.http_client.request(method, url, headers=headers, json=payload)
+            
+            if response.status_code in (200, 201):
+                return True
+            logger.error(f"D-ID stream {method} {path} error: {response.status_code} - {response.text}")
+            return False
+            
+        except Exception as e:
+            logger.error(f"Error calling D-ID stream {path}: {str(e)}")
+            return False
+    
     async def get_talk_status(self, talk_id: str) -> Optional[Dict]:
         """Get status of a D-ID talk"""
         try:
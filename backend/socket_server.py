@@ -3,22 +3,35 @@ Socket.IO server for WebRTC signaling and real-time chat
 """
 import socketio
 from datetime import datetime
-from typing import Dict
 from services.redis_client import redis_client
-from services.ai_tutor import ai_tutor_service
+from services.ai_replies import generate_ai_response
+from services.job_queue import ai_job_queue
+from services.avatar_stream_pool import avatar_stream_pool
+from services.reply_coordinator import reply_coordinator
 from utils.logger import logger
 from config import settings
 
+# In multi-node mode, emits are relayed through Redis so that room
+# broadcasts reach peers connected to any worker process (and so that
+# standalone AI workers can emit replies)
+client_manager = None
+if settings.SOCKETIO_MULTI_NODE or settings.AI_JOB_QUEUE:
+    client_manager = socketio.AsyncRedisManager(
+        settings.REDIS_URL,
+        channel=settings.SOCKETIO_CHANNEL
+    )
+
 # Create Socket.IO server with CORS
 sio = socketio.AsyncServer(
     async_mode='asgi',
+    client_manager=client_manager,
     cors_allowed_origins=settings.get_allowed_origins(),
     logger=True,
     engineio_logger=True
 )
 
-# Socket ID to user/room mapping
-socket_sessions: Dict[str, Dict[str, str]] = {}
+# Socket ID to user/room mapping lives in Redis (socket_session:{sid})
+# so that it survives across worker processes
 
 
 @sio.event
@@ -34,19 +47,18 @@ async def disconnect(sid):
     logger.info(f"Socket disconnected: {sid}")
     
     # Cleanup: notify room if user was in one
-    if sid in socket_sessions:
-        session = socket_sessions[sid]
+    session = await redis_client.pop_socket_session(sid)
+    if session:
         room_id = session.get("room_id")
         user_id = session.get("user_id")
         
         if room_id:
             # Remove from room participants
-            room = await redis_client.get_room(room_id)
-            if room:
-                participants = room.get("participants", [])
-                if user_id in participants:
-                    participants.remove(user_id)
-                    await redis_client.update_room_participants(room_id, participants)
+            await redis_client.remove_participant(room_id, user_id)
+            
+            # Close the streaming avatar if this socket held it
+            if settings.DID_STREAM_POOL_ENABLED:
+                await avatar_stream_pool.release(room_id, sid)
             
             # Notify other peers
             await sio.emit(
@@ -57,10 +69,7 @@ async def disconnect(sid):
             )
             
             # Leave Socket.IO room
-            sio.leave_room(sid, room_id)
-        
-        # Remove from session tracking
-        del socket_sessions[sid]
+            await sio.leave_room(sid, room_id)
 
 
 @sio.event
@@ -78,27 +87,20 @@ async def join(sid, data):
             await sio.emit('error', {"message": "Missing room_id or user_id"}, to=sid)
             return
         
-        # Verify room exists
-        room = await redis_client.get_room(room_id)
-        if not room:
+        # Add to room participants (fails if the room does not exist)
+        if not await redis_client.add_participant(room_id, user_id):
             await sio.emit('error', {"message": "Room not found"}, to=sid)
             return
         
         # Add to Socket.IO room
-        sio.enter_room(sid, room_id)
+        await sio.enter_room(sid, room_id)
         
         # Track session
-        socket_sessions[sid] = {
+        await redis_client.set_socket_session(sid, {
             "room_id": room_id,
             "user_id": user_id,
             "is_host": is_host
-        }
-        
-        # Update room participants
-        participants = room.get("participants", [])
-        if user_id not in participants:
-            participants.append(user_id)
-            await redis_client.update_room_participants(room_id, participants)
+        })
         
         # Notify other peers
         await sio.emit(
@@ -111,6 +113,21 @@ async def join(sid, data):
         logger.info(f"User {user_id} joined room {room_id}")
         await sio.emit('joined', {"room_id": room_id, "user_id": user_id}, to=sid)
         
+        # Lease a pre-warmed streaming avatar and start its WebRTC handshake
+        if settings.DID_STREAM_POOL_ENABLED:
+            room = await redis_client.get_room(room_id)
+            stream = await avatar_stream_pool.lease(room_id, room.get("companion_id"), sid) if room else None
+            if stream:
+                await sio.emit(
+                    'offer',
+                    {
+                        "sdp": stream["offer"],
+                        "ice_servers": stream["ice_servers"],
+                        "from": "avatar"
+                    },
+                    to=sid
+                )
+        
     except Exception as e:
         logger.error(f"Error in join event: {str(e)}")
         await sio.emit('error', {"message": "Failed to join room"}, to=sid)
@@ -125,19 +142,18 @@ async def leave(sid, data):
     try:
         room_id = data.get("room_id")
         
-        if sid not in socket_sessions:
+        session = await redis_client.pop_socket_session(sid)
+        if not session:
             return
         
-        session = socket_sessions[sid]
         user_id = session.get("user_id")
         
         # Update room participants
-        room = await redis_client.get_room(room_id)
-        if room:
-            participants = room.get("participants", [])
-            if user_id in participants:
-                participants.remove(user_id)
-                await redis_client.update_room_participants(room_id, participants)
+        await redis_client.remove_participant(room_id, user_id)
+        
+        # Close the streaming avatar if this socket held it
+        if settings.DID_STREAM_POOL_ENABLED:
+            await avatar_stream_pool.release(room_id, sid)
         
         # Notify peers
         await sio.emit(
@@ -148,10 +164,7 @@ async def leave(sid, data):
         )
         
         # Leave Socket.IO room
-        sio.leave_room(sid, room_id)
-        
-        # Remove session
-        del socket_sessions[sid]
+        await sio.leave_room(sid, room_id)
         
         logger.info(f"User {user_id} left room {room_id}")
         
@@ -191,8 +204,8 @@ async def offer(sid, data):
 @sio.event
 async def answer(sid, data):
     """
-    Forward WebRTC answer to peer
-    Expected data: {"room_id": str, "sdp": object}
+    Forward WebRTC answer to peer (or to D-ID when to == "avatar")
+    Expected data: {"room_id": str, "sdp": object, "to": str}
     """
     try:
         room_id = data.get("room_id")
@@ -202,6 +215,11 @@ async def answer(sid, data):
             await sio.emit('error', {"message": "Missing room_id or sdp"}, to=sid)
             return
         
+        if data.get("to") == "avatar":
+            if not await avatar_stream_pool.submit_answer(room_id, sdp):
+                await sio.emit('error', {"message": "Failed to connect avatar stream"}, to=sid)
+            return
+        
         # Forward to other peers
         await sio.emit(
             'answer',
@@ -220,8 +238,8 @@ async def answer(sid, data):
 @sio.event
 async def candidate(sid, data):
     """
-    Forward ICE candidate to peer
-    Expected data: {"room_id": str, "candidate": object}
+    Forward ICE candidate to peer (or to D-ID when to == "avatar")
+    Expected data: {"room_id": str, "candidate": object, "to": str}
     """
     try:
         room_id = data.get("room_id")
@@ -230,6 +248,10 @@ async def candidate(sid, data):
         if not room_id or not candidate:
             return
         
+        if data.get("to") == "avatar":
+            await avatar_stream_pool.submit_candidate(room_id, candidate)
+            return
+        
         # Forward to other peers
         await sio.emit(
             'candidate',
@@ -246,17 +268,33 @@ async def candidate(sid, data):
 async def message(sid, data):
     """
     Handle chat message and trigger AI response
-    Expected data: {"room_id": str, "message": str, "sender": "user" | "ai"}
+    Expected data: {"room_id": str, "message": str, "sender": "user" | "ai",
+                    "client_message_id": str (optional, makes retries idempotent)}
+    Acknowledged with {"status": "accepted" | "pending" | "done", "reply": object}
     """
+    claimed = False
     try:
         room_id = data.get("room_id")
         message_text = data.get("message")
         sender = data.get("sender", "user")
+        client_message_id = data.get("client_message_id")
         
         if not room_id or not message_text:
             await sio.emit('error', {"message": "Missing room_id or message"}, to=sid)
             return
         
+        # Only messages that trigger a reply are deduplicated: the claim is
+        # settled by that reply (or released if there will be none)
+        if client_message_id and sender == "user":
+            duplicate = await redis_client.claim_client_message(room_id, client_message_id)
+            if duplicate:
+                # Redelivery (e.g. after a reconnect): don't store or answer it again
+                logger.info(f"Duplicate message {client_message_id} in room {room_id}")
+                if duplicate.get("reply"):
+                    await sio.emit('message', duplicate["reply"], to=sid)
+                return duplicate
+            claimed = True
+        
         timestamp = datetime.now().timestamp()
         
         # Create message object
@@ -265,20 +303,14 @@ async def message(sid, data):
             "sender": sender,
             "timestamp": timestamp
         }
+        if client_message_id:
+            message_obj["message_id"] = client_message_id
         
-        # Append to conversation history
-        await redis_client.append_message(room_id, message_obj)
+        # Append to conversation history (assigns the room-wide seq)
+        message_obj["seq"] = await redis_client.append_message(room_id, message_obj)
         
         # Broadcast user message immediately
-        await sio.emit(
-            'message',
-            {
-                "message": message_text,
-                "sender": sender,
-                "timestamp": timestamp
-            },
-            room=room_id
-        )
+        await sio.emit('message', message_obj, room=room_id)
         
         logger.info(f"Message received in room {room_id} from {sender}")
         
@@ -287,72 +319,75 @@ async def message(sid, data):
             # Get room to find companion_id
             room = await redis_client.get_room(room_id)
             if room:
-                companion_id = room.get("companion_id")
-                
-                # Generate AI response asynchronously
-                sio.start_background_task(
-                    generate_ai_response,
-                    room_id,
-                    message_text,
-                    companion_id
-                )
+                # Supersedes any reply still being generated for earlier messages
+                generation = await reply_coordinator.submit(room_id, message_text, client_message_id)
+                sio.start_background_task(dispatch_reply, room_id, room.get("companion_id"), generation)
+            elif claimed:
+                # No reply will be generated: let a retry be processed again
+                await redis_client.release_client_messages(room_id, [client_message_id])
+        
+        return {"status": "accepted"}
         
     except Exception as e:
         logger.error(f"Error in message event: {str(e)}")
+        if claimed:
+            await redis_client.release_client_messages(room_id, [client_message_id])
         await sio.emit('error', {"message": "Failed to send message"}, to=sid)
 
 
-async def generate_ai_response(room_id: str, user_message: str, companion_id: str):
-    """Background task to generate and send AI response with video avatar"""
+@sio.event
+async def sync(sid, data):
+    """
+    Return the messages a (re)connecting client missed
+    Expected data: {"room_id": str, "after_seq": int, "limit": int}
+    Acknowledged with {"last_seq": int, "messages": [...], "has_more": bool}
+    """
     try:
-        # Generate AI response with video avatar
-        response_text, audio_url, video_url = await ai_tutor_service.generate_response(
-            room_id,
-            user_message,
-            companion_id
-        )
-        
-        timestamp = datetime.now().timestamp()
+        room_id = data.get("room_id")
+        if not room_id:
+            await sio.emit('error', {"message": "Missing room_id"}, to=sid)
+            return
         
-        # Create AI message object
-        ai_message = {
-            "message": response_text,
-            "sender": "ai",
-            "timestamp": timestamp,
-            "audio_url": audio_url,
-            "video_url": video_url
-        }
+        after_seq = max(0, int(data.get("after_seq", 0)))
+        limit = min(max(1, int(data.get("limit", 100))), settings.CONVERSATION_MAX_MESSAGES)
+        return await redis_client.get_messages_since(room_id, after_seq, limit)
         
-        # Append to conversation
-        await redis_client.append_message(room_id, ai_message)
+    except Exception as e:
+        logger.error(f"Error in sync event: {str(e)}")
+        await sio.emit('error', {"message": "Failed to sync messages"}, to=sid)
+
+
+async def dispatch_reply(room_id: str, companion_id: str, generation: int):
+    """
+    Wait out the debounce window, then answer every message queued for the
+    room in one reply - unless a newer message has taken over.
+    """
+    client_message_ids = []
+    try:
+        pending = await reply_coordinator.wait_for_quiet(room_id, generation)
+        if not pending:
+            return
+        user_message, consumed, client_message_ids = pending
         
-        # Broadcast AI response with video avatar
-        await sio.emit(
-            'message',
-            {
-                "message": response_text,
-                "sender": "ai",
-                "timestamp": timestamp,
-                "audio_url": audio_url,
-                "video_url": video_url
-            },
-            room=room_id
-        )
+        job = {
+            "room_id": room_id,
+            "user_message": user_message,
+            "companion_id": companion_id,
+            "generation": generation,
+            "consumed": consumed,
+            "client_message_ids": client_message_ids
+        }
         
-        logger.info(f"AI response sent to room {room_id}")
+        if settings.AI_JOB_QUEUE:
+            # Hand off to a standalone worker (see worker.py)
+            await ai_job_queue.enqueue(job)
+        else:
+            await generate_ai_response(sio, **job)
         
     except Exception as e:
-        logger.error(f"Error generating AI response: {str(e)}")
-        # Send fallback message
-        await sio.emit(
-            'message',
-            {
-                "message": "I'm having trouble responding right now. Please try again.",
-                "sender": "ai",
-                "timestamp": datetime.now().timestamp()
-            },
-            room=room_id
-        )
+        logger.error(f"Error dispatching AI reply for room {room_id}: {str(e)}")
+        # Let the client retry these messages
+        await redis_client.release_client_messages(room_id, client_message_ids)
 
 
 # Create ASGI app
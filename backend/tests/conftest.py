@@ -0,0 +1,29 @@
+"""
+Shared fixtures: services run against an in-memory fakeredis server
+(with Lua scripting, which needs lupa installed)
+"""
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+from services import redis_client as redis_module
+from services.redis_client import redis_client as client
+
+
+@pytest.fixture
+def redis_client():
+    """The global redis_client, connected to a fresh fakeredis server"""
+    client.redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    client._participant_script = client.redis.register_script(redis_module.PARTICIPANT_SCRIPT)
+    client._append_message_script = client.redis.register_script(redis_module.APPEND_MESSAGE_SCRIPT)
+    client._messages_since_script = client.redis.register_script(redis_module.MESSAGES_SINCE_SCRIPT)
+    client._release_lock_script = client.redis.register_script(redis_module.RELEASE_LOCK_SCRIPT)
+    yield client
+    client.redis = None
+    client._channel_handlers.clear()
+    client._reconnect_handlers.clear()
@@ -0,0 +1,81 @@
+"""
+Conversation storage: per-room seq numbers and delta sync
+"""
+import asyncio
+from config import settings
+
+
+async def _append(redis_client, room_id, count):
+    for i in range(1, count + 1):
+        await redis_client.append_message(room_id, {"sender": "user", "message": f"m{i}"})
+
+
+async def _since(redis_client, room_id, after_seq, limit):
+    delta = await redis_client.get_messages_since(room_id, after_seq, limit)
+    return [msg["seq"] for msg in delta["messages"]], delta["has_more"], delta["last_seq"]
+
+
+def test_messages_since_untrimmed(redis_client):
+    async def scenario():
+        await _append(redis_client, "room", 5)
+        assert await _since(redis_client, "room", 0, 3) == ([1, 2, 3], True, 5)
+        assert await _since(redis_client, "room", 3, 3) == ([4, 5], False, 5)
+        assert await _since(redis_client, "room", 5, 3) == ([], False, 5)
+    
+    asyncio.run(scenario())
+
+
+def test_messages_since_trimmed_list(redis_client, monkeypatch):
+    monkeypatch.setattr(settings, "CONVERSATION_MAX_MESSAGES", 10)
+    
+    async def scenario():
+        await _append(redis_client, "room", 15)
+        # Seqs 1-5 were trimmed: the delta starts at the oldest message kept
+        assert await _since(redis_client, "room", 0, 3) == ([6, 7, 8], True, 15)
+        assert await _since(redis_client, "room", 3, 3) == ([6, 7, 8], True, 15)
+        assert await _since(redis_client, "room", 8, 3) == ([9, 10, 11], True, 15)
+        assert await _since(redis_client, "room", 12, 10) == ([13, 14, 15], False, 15)
+    
+    asyncio.run(scenario())
+
+
+def test_messages_since_paging_terminates(redis_client, monkeypatch):
+    monkeypatch.setattr(settings, "CONVERSATION_MAX_MESSAGES", 10)
+    
+    async def scenario():
+        await _append(redis_client, "room", 15)
+        # Follow has_more like the sync event and the transcript stream do
+        after_seq, seen = 0, []
+        while True:
+            seqs, has_more, _ = await _since(redis_client, "room", after_seq, 4)
+            seen += seqs
+            if not has_more:
+                break
+            after_seq = seqs[-1]
+        assert seen == list(range(6, 16))
+    
+    asyncio.run(scenario())
+
+
+def test_pubsub_channels_share_one_subscriber(redis_client):
+    async def scenario():
+        received = []
+        redis_client._channel_handlers["a"] = lambda data: received.append(("a", data))
+        listener = asyncio.create_task(redis_client._listen())
+        try:
+            await redis_client.subscribe("b", lambda data: received.append(("b", data)))
+            await asyncio.sleep(0.05)
+            
+            await redis_client.redis.publish("a", "1")
+            await redis_client.redis.publish("b", "2")
+            await asyncio.sleep(0.05)
+            await redis_client.unsubscribe("b")
+            await redis_client.redis.publish("b", "3")
+            await asyncio.sleep(0.05)
+            
+            assert received == [("a", "1"), ("b", "2")]
+            assert (await redis_client.redis.pubsub_numsub("a", "b")) == [("a", 1), ("b", 0)]
+        finally:
+            listener.cancel()
+    
+    asyncio.run(scenario())
@@ -0,0 +1,14 @@
+"""
+Transcript archive encoding
+"""
+from services.transcript_archive import decode_transcript, encode_transcript
+
+
+def test_round_trip_with_unicode_line_separators():
+    messages = [
+        {"seq": 1, "sender": "user", "message": "line\u2028separator"},
+        {"seq": 2, "sender": "ai", "message": "para\u2029graph and next\u0085line"},
+        {"seq": 3, "sender": "user", "message": "plain\nnewline"},
+    ]
+    
+    assert decode_transcript(encode_transcript(messages)) == messages
@@ -2,11 +2,11 @@
 Structured logging configuration
 """
 import logging
-import json
 import sys
 from datetime import datetime
 from typing import Optional
 from contextvars import ContextVar
+from utils.serialization import dumps
 
 # Context variables for request tracking
 request_id_var: ContextVar[Optional[str]] = ContextVar('request_id', default=None)
@@ -43,7 +43,7 @@ class StructuredLogger(logging.Formatter):
         if hasattr(record, 'extra_fields'):
             log_data.update(record.extra_fields)
         
-        return json.dumps(log_data)
+        return dumps(log_data, default=str)
 
 
 def setup_logger(name: str, level: str = "INFO") -> logging.Logger:
@@ -0,0 +1,77 @@
+"""
+Request id and rate limiting as a single raw ASGI middleware
+
+Replaces two @app.middleware("http") layers, each of which ran the request
+in an extra task with a wrapped response stream. Here the request id and
+the rate limit headers are added to the response start message in place.
+"""
+import math
+import uuid
+from datetime import datetime
+from typing import Iterable
+from utils.logger import request_id_var, user_id_var
+from utils.serialization import FastJSONResponse
+
+# Long-polling Socket.IO requests are neither traced nor rate limited
+BYPASS_PREFIXES = ("/socket.io",)
+EXEMPT_PATHS = ("/health",)
+
+
+class RequestMiddleware:
+    """Assigns X-Request-ID and enforces the per-IP rate limit"""
+    
+    def __init__(self, app, limiter, limit: int, window: int = 60, exempt_paths: Iterable[str] = EXEMPT_PATHS):
+        self.app = app
+        self.limiter = limiter
+        self.limit = limit
+        self.window = window
+        self.exempt_paths = frozenset(exempt_paths)
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(BYPASS_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        
+        # Each request runs in its own task, so these do not leak between
+        # requests; they stay set for the outermost exception handler
+        request_id = str(uuid.uuid4())
+        request_id_var.set(request_id)
+        for name, value in scope["headers"]:
+            if name == b"x-user-id":
+                user_id_var.set(value.decode("latin-1"))
+                break
+        headers = [(b"x-request-id", request_id.encode())]
+        
+        if scope["path"] not in self.exempt_paths:
+            client = scope.get("client")
+            result = await self.limiter.check(client[0] if client else "unknown", self.limit, window=self.window)
+            headers += [
+                (b"x-ratelimit-limit", str(result.limit).encode()),
+                (b"x-ratelimit-remaining", str(result.remaining).encode()),
+                (b"x-ratelimit-reset", str(math.ceil(result.reset_after)).encode())
+            ]
+            
+            if not result.allowed:
+                response = FastJSONResponse(
+                    status_code=429,
+                    content={
+                        "error": {
+                            "code": "RATE_LIMIT_EXCEEDED",
+                            "message": "Too many requests. Please try again later.",
+                            "timestamp": datetime.utcnow().isoformat() + "Z"
+                        }
+                    }
+                )
+                response.raw_headers += headers
+                response.raw_headers.append(
+                    (b"retry-after", str(max(1, math.ceil(result.retry_after))).encode())
+                )
+                await response(scope, receive, send)
+                return
+        
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), *headers]
+            await send(message)
+        
+        await self.app(scope, receive, send_with_headers)
@@ -0,0 +1,53 @@
+"""
+JSON serialization backend
+
+Uses orjson when it is installed (several times faster than the stdlib for
+both encoding and decoding) and falls back to the stdlib json module
+otherwise. Output is compact either way, so values written by one backend
+read back identically with the other.
+"""
+import json
+from typing import Any, Callable, Dict, Optional, Type
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson else "json"
+
+# Response class for the app and for handlers returning trusted data
+FastJSONResponse = ORJSONResponse if orjson else JSONResponse
+
+
+def dumps(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> str:
+    """Serialize to a JSON string (Redis payloads, log lines)"""
+    return dumps_bytes(obj, default).decode()
+
+
+def dumps_bytes(obj: Any, default: Optional[Callable[[Any], Any]] = None) -> bytes:
+    """Serialize to UTF-8 JSON bytes (response bodies, archives)"""
+    if orjson:
+        return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=default, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def loads(data: Any) -> Any:
+    """Parse JSON from str or bytes"""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def trusted(model: Type[BaseModel], data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    data restricted to a response model's fields, without validating it.
+    Only for data the service wrote itself: handlers return it in a
+    FastJSONResponse so FastAPI does not re-validate the response model.
+    """
+    return {
+        name: data.get(name, None if field.is_required() else field.get_default(call_default_factory=True))
+        for name, field in model.model_fields.items()
+    }
@@ -0,0 +1,19 @@
+"""
+Per-stage latency breakdown for a single request
+"""
+import time
+from typing import Dict, Optional
+
+
+class StageTimer:
+    """Records consecutive stage durations in milliseconds"""
+    
+    def __init__(self, stages: Optional[Dict[str, float]] = None):
+        self.stages = stages if stages is not None else {}
+        self._last = time.perf_counter()
+    
+    def mark(self, stage: str):
+        """Close the current stage under the given name and start the next"""
+        now = time.perf_counter()
+        self.stages[stage] = round((now - self._last) * 1000, 1)
+        self._last = now
@@ -0,0 +1,135 @@
+"""
+Standalone AI reply worker
+
+Consumes jobs from the AI reply stream (AI_JOB_QUEUE=true on the web
+processes), generates replies, and emits them to Socket.IO rooms through
+the Redis manager. Run as many workers as needed, independently of the
+number of web processes:
+
+    python worker.py
+"""
+import asyncio
+import os
+import signal
+import socket
+import socketio
+from config import settings
+from services.redis_client import redis_client
+from services.ai_tutor import ai_tutor_service
+from services.video_avatar import video_avatar_service
+from services.ai_replies import generate_ai_response
+from services.job_queue import ai_job_queue, Job
+from services.reply_coordinator import reply_coordinator
+from services.companion_registry import companion_registry
+from utils.logger import logger
+
+RECLAIM_INTERVAL = 30  # seconds between scans for stalled jobs
+
+
+class AIWorker:
+    """Consumer-group member processing up to AI_WORKER_CONCURRENCY jobs"""
+    
+    def __init__(self):
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self.emitter = socketio.AsyncRedisManager(
+            settings.REDIS_URL,
+            channel=settings.SOCKETIO_CHANNEL,
+            write_only=True
+        )
+        self.slots = asyncio.Semaphore(settings.AI_WORKER_CONCURRENCY)
+        self.tasks = set()
+        self.stopping = asyncio.Event()
+    
+    async def run(self):
+        """Main loop: reclaim stalled jobs periodically, otherwise read new ones"""
+        await ai_job_queue.ensure_group()
+        logger.info(f"AI worker {self.consumer} started")
+        
+        last_reclaim = 0.0
+        loop = asyncio.get_running_loop()
+        while not self.stopping.is_set():
+            try:
+                # Wait for a free slot before taking jobs off the stream
+                await self.slots.acquire()
+                self.slots.release()
+                free = self._free_slots()
+                
+                jobs = []
+                if loop.time() - last_reclaim >= RECLAIM_INTERVAL:
+                    last_reclaim = loop.time()
+                    jobs = await ai_job_queue.reclaim(self.consumer, free)
+                if not jobs:
+                    jobs = await ai_job_queue.consume(self.consumer, free, block_ms=2000)
+                
+                for job in jobs:
+                    await self.slots.acquire()
+                    task = asyncio.create_task(self._process(job))
+                    self.tasks.add(task)
+                    task.add_done_callback(self.tasks.discard)
+            except Exception as e:
+                logger.error(f"AI worker loop error: {str(e)}")
+                await asyncio.sleep(1)
+        
+        # Let in-flight jobs finish; anything interrupted is reclaimed later
+        if self.tasks:
+            logger.info(f"Waiting for {len(self.tasks)} in-flight AI jobs")
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        logger.info(f"AI worker {self.consumer} stopped")
+    
+    def stop(self):
+        self.stopping.set()
+    
+    def _free_slots(self) -> int:
+        return max(1, settings.AI_WORKER_CONCURRENCY - len(self.tasks))
+    
+    async def _process(self, job: Job):
+        entry_id, payload = job
+        job_id = payload["job_id"]
+        try:
+            if await ai_job_queue.is_completed(job_id):
+                logger.info(f"AI job {job_id} already completed, acknowledging")
+            else:
+                await generate_ai_response(
+                    self.emitter,
+                    payload["room_id"],
+                    payload["user_message"],
+                    payload["companion_id"],
+                    message_id=job_id,
+                    is_delivered=lambda: ai_job_queue.is_completed(job_id),
+                    mark_delivered=lambda: ai_job_queue.mark_completed(job_id),
+                    generation=payload.get("generation"),
+                    consumed=payload.get("consumed", 0),
+                    client_message_ids=payload.get("client_message_ids")
+                )
+            await ai_job_queue.ack(entry_id)
+        except Exception as e:
+            # Left pending; another worker reclaims it after AI_JOB_CLAIM_IDLE_MS
+            logger.error(f"AI job {job_id} failed: {str(e)}")
+        finally:
+            self.slots.release()
+
+
+async def main():
+    await redis_client.connect()
+    await ai_tutor_service.initialize()
+    await video_avatar_service.initialize()
+    await reply_coordinator.start()
+    await companion_registry.start()
+    
+    worker = AIWorker()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+    
+    try:
+        await worker.run()
+    finally:
+        await reply_coordinator.stop()
+        await companion_registry.stop()
+        await redis_client.disconnect()
+        await ai_tutor_service.close()
+        await video_avatar_service.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -15,11 +15,28 @@ interface UseWebRTCOptions {
 }
 
 interface Message {
+  message_id?: string;
   message: string;
   sender: 'user' | 'ai';
   timestamp: number;
   audio_url?: string;
   video_url?: string;
+  reply_seq?: number;
+  seq?: number;
+  streaming?: boolean;
+}
+
+interface MessageDelta {
+  last_seq: number;
+  messages: Message[];
+  has_more: boolean;
+}
+
+interface MessageChunk {
+  message_id: string;
+  seq: number;
+  delta: string;
+  sender: 'ai';
 }
 
 export const useWebRTC = ({ roomId: initialRoomId, userId, companionId }: UseWebRTCOptions) => {
@@ -35,6 +52,10 @@ export const useWebRTC = ({ roomId: initialRoomId, userId, companionId }: UseWeb
 
   const peerConnection = useRef<RTCPeerConnection | null>(null);
   const socket = useRef<Socket | null>(null);
+  const remotePeer = useRef<string | null>(null);
+  // Room joined and highest conversation seq seen, for resuming after a reconnect
+  const joinedRoom = useRef<string | null>(null);
+  const lastSeq = useRef(0);
   const localVideoRef = useRef<HTMLVideoElement | null>(null);
   const remoteVideoRef = useRef<HTMLVideoElement | null>(null);
 
@@ -48,10 +69,51 @@ export const useWebRTC = ({ roomId: initialRoomId, userId, companionId }: UseWeb
       timeout: 5000,
     });
 
+    // Insert or replace messages by message_id (deltas arrive in seq order)
+    const mergeMessages = (incoming: Message[]) => {
+      incoming.forEach((m) => {
+        if (m.seq && m.seq > lastSeq.current) lastSeq.current = m.seq;
+      });
+      setMessages((prev) => {
+        const updated = [...prev];
+        incoming.forEach((m) => {
+          const index = m.message_id
+            ? updated.findIndex((existing) => existing.message_id === m.message_id)
+            : -1;
+          if (index === -1) updated.push(m);
+          else updated[index] = m;
+        });
+        return updated;
+      });
+    };
+
+    // Fetch only the messages missed while disconnected
+    const syncMessages = (targetRoomId: string) => {
+      socket.current?.emit(
+        'sync',
+        { room_id: targetRoomId, after_seq: lastSeq.current },
+        (delta: MessageDelta) => {
+          if (!delta) return;
+          mergeMessages(delta.messages);
+          if (delta.has_more) syncMessages(targetRoomId);
+        }
+      );
+    };
+
     socket.current.on('connect', () => {
       console.log('Socket.IO connected');
       setIsConnecting(false);
       setIsConnected(true);
+
+      // Reconnected: rejoin the room and resume from the last seq seen
+      if (joinedRoom.current) {
+        socket.current?.emit('join', {
+          room_id: joinedRoom.current,
+          user_id: userId,
+          role: 'user',
+        });
+        syncMessages(joinedRoom.current);
+      }
     });
 
     socket.current.on('disconnect', () => {
@@ -187,6 +249,7 @@ export const useWebRTC = ({ roomId: initialRoomId, userId, companionId }: UseWeb
           room_id: roomId,
           candidate: event.candidate.toJSON(),
           from: userId,
+          to: remotePeer.current,
         });
       }
     };
@@ -215,6 +278,8 @@ export const useWebRTC = ({ roomId: initialRoomId, userId, companionId }: UseWeb
 
     setIsConnecting(true);
     setRoomId(targetRoomId);
+    joinedRoom.current = targetRoomId;
+    lastSeq.current = 0;
 
     // Initialize peer connection
     await initializePeerConnection();
@@ -254,6 +319,9 @@ export const useWebRTC = ({ roomId: initialRoomId, userId, companionId }: UseWeb
     socket.current.on('offer', async (data: any) => {
       console.log('Received offer');
 
+      // 'avatar' offers come from the server-side streaming avatar
+      remotePeer.current = data.from;
+
       if (peerConnection.current) {
         await peerConnection.current.setRemoteDescription(
           new RTCSessionDescription(data.sdp)
@@ -266,6 +334,7 @@ export const useWebRTC = ({ roomId: initialRoomId, userId, companionId }: UseWeb
           room_id: targetRoomId,
           sdp: answer,
           from: userId,
+          to: data.from,
         });
       }
     });
@@ -292,10 +361,46 @@ export const useWebRTC = ({ roomId: initialRoomId, userId, companionId }: UseWeb
       }
     });
 
-    // Handle chat messages
+    // Handle streamed AI text as it is generated
+    socket.current.on('message-chunk', (data: MessageChunk) => {
+      setMessages((prev) => {
+        const index = prev.findIndex((m) => m.message_id === data.message_id);
+        if (index === -1) {
+          return [
+            ...prev,
+            {
+              message_id: data.message_id,
+              message: data.delta,
+              sender: data.sender,
+              timestamp: Date.now() / 1000,
+              streaming: true,
+            },
+          ];
+        }
+        const updated = [...prev];
+        updated[index] = { ...updated[index], message: updated[index].message + data.delta };
+        return updated;
+      });
+    });
+
+    // Handle chat messages (final AI messages replace their streamed draft)
     socket.current.on('message', (data: Message) => {
       console.log('Received message:', data);
-      setMessages((prev) => [...prev, data]);
+      mergeMessages([data]);
+    });
+
+    // Drop drafts of replies cancelled by a newer message
+    socket.current.on('message-superseded', (data: { message_id: string }) => {
+      setMessages((prev) => prev.filter((m) => m.message_id !== data.message_id));
+    });
+
+    // Attach avatar videos rendered in parallel with the reply's audio
+    socket.current.on('message-video', (data: { message_id: string; video_url: string }) => {
+      setMessages((prev) =>
+        prev.map((m) =>
+          m.message_id === data.message_id ? { ...m, video_url: data.video_url } : m
+        )
+      );
     });
 
   }, [userId, initializePeerConnection]);
@@ -304,7 +409,12 @@ export const useWebRTC = ({ roomId: initialRoomId, userId, companionId }: UseWeb
   const sendMessage = useCallback((text: string) => {
     if (!socket.current || !roomId) return;
 
+    // Lets the server drop redeliveries after a reconnect; its echo of this
+    // message replaces the local copy by message_id
+    const clientMessageId = crypto.randomUUID();
+
     const message: Message = {
+      message_id: clientMessageId,
       message: text,
       sender: 'user',
       timestamp: Date.now() / 1000,
@@ -314,6 +424,7 @@ export const useWebRTC = ({ roomId: initialRoomId, userId, companionId }: UseWeb
       room_id: roomId,
       message: text,
       sender: 'user',
+      client_message_id: clientMessageId,
     });
 
     setMessages((prev) => [...prev, message]);
@@ -350,6 +461,7 @@ export const useWebRTC = ({ roomId: initialRoomId, userId, companionId }: UseWeb
     peerConnection.current?.close();
 
     // Leave room
+    joinedRoom.current = null;
     if (socket.current && roomId) {
       socket.current.emit('leave', {
         room_id: roomId,